@@ -1,7 +1,11 @@
+import json
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from utils.metrics import begin_run, get_metrics
 
 st.set_page_config(page_title="Ngọc Vũ - SX & Bán Nước", layout="wide")
 st.title("Hệ thống quản lý sản xuất & bán nước - Ngọc Vũ")
+begin_run("app")
 
 st.markdown(
     "- Vào **Trang Đơn Hàng** để nhập liệu, xem bảng, chốt tồn kho ngày, và điểm danh.\n"
@@ -9,3 +13,40 @@ st.markdown(
 )
 
 st.info("Dùng menu bên trái để chuyển trang. Mỗi trang có link riêng sau khi deploy: 'donhangngocvu' và 'quanlyngocvu'.")
+
+# ========= Chẩn đoán Google Sheets (bật ở sidebar) =========
+if st.sidebar.toggle("Chẩn đoán Google Sheets", key="diag_panel"):
+    m = get_metrics()
+    ctx = get_script_run_ctx()
+    session = ctx.session_id if ctx is not None else "local"
+    scope = st.radio("Phạm vi", ["Phiên này", "Tất cả phiên"], horizontal=True, key="diag_scope")
+    summary = m.session_summary(session if scope == "Phiên này" else None)
+    if summary.empty:
+        st.info("Chưa có lệnh gọi nào được ghi nhận.")
+    else:
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**Sheet tốn thời gian nhất** (read_df, append_row, write_df...)")
+            gs_calls = summary[summary["layer"] == "gs"].drop(columns="layer")
+            st.dataframe(gs_calls.head(10), use_container_width=True, hide_index=True)
+        with c2:
+            st.markdown("**Sheet tốn hạn mức nhất** (số request tới Google)")
+            api = summary[summary["layer"] == "api"].drop(columns="layer")
+            st.dataframe(api.sort_values("calls", ascending=False).head(10), use_container_width=True, hide_index=True)
+        ui = summary[summary["layer"] == "ui"]
+        if not ui.empty:
+            st.markdown("**Thời gian theo tab**")
+            st.dataframe(ui[["sheet", "calls", "seconds"]].rename(columns={"sheet": "tab"}),
+                         use_container_width=True, hide_index=True)
+
+    st.markdown("**Các lần chạy trang gần nhất (phiên này)**")
+    runs = m.run_summary(session)
+    if runs.empty:
+        st.caption("Chưa có.")
+    else:
+        st.dataframe(runs.head(20), use_container_width=True, hide_index=True)
+
+    recs = m.records(session=session if scope == "Phiên này" else None)
+    st.download_button("Tải log JSON", "\n".join(json.dumps(r, ensure_ascii=False, default=str)
+                                               for r in recs.to_dict("records")),
+                       file_name="sheets_calls.jsonl", mime="application/json")
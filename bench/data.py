@@ -0,0 +1,130 @@
+# bench/data.py
+"""Sinh dữ liệu giả giống thật cho các sheet đơn hàng/kho/công.
+
+`n_rows` là số đơn XE_MAY; các sheet khác suy ra theo tỉ lệ thực tế
+(~300 đơn/ngày, OTO = 1/4 XE_MAY, mỗi ngày chốt tồn từng sản phẩm...).
+Giá trị trả về giống Sheets API (UNFORMATTED_VALUE): dòng đầu là header,
+số là int, ngày là chuỗi dd-mm-yyyy. Chốt tồn & nhập hàng chỉ tới hôm qua
+(hôm nay chưa chốt), đơn hàng & công tới hôm nay.
+"""
+import os, sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.gs import REQUIRED_SHEETS
+from utils.dailyagg import order_measures, aggregate
+
+PRODUCTS = ["Aqua 500", "Aqua 1.5L", "Lavie 350", "Bình 20L", "Bình 19L Ocany", "Đá viên"]
+BOTTLE_TYPES = ["bình", "thùng", "chai"]
+PRICES = {"Aqua 500": 90000, "Aqua 1.5L": 110000, "Lavie 350": 85000,
+          "Bình 20L": 18000, "Bình 19L Ocany": 25000, "Đá viên": 15000}
+STAFF = ["Pháp", "Sâm", "Khoa", "Tùng", "Hùng", "Nam", "Long", "Phúc"]
+PAYMENTS = ["Tiền Mặt", "Chuyển Khoản", "Công nợ"]
+ROADS = ["Lê Lợi", "Trần Phú", "Nguyễn Huệ", "Hùng Vương", "Quang Trung", "Lý Thường Kiệt", "Hai Bà Trưng"]
+ORDERS_PER_DAY = 300
+
+def _days(n_days: int, end: date = None) -> list:
+    end = end or date.today()
+    return [(end - timedelta(days=n_days - 1 - i)).strftime("%d-%m-%Y") for i in range(n_days)]
+
+def _values(name: str, df: pd.DataFrame) -> list:
+    cols = REQUIRED_SHEETS[name]
+    return [cols] + df[cols].astype(object).values.tolist()
+
+def generate(n_rows: int, seed: int = 0, end: date = None) -> dict:
+    """{tên sheet: list các dòng (kể cả header)} cho XE_MAY/OTO/CONG/DAILY_CLOSE/NHAP_HANG,
+    LOOKUPS và DAILY_AGG (tính sẵn từ đơn, như khi đã chạy lâu)."""
+    rng = np.random.default_rng(seed)
+    n_days = max(30, -(-n_rows // ORDERS_PER_DAY))
+    days = np.array(_days(n_days, end), dtype=object)
+    n_cust = max(50, n_rows // 200)
+    customers = np.array([f"Khách {i:05d}" for i in range(n_cust)], dtype=object)
+    products = np.array(PRODUCTS, dtype=object)
+    staff = np.array(STAFF, dtype=object)
+
+    def orders(n):
+        # đơn sắp theo ngày như khi nhập tay
+        d = np.sort(rng.integers(0, n_days, n))
+        sp = rng.integers(0, len(PRODUCTS), n)
+        qty = rng.integers(1, 11, n)
+        price = np.array([PRICES[p] for p in PRODUCTS])[sp]
+        return d, sp, qty, price
+
+    d, sp, qty, price = orders(n_rows)
+    xm = pd.DataFrame({
+        "Ngày": days[d],
+        "Khách hàng": customers[rng.integers(0, n_cust, n_rows)],
+        "Code": "",
+        "Đường": np.array(ROADS, dtype=object)[rng.integers(0, len(ROADS), n_rows)],
+        "Loại sản phẩm": products[sp],
+        "Loại bình": np.array(BOTTLE_TYPES, dtype=object)[rng.integers(0, len(BOTTLE_TYPES), n_rows)],
+        "Số lượng giao": qty,
+        "Vỏ về": np.maximum(qty - rng.integers(0, 3, n_rows), 0),
+        "Thanh Toán": qty * price,
+        "PP Thanh toán": np.array(PAYMENTS, dtype=object)[rng.integers(0, len(PAYMENTS), n_rows)],
+        "Chú thích": "",
+        "Người chở": staff[rng.integers(0, len(STAFF), n_rows)],
+    })
+
+    n_oto = max(1, n_rows // 4)
+    d, sp, qty, price = orders(n_oto)
+    qty = qty * 10
+    oto = pd.DataFrame({
+        "Ngày": days[d],
+        "Khách hàng": customers[rng.integers(0, n_cust, n_oto)],
+        "Loại sản phẩm": products[sp],
+        "Loại bình": np.array(BOTTLE_TYPES, dtype=object)[rng.integers(0, len(BOTTLE_TYPES), n_oto)],
+        "Số lượng": qty,
+        "Đơn giá": price,
+        "Thanh Toán": qty * price,
+        "PP Thanh toán": np.array(PAYMENTS, dtype=object)[rng.integers(0, len(PAYMENTS), n_oto)],
+        "Chú thích": "",
+        "Người chở 1": staff[rng.integers(0, len(STAFF), n_oto)],
+        "Người chở 2": staff[rng.integers(0, len(STAFF), n_oto)],
+    })
+
+    # mỗi ngày: chốt tồn từng sản phẩm, công từng nhân viên, ~2 phiếu nhập
+    dd, pp = np.meshgrid(np.arange(n_days - 1), np.arange(len(PRODUCTS)), indexing="ij")
+    close = pd.DataFrame({
+        "Ngày": days[dd.ravel()], "Loại sản phẩm": products[pp.ravel()],
+        "Tồn cuối": rng.integers(20, 500, dd.size), "Ghi chú": "", "Người nhập": "Pháp",
+    })
+    dd, ss = np.meshgrid(np.arange(n_days), np.arange(len(STAFF)), indexing="ij")
+    full = rng.random(dd.size) < 0.8
+    cong = pd.DataFrame({
+        "Ngày": days[dd.ravel()], "Nhân viên": staff[ss.ravel()],
+        "Ca": np.where(full, "Full ngày", "Nửa ngày sáng"), "Công": np.where(full, 1.0, 0.5),
+        "Ghi chú": "",
+    })
+    n_nhap = (n_days - 1) * 2
+    sp = rng.integers(0, len(PRODUCTS), n_nhap)
+    qty = rng.integers(50, 500, n_nhap)
+    cost = (np.array([PRICES[p] for p in PRODUCTS]) * 0.7).astype(int)[sp]
+    nhap = pd.DataFrame({
+        "Ngày": days[np.sort(rng.integers(0, n_days - 1, n_nhap))], "Loại sản phẩm": products[sp],
+        "Số lượng nhập": qty, "Đơn giá": cost, "Thành tiền": qty * cost,
+        "Nhà cung cấp": "NCC A", "Ghi chú": "",
+    })
+
+    lookups = ([["Loại", "Giá trị"]]
+               + [["Loại sản phẩm", p] for p in PRODUCTS] + [["Mặt hàng", p] for p in PRODUCTS]
+               + [["Nhân viên", s] for s in STAFF] + [["Người chở", s] for s in STAFF]
+               + [["PP Thanh toán", p] for p in PAYMENTS] + [["Đường", r] for r in ROADS]
+               + [["Loại bình", b] for b in BOTTLE_TYPES])
+    agg = aggregate([order_measures("XE_MAY", xm), order_measures("OTO", oto)])
+    return {
+        "XE_MAY": _values("XE_MAY", xm),
+        "OTO": _values("OTO", oto),
+        "DAILY_CLOSE": _values("DAILY_CLOSE", close),
+        "CONG": _values("CONG", cong),
+        "NHAP_HANG": _values("NHAP_HANG", nhap),
+        "LOOKUPS": lookups,
+        "PAY_RULES": [REQUIRED_SHEETS["PAY_RULES"]],
+        "COMMISSION_RULES": [REQUIRED_SHEETS["COMMISSION_RULES"]],
+        "LUONG": [REQUIRED_SHEETS["LUONG"]],
+        "INVENTORY": [REQUIRED_SHEETS["INVENTORY"]] + [[p, 0, 0, 0, 0, ""] for p in PRODUCTS],
+        "DAILY_AGG": _values("DAILY_AGG", agg),
+    }
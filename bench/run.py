@@ -0,0 +1,132 @@
+# bench/run.py
+"""Đo hiệu năng offline: spreadsheet giả trong bộ nhớ + dữ liệu sinh sẵn.
+
+    python bench/run.py --rows 10000 100000 --latency 0.3
+    python bench/run.py --rows 10000 --out bench.json            # lưu kết quả
+    python bench/run.py --rows 10000 --baseline bench.json       # so với lần trước
+
+Mỗi kịch bản in ra: thời gian, số request API (giả) và số dòng đọc qua API.
+Mỗi view của trang (thống kê, đối chiếu tồn kho, lương...) đo bằng AppTest, cache lạnh.
+"""
+import os, sys, time, json, argparse, logging
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+import utils.gs as gs
+from utils.fake import FakeSpreadsheet
+from bench.data import generate, PRODUCTS
+
+_READS = {"values_get", "values_batch_get"}
+
+class Bench:
+    def __init__(self, n_rows: int, latency: float, per_row: float):
+        self.n_rows = n_rows
+        self.sh = FakeSpreadsheet("bench", latency=latency, per_row=per_row)
+        t0 = time.perf_counter()
+        for name, values in generate(n_rows).items():
+            self.sh.load(name, values)
+        self.gen_seconds = time.perf_counter() - t0
+        gs.get_spreadsheet = lambda: self.sh
+        self.results = []
+
+    def reset(self):
+        """Bỏ mọi cache đọc để kịch bản sau bắt đầu lạnh."""
+        gs.clear_cache()
+        gs.get_row_indexes().clear()
+
+    def measure(self, name: str, fn, cold: bool = True):
+        if cold:
+            self.reset()
+        n = len(self.sh.calls)
+        t0 = time.perf_counter()
+        fn()
+        sec = time.perf_counter() - t0
+        calls = self.sh.calls[n:]
+        self.results.append({
+            "rows": self.n_rows, "scenario": name, "seconds": round(sec, 4),
+            "api_calls": len(calls),
+            "rows_read": sum(r for op, _, r in calls if op in _READS),
+        })
+
+    def _app_run(self, name: str, at: AppTest, action):
+        self.reset()
+        n = len(self.sh.calls)
+        t0 = time.perf_counter()
+        action(at).run()
+        sec = time.perf_counter() - t0
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        calls = self.sh.calls[n:]
+        self.results.append({"rows": self.n_rows, "scenario": name, "seconds": round(sec, 4),
+                             "api_calls": len(calls),
+                             "rows_read": sum(r for op, _, r in calls if op in _READS)})
+
+    def page(self, name: str, script: str, view_key: str):
+        """Chạy một trang bằng AppTest: lần mở đầu (view mặc định), rồi lần lượt
+        chuyển sang từng view khác; mỗi lần chạy với cache lạnh là một dòng kết quả."""
+        at = AppTest.from_file(os.path.join(ROOT, "pages", script), default_timeout=3600)
+        self._app_run(name, at, lambda a: a)
+        views = at.radio(key=view_key).options
+        for v in views[1:] + views[:1]:
+            self._app_run(f"  view: {v}", at, lambda a: a.radio(key=view_key).set_value(v))
+
+    def run(self):
+        today = date.today()
+        month_start = today.replace(day=1)
+        self.measure("read_df XE_MAY (lạnh)", lambda: gs.read_df("XE_MAY"))
+        self.measure("read_df XE_MAY (cache)", lambda: gs.read_df("XE_MAY"), cold=False)
+        self.measure("read_df XE_MAY 1 ngày (lạnh)", lambda: gs.read_df("XE_MAY", date_from=today, date_to=today))
+        self.measure("read_df XE_MAY 1 tháng (lạnh)", lambda: gs.read_df("XE_MAY", date_from=month_start, date_to=today))
+        # chốt lại tồn hôm qua: ghi đè đúng các dòng của một ngày đã có
+        day = (today - timedelta(days=1)).strftime("%d-%m-%Y")
+        close = pd.DataFrame({"Ngày": day, "Loại sản phẩm": PRODUCTS, "Tồn cuối": 100,
+                              "Ghi chú": "", "Người nhập": "bench"})
+        self.measure("replace_rows_by_date DAILY_CLOSE",
+                     lambda: gs.replace_rows_by_date("DAILY_CLOSE", "Ngày", day, close))
+        row = [today.strftime("%d-%m-%Y"), "Khách bench", "", "Lê Lợi", PRODUCTS[0], "bình", 2, 1, 180000, "Tiền Mặt", "", "Pháp"]
+
+        def appends():
+            for _ in range(50):
+                gs.append_row("XE_MAY", row)
+            gs.flush_writes()
+        self.measure("append_row x50 + flush", appends, cold=False)
+        self.measure("daily_agg 1 tháng (lạnh)", lambda: gs.daily_agg(month_start, today))
+        self.measure("rebuild_daily_agg", gs.rebuild_daily_agg)
+        self.page("trang Quản lý (lạnh)", "02_quanlyngocvu.py", "ql_view")
+        self.page("trang Đơn hàng (lạnh)", "01_donhangngocvu.py", "dh_view")
+        return self.results
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark offline cho utils.gs và các trang")
+    p.add_argument("--rows", type=int, nargs="+", default=[10_000], help="số đơn XE_MAY (vd. 10000 100000 1000000)")
+    p.add_argument("--latency", type=float, default=0.0, help="giây giả lập cho mỗi request API")
+    p.add_argument("--per-row", type=float, default=0.0, help="giây giả lập cho mỗi dòng đọc/ghi")
+    p.add_argument("--out", help="ghi kết quả ra file JSON")
+    p.add_argument("--baseline", help="file JSON của lần chạy trước để so sánh")
+    args = p.parse_args()
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    results = []
+    for n in args.rows:
+        b = Bench(n, args.latency, args.per_row)
+        print(f"== {n:,} dòng XE_MAY (sinh dữ liệu {b.gen_seconds:.1f}s) ==", flush=True)
+        results += b.run()
+    df = pd.DataFrame(results)
+    if args.baseline:
+        base = pd.DataFrame(json.load(open(args.baseline, encoding="utf-8")))
+        base = base.rename(columns={"seconds": "seconds_truoc", "api_calls": "api_calls_truoc"})
+        df = df.merge(base[["rows", "scenario", "seconds_truoc", "api_calls_truoc"]],
+                      on=["rows", "scenario"], how="left")
+        df["thay_doi_%"] = ((df["seconds"] / df["seconds_truoc"] - 1) * 100).round(1)
+    print(df.to_string(index=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -2,36 +2,24 @@
 import os, sys
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.gs import read_df, append_row, options, add_lookup, items_from_inventory, replace_rows_by_date
-
-DATE_FMT_SAVE = "%d-%m-%Y"  # dd-mm-yyyy
-
-def parse_any_date(s):
-    if pd.isna(s):
-        return pd.NaT
-    if isinstance(s, (datetime, date)):
-        return pd.to_datetime(s)
-    s = str(s).strip()
-    for fmt in ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d"]:
-        try:
-            return pd.to_datetime(s, format=fmt, dayfirst=True)
-        except Exception:
-            pass
-    return pd.to_datetime(s, dayfirst=True, errors="coerce")
-
-def fmt_date(d):
-    if pd.isna(d): return ""
-    if isinstance(d, (pd.Timestamp, datetime, date)):
-        return pd.to_datetime(d).strftime(DATE_FMT_SAVE)
-    return str(d)
+from utils.gs import read_df, append_row, options, add_lookup, items_from_inventory, replace_rows_by_date, get_write_queue, daily_agg, cached_by_version, read_many, \
+    customer_ledger, recent_balance
+from utils.dates import DATE_FMT_SAVE, parse_dates, fmt_date
+from utils.quota import describe_api_error
+from utils.metrics import begin_run
+from utils.views import route, View
+from utils.dailyagg import order_measures
+from utils.schema import plain
+from utils.conflicts import EditGuard
+from gspread.exceptions import APIError
 
 def safe_options(kind, extra=None):
     try:
         base = options(kind) or []
-    except Exception:
+    except APIError as e:
+        st.warning(describe_api_error(e))
         base = []
     if extra:
         base = list(base) + list(extra)
@@ -42,87 +30,169 @@ def safe_options(kind, extra=None):
 def safe_inventory_items():
     try:
         return items_from_inventory() or []
-    except Exception:
+    except APIError as e:
+        st.warning(describe_api_error(e))
         return []
 
 st.set_page_config(page_title="donhangngocvu", layout="wide")
 st.title("Đơn hàng Ngọc Vũ")
+begin_run("donhangngocvu")
 
-# ========= Tabs =========
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "Nhập đơn hàng",
-    "Thống kê",
-    "Chốt tồn kho ngày",
-    "Điểm danh & Công",
-    "Nhập hàng"
-])
+# Đơn được ghi trễ theo lô; báo nếu lần ghi gần nhất lỗi (vẫn đang thử lại)
+_wq = get_write_queue()
+if _wq is not None and _wq.last_error is not None and _wq.size():
+    st.warning(f"Còn {_wq.size()} dòng (đơn, danh mục) chưa ghi được lên Google Sheets, đang thử lại: {_wq.last_error}")
 
 # ============================================================
-# TAB 1: Nhập đơn hàng (bỏ trường Code; mặc định người chở)
+# VIEW 1: Nhập đơn hàng (bỏ trường Code; mặc định người chở)
+# Form chạy trong fragment: lưu đơn chỉ chạy lại form, không chạy lại cả trang
 # ============================================================
-with tab1:
-    st.subheader("Nhập đơn hàng")
+ORDER_EXTRAS = {
+    "Loại sản phẩm": ["nv","pn","AQ500","Aqua 350","Aqua 500","Aqua 1.5l","Aqua 5l","Ocany 350","Ocany 600","Ocany 1.5l","Phú Ninh vòi","Phú Ninh up","Thạch Bích vòi","EDen500","Ion_pro"],
+    "Loại bình": ["bình","Bình","thùng"],
+    "PP Thanh toán": ["Tiền Mặt","Chuyển Khoản","Kí Giấy"],
+    "Người chở": ["Pháp","Sâm","Khoa"],
+}
+
+def order_options():
+    """Danh sách chọn của form đơn (Đường, Loại sản phẩm...), dùng chung giữa các
+    phiên và chỉ tính lại khi LOOKUPS/INVENTORY đổi."""
+    def merge(vals, extra=()):
+        vals = [str(x).strip() for x in list(vals) + list(extra) if str(x).strip()]
+        return sorted(dict.fromkeys(vals))
+
+    def compute():
+        out = {"Đường": merge(options("Đường"))}
+        for kind, extra in ORDER_EXTRAS.items():
+            if kind == "Loại sản phẩm":
+                extra = items_from_inventory() + extra
+            out[kind] = merge(options(kind), extra)
+        return out
+    try:
+        return cached_by_version("order_options", ("LOOKUPS", "INVENTORY"), (), compute)
+    except APIError as e:
+        st.warning(describe_api_error(e))
+        return {"Đường": [], **{k: merge([], v) for k, v in ORDER_EXTRAS.items()}}
+
+def ledger_line(name) -> str:
+    """Số dư vỏ & tiền của một khách (sổ CONG_NO) để hiện cạnh form đơn.
+    Khách app vừa ghi số dư thì lấy từ bộ nhớ, không đọc lại CONG_NO."""
+    name = str(name or "").strip()
+    if not name:
+        return ""
+    found = recent_balance(name)
+    try:
+        if found is None:
+            found = customer_ledger([name])
+    except APIError as e:
+        return describe_api_error(e)
+    if found.empty:
+        return f"{name}: chưa có đơn nào."
+    r = found.iloc[0]
+    return (f"{r['Khách hàng']}: đang giữ {r['Vỏ còn nợ']:,} vỏ, còn nợ {r['Còn nợ']:,} đ"
+            + (f" (đơn cuối {r['Đơn cuối']})" if r["Đơn cuối"] else ""))
+
+def _pick(opts, value, fallback=0):
+    return opts.index(value) if value in opts else fallback
+
+# key các ô của form: xoá sau mỗi lần lưu; ô "giữ" chỉ xoá khi tắt chế độ nhập nhanh
+ORDER_FIELDS = {
+    "XE_MAY": ["xm_khach", "xm_duong", "xm_duong_new", "xm_loaisp", "xm_loaibinh", "xm_soluong", "xm_vove",
+               "xm_thanhtoan", "xm_pp", "xm_ghichu"],
+    "OTO": ["oto_khach", "oto_loaisp", "oto_loaibinh", "oto_soluong", "oto_dongia", "oto_thanhtoan", "oto_pp", "oto_ghichu"],
+}
+ORDER_KEEP = {"XE_MAY": ["xm_ngay", "xm_nguoi"], "OTO": ["oto_ngay", "oto_nguoi1", "oto_nguoi2"]}
+
+def _save_order(ws):
+    """Callback của nút lưu: chạy trước lần rerun của fragment nên được phép xoá ô đã nhập."""
+    ss = st.session_state
+    new_duong = None
+    if ws == "XE_MAY":
+        duong = ss["xm_duong"]
+        if duong == "(khác)" and ss.get("xm_duong_new", "").strip():
+            duong = new_duong = ss["xm_duong_new"].strip()
+        row = [fmt_date(ss["xm_ngay"]), ss["xm_khach"], "", duong, ss["xm_loaisp"], ss["xm_loaibinh"], ss["xm_soluong"],
+               ss["xm_vove"], ss["xm_thanhtoan"], ss["xm_pp"], ss["xm_ghichu"], ss["xm_nguoi"]]
+        msg = f"Đã lưu đơn Xe máy: {ss['xm_khach']} – {ss['xm_loaisp']} × {ss['xm_soluong']}"
+    else:
+        row = [fmt_date(ss["oto_ngay"]), ss["oto_khach"], ss["oto_loaisp"], ss["oto_loaibinh"], ss["oto_soluong"], ss["oto_dongia"],
+               ss["oto_thanhtoan"], ss["oto_pp"], ss["oto_ghichu"], ss["oto_nguoi1"], ss["oto_nguoi2"]]
+        msg = f"Đã lưu đơn Ô tô: {ss['oto_khach']} – {ss['oto_loaisp']} × {ss['oto_soluong']}"
+    try:
+        append_row(ws, row)
+        if new_duong:
+            add_lookup("Đường", new_duong)   # chỉ thêm vào danh mục khi đơn đã ghi được
+    except APIError as e:
+        ss["order_msg"] = ("error", describe_api_error(e))
+        return
+    if get_write_queue() is not None:
+        msg += " (đang chờ ghi lên Google Sheets)"
+    bal = ledger_line(ss["xm_khach" if ws == "XE_MAY" else "oto_khach"])
+    ss["order_msg"] = ("success", msg + (f" · {bal}" if bal else ""))
+    for k in ORDER_FIELDS[ws] + ([] if ss.get("order_rapid") else ORDER_KEEP[ws]):
+        ss.pop(k, None)
+
+@st.fragment
+def order_entry():
     subcol = st.radio("Loại phương tiện", ["Xe máy", "Ô tô"], horizontal=True, key="veh_type")
-
-    duong_opts = safe_options("Đường")
-    loaisp_opts = safe_options(
-        "Loại sản phẩm",
-        extra=safe_inventory_items() + ["nv","pn","AQ500","Aqua 350","Aqua 500","Aqua 1.5l","Aqua 5l","Ocany 350","Ocany 600","Ocany 1.5l","Phú Ninh vòi","Phú Ninh up","Thạch Bích vòi","EDen500","Ion_pro"]
-    )
-    loaibinh_opts = safe_options("Loại bình", extra=["bình","Bình","thùng"])
-    pp_opts = safe_options("PP Thanh toán", extra=["Tiền Mặt","Chuyển Khoản","Kí Giấy"])
-    shipper_opts = safe_options("Người chở", extra=["Pháp","Sâm","Khoa"])
+    st.toggle("Nhập nhanh (giữ ngày & người chở cho đơn sau)", key="order_rapid")
+    opts = order_options()
+    duong_opts, loaisp_opts = opts["Đường"], opts["Loại sản phẩm"]
+    loaibinh_opts, pp_opts, shipper_opts = opts["Loại bình"], opts["PP Thanh toán"], opts["Người chở"]
+    kind, msg = st.session_state.pop("order_msg", (None, None))
+    if kind == "success":
+        st.success(msg)
+    elif kind == "error":
+        st.error(msg)
+    # tra nhanh công nợ: chỉ chạy lại fragment, đọc sổ CONG_NO chứ không quét lịch sử đơn
+    kh = st.text_input("Tra công nợ khách hàng", key="ledger_kh", placeholder="Tên khách / số địa chỉ")
+    if kh.strip():
+        st.caption(ledger_line(kh))
 
     if subcol == "Xe máy":
-        with st.form("form_xemay", clear_on_submit=True):
-            Ngay = st.date_input("Ngày (dd-mm-yyyy)", pd.Timestamp.today(), key="xm_ngay")
-            Khach = st.text_input("Khách hàng (hoặc số địa chỉ)", key="xm_khach")
+        with st.form("form_xemay"):
+            st.date_input("Ngày (dd-mm-yyyy)", pd.Timestamp.today(), key="xm_ngay")
+            st.text_input("Khách hàng (hoặc số địa chỉ)", key="xm_khach")
             # BỎ "Code": không hiển thị, ghi rỗng khi lưu
-            Duong = st.selectbox("Đường", duong_opts + ["(khác)"] if duong_opts else ["(khác)"], key="xm_duong")
-            if Duong == "(khác)":
-                duong_new = st.text_input("Nhập tên đường mới", key="xm_duong_new")
-                if duong_new:
-                    add_lookup("Đường", duong_new)
-                    Duong = duong_new
-            LoaiSP = st.selectbox("Loại sản phẩm", loaisp_opts, key="xm_loaisp")
-            LoaiBinh = st.selectbox("Loại bình", loaibinh_opts, key="xm_loaibinh")
-            SoLuong = st.number_input("Số lượng giao", min_value=0, step=1, value=0, key="xm_soluong")
-            VoVe = st.text_input("Vỏ về (số hoặc 'x' nếu không)", key="xm_vove")
-            ThanhToan = st.text_input("Thanh Toán (số tiền)", key="xm_thanhtoan")
-            PP = st.selectbox("PP Thanh toán", pp_opts, key="xm_pp")
-            GhiChu = st.text_input("Chú thích", key="xm_ghichu")
+            st.selectbox("Đường", duong_opts + ["(khác)"] if duong_opts else ["(khác)"], key="xm_duong")
+            st.text_input("Tên đường mới (khi chọn \"(khác)\")", key="xm_duong_new")
+            st.selectbox("Loại sản phẩm", loaisp_opts, key="xm_loaisp")
+            st.selectbox("Loại bình", loaibinh_opts, key="xm_loaibinh")
+            st.number_input("Số lượng giao", min_value=0, step=1, value=0, key="xm_soluong")
+            st.text_input("Vỏ về (số hoặc 'x' nếu không)", key="xm_vove")
+            st.text_input("Thanh Toán (số tiền)", key="xm_thanhtoan")
+            st.selectbox("PP Thanh toán", pp_opts, key="xm_pp")
+            st.text_input("Chú thích", key="xm_ghichu")
             # Mặc định người chở = Pháp (có thể đổi)
-            default_ship = "Pháp" if "Pháp" in shipper_opts else (shipper_opts[0] if shipper_opts else "")
-            NguoiCho = st.selectbox("Người chở", shipper_opts, index=shipper_opts.index(default_ship) if default_ship in shipper_opts else 0, key="xm_nguoi")
-            submitted = st.form_submit_button("Lưu đơn (XE_MAY)", type="primary", use_container_width=True)
-            if submitted:
-                append_row("XE_MAY", [fmt_date(Ngay), Khach, "", Duong, LoaiSP, LoaiBinh, SoLuong, VoVe, ThanhToan, PP, GhiChu, NguoiCho])
-                st.success("Đã lưu đơn Xe máy!")
+            st.selectbox("Người chở", shipper_opts, index=_pick(shipper_opts, "Pháp"), key="xm_nguoi")
+            st.form_submit_button("Lưu đơn (XE_MAY)", type="primary", use_container_width=True,
+                                  on_click=_save_order, args=("XE_MAY",))
     else:
-        with st.form("form_oto", clear_on_submit=True):
-            Ngay = st.date_input("Ngày (dd-mm-yyyy)", pd.Timestamp.today(), key="oto_ngay")
-            Khach = st.text_input("Khách hàng (hoặc số địa chỉ)", key="oto_khach")
-            LoaiSP = st.selectbox("Loại sản phẩm", loaisp_opts, key="oto_loaisp")
-            LoaiBinh = st.selectbox("Loại bình", loaibinh_opts, key="oto_loaibinh")
-            SoLuong = st.number_input("Số lượng", min_value=0, step=1, value=0, key="oto_soluong")
-            DonGia = st.text_input("Đơn giá (số)", key="oto_dongia")
-            ThanhToan = st.text_input("Thanh Toán (số tiền)", key="oto_thanhtoan")
-            PP = st.selectbox("PP Thanh toán", pp_opts, key="oto_pp")
-            GhiChu = st.text_input("Chú thích", key="oto_ghichu")
+        with st.form("form_oto"):
+            st.date_input("Ngày (dd-mm-yyyy)", pd.Timestamp.today(), key="oto_ngay")
+            st.text_input("Khách hàng (hoặc số địa chỉ)", key="oto_khach")
+            st.selectbox("Loại sản phẩm", loaisp_opts, key="oto_loaisp")
+            st.selectbox("Loại bình", loaibinh_opts, key="oto_loaibinh")
+            st.number_input("Số lượng", min_value=0, step=1, value=0, key="oto_soluong")
+            st.text_input("Đơn giá (số)", key="oto_dongia")
+            st.text_input("Thanh Toán (số tiền)", key="oto_thanhtoan")
+            st.selectbox("PP Thanh toán", pp_opts, key="oto_pp")
+            st.text_input("Chú thích", key="oto_ghichu")
             # Mặc định người chở 1 = Sâm, 2 = Khoa (có thể đổi)
-            def_idx1 = shipper_opts.index("Sâm") if "Sâm" in shipper_opts else 0
-            def_idx2 = shipper_opts.index("Khoa") if "Khoa" in shipper_opts else (1 if len(shipper_opts) > 1 else 0)
-            NguoiCho1 = st.selectbox("Người chở 1", shipper_opts + [""], index=def_idx1, key="oto_nguoi1")
-            NguoiCho2 = st.selectbox("Người chở 2", shipper_opts + [""], index=def_idx2, key="oto_nguoi2")
-            submitted = st.form_submit_button("Lưu đơn (OTO)", type="primary", use_container_width=True)
-            if submitted:
-                append_row("OTO", [fmt_date(Ngay), Khach, LoaiSP, LoaiBinh, SoLuong, DonGia, ThanhToan, PP, GhiChu, NguoiCho1, NguoiCho2])
-                st.success("Đã lưu đơn Ô tô!")
+            ship = shipper_opts + [""]
+            st.selectbox("Người chở 1", ship, index=_pick(ship, "Sâm"), key="oto_nguoi1")
+            st.selectbox("Người chở 2", ship, index=_pick(ship, "Khoa", 1 if len(shipper_opts) > 1 else 0), key="oto_nguoi2")
+            st.form_submit_button("Lưu đơn (OTO)", type="primary", use_container_width=True,
+                                  on_click=_save_order, args=("OTO",))
+
+def view_nhap_don():
+    st.subheader("Nhập đơn hàng")
+    order_entry()
 
 # ============================================================
-# TAB 2: Thống kê (lọc KH, Loại SP, PP; hiển thị SL Giao, Vỏ đi, Vỏ về theo ngày)
+# VIEW 2: Thống kê (lọc KH, Loại SP, PP; hiển thị SL Giao, Vỏ đi, Vỏ về theo ngày)
 # ============================================================
-with tab2:
+def view_thong_ke():
     st.subheader("Thống kê đơn hàng theo ngày (dd-mm-yyyy)")
 
     c1, c2, c3 = st.columns([1,1,1])
@@ -133,79 +203,64 @@ with tab2:
     with c3:
         date_to = st.date_input("Đến ngày", pd.Timestamp.today(), key="stat_to")
 
-    # Tải dữ liệu
-    frames = []
-    for s in src:
+    by_kh = st.toggle("Lọc theo khách hàng (đọc đơn chi tiết, chậm hơn)", key="stat_by_kh")
+
+    # Tải dữ liệu: mặc định đọc bảng tổng hợp DAILY_AGG; lọc theo khách thì phải đọc đơn gốc
+    df, failed = pd.DataFrame(), []
+    if by_kh:
+        frames, errors = [], {}
+        # các nguồn đọc song song: chờ bằng nguồn chậm nhất
+        for s, d in read_many(src, date_from, date_to, errors=errors).items():
+            m = order_measures(s, d)
+            if not m.empty:
+                m["Khách"] = d.loc[m.index].get("Khách hàng", "")
+                frames.append(m)
+        for s, e in errors.items():
+            failed.append(s)
+            st.warning(f"Không đọc được {s}. {describe_api_error(e)}")
+        if frames:
+            df = pd.concat(frames, ignore_index=True)
+    else:
         try:
-            d = read_df(s)
-            if not d.empty:
-                d["Nguồn"] = s
-                frames.append(d)
-        except Exception:
-            pass
-
-    if not frames:
-        st.info("Chưa có dữ liệu.")
+            df = daily_agg(date_from, date_to)
+            df = df[df["Nguồn"].isin(src)]
+        except APIError as e:
+            failed.append("DAILY_AGG")
+            st.warning(f"Không đọc được DAILY_AGG. {describe_api_error(e)}")
+
+    if df.empty:
+        if not failed:
+            st.info("Chưa có dữ liệu.")
     else:
-        df = pd.concat(frames, ignore_index=True)
-        df["Ngày"] = df["Ngày"].apply(parse_any_date)
-        df = df.dropna(subset=["Ngày"])
-        df = df[(df["Ngày"] >= pd.to_datetime(date_from)) & (df["Ngày"] <= pd.to_datetime(date_to))]
-
-        # Chuẩn hoá cột để filter
-        df["Khách"] = df.get("Khách hàng/Địa chỉ", df.get("Khách hàng", ""))
-        df["Loại sản phẩm"] = df.get("Loại sản phẩm", "")
-        df["PP Thanh toán"] = df.get("PP Thanh toán", "")
-
         f1, f2, f3 = st.columns(3)
         with f1:
-            kh_filter = st.multiselect("Khách hàng", sorted(df["Khách"].dropna().astype(str).unique().tolist()), key="stat_kh")
+            if by_kh:
+                kh_filter = st.multiselect("Khách hàng", sorted(df["Khách"].dropna().astype(str).unique().tolist()), key="stat_kh")
+                if kh_filter:
+                    df = df[df["Khách"].astype(str).isin(kh_filter)]
         with f2:
-            lsp_filter = st.multiselect("Loại sản phẩm", sorted(df["Loại sản phẩm"].dropna().astype(str).unique().tolist()), key="stat_lsp")
+            lsp_filter = st.multiselect("Loại sản phẩm", sorted(df["Loại sản phẩm"].unique().tolist()), key="stat_lsp")
         with f3:
-            pp_filter = st.multiselect("PP Thanh toán", sorted(df["PP Thanh toán"].dropna().astype(str).unique().tolist()), key="stat_pp")
+            pp_filter = st.multiselect("PP Thanh toán", sorted(df["PP Thanh toán"].unique().tolist()), key="stat_pp")
 
-        if kh_filter:
-            df = df[df["Khách"].astype(str).isin(kh_filter)]
         if lsp_filter:
-            df = df[df["Loại sản phẩm"].astype(str).isin(lsp_filter)]
+            df = df[df["Loại sản phẩm"].isin(lsp_filter)]
         if pp_filter:
-            df = df[df["PP Thanh toán"].astype(str).isin(pp_filter)]
-
-        # Tính chỉ số
-        def to_num(x):
-            try:
-                return float(str(x).replace(",", ""))
-            except:
-                return pd.NA
-
-        df["SL_Giao"] = 0.0
-        df["Vo_ve"] = 0.0
-
-        mask_xm = df["Nguồn"] == "XE_MAY"
-        df.loc[mask_xm, "SL_Giao"] = pd.to_numeric(df.loc[mask_xm, "Số lượng giao"], errors="coerce").fillna(0)
-        # Vỏ đi ~ số lượng giao, Vỏ về lấy số nếu có (k ký tự 'x' sẽ thành NaN -> 0)
-        df["Vo_di"] = df["SL_Giao"]
-        df.loc[mask_xm, "Vo_ve"] = pd.to_numeric(df.loc[mask_xm, "Vỏ về"], errors="coerce").fillna(0)
-
-        mask_oto = df["Nguồn"] == "OTO"
-        df.loc[mask_oto, "SL_Giao"] = pd.to_numeric(df.loc[mask_oto, "Số lượng"], errors="coerce").fillna(0)
-        # Ô tô: không tính vỏ
-        df.loc[mask_oto, ["Vo_di","Vo_ve"]] = 0
-
-        # Group theo ngày
-        grp = df.groupby(df["Ngày"].dt.date).agg(
+            df = df[df["PP Thanh toán"].isin(pp_filter)]
+
+        # Group theo ngày (XE_MAY: vỏ đi = SL giao; Ô tô: không tính vỏ — xem utils/dailyagg.py)
+        grp = df.groupby(parse_dates(df["Ngày"]).rename("Mốc")).agg(
             SL_Giao=("SL_Giao","sum"),
             Vo_di=("Vo_di","sum"),
             Vo_ve=("Vo_ve","sum"),
-        ).reset_index().rename(columns={"Ngày":"Mốc"})
-        grp["Mốc"] = pd.to_datetime(grp["Mốc"]).dt.strftime(DATE_FMT_SAVE)
+        ).reset_index()
+        grp["Mốc"] = grp["Mốc"].dt.strftime(DATE_FMT_SAVE)
         st.dataframe(grp, use_container_width=True)
 
 # ============================================================
-# TAB 3: Chốt tồn kho ngày (bảng nhập nhanh theo sản phẩm)
+# VIEW 3: Chốt tồn kho ngày (bảng nhập nhanh theo sản phẩm)
 # ============================================================
-with tab3:
+def view_chot_ton():
     st.subheader("Chốt tồn kho theo bảng (điền số trực tiếp)")
     ngay_close = st.date_input("Ngày chốt (dd-mm-yyyy)", pd.Timestamp.today(), key="close_ngay_tbl")
     nguoi_nhap = st.text_input("Người nhập", value="", key="close_user_tbl")
@@ -215,24 +270,25 @@ with tab3:
         st.info("Chưa có danh sách Mặt hàng trong LOOKUPS/INVENTORY.")
     else:
         # Nạp dữ liệu đã có của ngày
-        dfc = read_df("DAILY_CLOSE")
+        dfc = read_df("DAILY_CLOSE", date_from=ngay_close, date_to=ngay_close)
+        block = dfc.copy()
         dfc_exists = pd.DataFrame(columns=["Mặt hàng","Tồn cuối","Ghi chú"])
         if not dfc.empty:
-            dfc["Ngày"] = dfc["Ngày"].apply(parse_any_date)
+            dfc["Ngày"] = parse_dates(dfc["Ngày"])
             sub = dfc[dfc["Ngày"].dt.date == pd.to_datetime(ngay_close).date()]
             if not sub.empty:
-                dfc_exists = sub[["Mặt hàng","Tồn cuối","Ghi chú"]].copy()
+                dfc_exists = plain(sub[["Loại sản phẩm","Tồn cuối","Ghi chú"]]).rename(columns={"Loại sản phẩm": "Mặt hàng"})
 
         base = pd.DataFrame({"Mặt hàng": items})
         base = base.merge(dfc_exists, on="Mặt hàng", how="left")
         base["Tồn cuối"] = pd.to_numeric(base["Tồn cuối"], errors="coerce").fillna(0).astype(int)
         base["Ghi chú"] = base["Ghi chú"].fillna("")
 
+        guard = EditGuard("close_editor", fmt_date(ngay_close), base, block, key_col="Mặt hàng")
         edited = st.data_editor(
             base,
             key="close_editor",
             use_container_width=True,
-            num_rows="dynamic",
             column_config={
                 "Mặt hàng": st.column_config.TextColumn(disabled=True),
                 "Tồn cuối": st.column_config.NumberColumn(min_value=0, step=1),
@@ -240,17 +296,19 @@ with tab3:
             }
         )
 
-        if st.button("Lưu chốt tồn (ghi đè ngày chọn)", key="close_save_tbl"):
+        guard.panel()
+        if st.button("Lưu chốt tồn (ghi đè ngày chọn)", key="close_save_tbl") or guard.pending():
             out = edited.copy()
             out.insert(0, "Ngày", fmt_date(ngay_close))
             out["Người nhập"] = nguoi_nhap
-            replace_rows_by_date("DAILY_CLOSE", "Ngày", fmt_date(ngay_close), out[["Ngày","Mặt hàng","Tồn cuối","Ghi chú","Người nhập"]])
-            st.success("Đã lưu chốt tồn cho ngày " + fmt_date(ngay_close))
+            out = out[["Ngày","Mặt hàng","Tồn cuối","Ghi chú","Người nhập"]]
+            if guard.save(lambda exp: replace_rows_by_date("DAILY_CLOSE", "Ngày", fmt_date(ngay_close), out, expected=exp)):
+                st.success("Đã lưu chốt tồn cho ngày " + fmt_date(ngay_close))
 
 # ============================================================
-# TAB 4: Điểm danh & Công (tick sáng/chiều theo nhân viên)
+# VIEW 4: Điểm danh & Công (tick sáng/chiều theo nhân viên)
 # ============================================================
-with tab4:
+def view_diem_danh():
     st.subheader("Điểm danh nhanh theo bảng")
     ngay_cong = st.date_input("Ngày (dd-mm-yyyy)", pd.Timestamp.today(), key="cong_ngay_tbl")
 
@@ -263,10 +321,11 @@ with tab4:
         st.info("Thêm danh mục Nhân viên (LOOKUPS) để điểm danh.")
     else:
         # Nạp công đã có của ngày
-        cong_df = read_df("CONG")
+        cong_df = read_df("CONG", date_from=ngay_cong, date_to=ngay_cong)
+        block = cong_df.copy()
         existed = pd.DataFrame(columns=["Nhân viên","Sáng","Chiều","Ghi chú"])
         if not cong_df.empty:
-            cong_df["Ngày"] = cong_df["Ngày"].apply(parse_any_date)
+            cong_df["Ngày"] = parse_dates(cong_df["Ngày"])
             sub = cong_df[cong_df["Ngày"].dt.date == pd.to_datetime(ngay_cong).date()]
             if not sub.empty:
                 # đưa về dạng 2 nửa ngày
@@ -287,6 +346,7 @@ with tab4:
         base["Chiều"] = base["Chiều"].fillna(False)
         base["Ghi chú"] = base["Ghi chú"].fillna("")
 
+        guard = EditGuard("cong_editor", fmt_date(ngay_cong), base, block, key_col="Nhân viên")
         edited = st.data_editor(
             base,
             key="cong_editor",
@@ -299,7 +359,8 @@ with tab4:
             }
         )
 
-        if st.button("Lưu công (ghi đè ngày chọn)", key="cong_save_tbl"):
+        guard.panel()
+        if st.button("Lưu công (ghi đè ngày chọn)", key="cong_save_tbl") or guard.pending():
             rows = []
             for _, r in edited.iterrows():
                 sang = bool(r.get("Sáng", False))
@@ -320,13 +381,13 @@ with tab4:
                     "Ghi chú": r.get("Ghi chú","")
                 })
             new = pd.DataFrame(rows, columns=["Ngày","Nhân viên","Ca","Công","Ghi chú"])
-            replace_rows_by_date("CONG", "Ngày", fmt_date(ngay_cong), new)
-            st.success("Đã lưu công cho ngày " + fmt_date(ngay_cong))
+            if guard.save(lambda exp: replace_rows_by_date("CONG", "Ngày", fmt_date(ngay_cong), new, expected=exp)):
+                st.success("Đã lưu công cho ngày " + fmt_date(ngay_cong))
 
 # ============================================================
-# TAB 5: Nhập hàng (bảng nhập theo sản phẩm)
+# VIEW 5: Nhập hàng (bảng nhập theo sản phẩm)
 # ============================================================
-with tab5:
+def view_nhap_hang():
     st.subheader("Nhập hàng theo bảng")
     ngay_nhap = st.date_input("Ngày nhập (dd-mm-yyyy)", pd.Timestamp.today(), key="nhap_ngay_tbl")
 
@@ -334,13 +395,15 @@ with tab5:
     if not items:
         st.info("Chưa có danh sách Mặt hàng trong LOOKUPS/INVENTORY.")
     else:
-        nhap = read_df("NHAP_HANG")
+        nhap = read_df("NHAP_HANG", date_from=ngay_nhap, date_to=ngay_nhap)
+        block = nhap.copy()
         existed = pd.DataFrame(columns=["Mặt hàng","Số lượng nhập","Đơn giá","Nhà cung cấp","Ghi chú"])
         if not nhap.empty:
-            nhap["Ngày"] = nhap["Ngày"].apply(parse_any_date)
+            nhap["Ngày"] = parse_dates(nhap["Ngày"])
             sub = nhap[nhap["Ngày"].dt.date == pd.to_datetime(ngay_nhap).date()]
             if not sub.empty:
-                existed = sub[["Mặt hàng","Số lượng nhập","Đơn giá","Nhà cung cấp","Ghi chú"]].copy()
+                existed = plain(sub[["Loại sản phẩm","Số lượng nhập","Đơn giá","Nhà cung cấp","Ghi chú"]]) \
+                    .rename(columns={"Loại sản phẩm": "Mặt hàng"})
 
         base = pd.DataFrame({"Mặt hàng": items})
         base = base.merge(existed, on="Mặt hàng", how="left")
@@ -349,6 +412,7 @@ with tab5:
         base["Nhà cung cấp"] = base["Nhà cung cấp"].fillna("")
         base["Ghi chú"] = base["Ghi chú"].fillna("")
 
+        guard = EditGuard("nhap_editor", fmt_date(ngay_nhap), base, block, key_col="Mặt hàng")
         edited = st.data_editor(
             base,
             key="nhap_editor",
@@ -362,9 +426,20 @@ with tab5:
             }
         )
 
-        if st.button("Lưu nhập hàng (ghi đè ngày chọn)", key="nhap_save_tbl"):
+        guard.panel()
+        if st.button("Lưu nhập hàng (ghi đè ngày chọn)", key="nhap_save_tbl") or guard.pending():
             out = edited.copy()
             out.insert(0, "Ngày", fmt_date(ngay_nhap))
-            replace_rows_by_date("NHAP_HANG", "Ngày", fmt_date(ngay_nhap),
-                                 out[["Ngày","Mặt hàng","Số lượng nhập","Đơn giá","Nhà cung cấp","Ghi chú"]])
-            st.success("Đã lưu nhập hàng cho ngày " + fmt_date(ngay_nhap))
+            out = out[["Ngày","Mặt hàng","Số lượng nhập","Đơn giá","Nhà cung cấp","Ghi chú"]]
+            if guard.save(lambda exp: replace_rows_by_date("NHAP_HANG", "Ngày", fmt_date(ngay_nhap), out, expected=exp)):
+                st.success("Đã lưu nhập hàng cho ngày " + fmt_date(ngay_nhap))
+
+# ========= Chỉ chạy view đang mở =========
+# Danh mục (LOOKUPS/INVENTORY) đọc trước trong 1 request; sheet theo ngày chỉ đọc đúng khoảng ngày cần
+route({
+    "Nhập đơn hàng": View(view_nhap_don, ("LOOKUPS", "INVENTORY"), ("veh_type", "order_rapid")),
+    "Thống kê": View(view_thong_ke, (), ("stat_src", "stat_from", "stat_to", "stat_by_kh")),
+    "Chốt tồn kho ngày": View(view_chot_ton, ("LOOKUPS", "INVENTORY"), ("close_ngay_tbl", "close_user_tbl")),
+    "Điểm danh & Công": View(view_diem_danh, ("LOOKUPS",), ("cong_ngay_tbl",)),
+    "Nhập hàng": View(view_nhap_hang, ("LOOKUPS", "INVENTORY"), ("nhap_ngay_tbl",)),
+}, key="dh_view")
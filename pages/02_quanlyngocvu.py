@@ -4,46 +4,41 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date, timedelta
-from utils.gs import read_df, write_df, options
-
-DATE_FMT_SAVE = "%d-%m-%Y"
+from utils.gs import read_df, replace_rows_by_date, replace_rows_by_month, month_block, options, rebuild_daily_agg, get_daily_agg, reconciliation, \
+    get_cold_store, close_month, get_partitioned, migrate_partitions, items_from_inventory, customer_ledger, rebuild_ledger, \
+    get_ledger, revenue_cube
+from utils.coldstore import COLD_SHEETS
+from utils.dates import fmt_date
+from utils.quota import describe_api_error
+from utils.metrics import begin_run
+from utils.views import route, View
+from utils.cube import DIMS, GRAINS
+from utils.schema import plain
+from utils.payroll import payroll, parse_months, months_range, to_luong, norm_month
+from utils.reconcile import day_summary
+from utils.attendance import month_matrix, merge_month
+from utils.ledger import LEDGER_SHEET
+from utils.conflicts import EditGuard
+from gspread.exceptions import APIError
 
 # ---------- Helpers ----------
-def parse_any_date(s):
-    if pd.isna(s): return pd.NaT
-    if isinstance(s, (datetime, date)): return pd.to_datetime(s)
-    s = str(s).strip()
-    for fmt in ["%d-%m-%Y","%d/%m/%Y","%Y-%m-%d"]:
-        try: return pd.to_datetime(s, format=fmt, dayfirst=True)
-        except: pass
-    return pd.to_datetime(s, dayfirst=True, errors="coerce")
-
-def fmt_date(d):
-    if pd.isna(d): return ""
-    if isinstance(d, (pd.Timestamp, datetime, date)): return pd.to_datetime(d).strftime(DATE_FMT_SAVE)
-    return str(d)
-
 def safe_options(kind):
     try:
         vals = options(kind) or []
         vals = [v for v in vals if str(v).strip()]
         return sorted(set(vals))
-    except Exception:
+    except APIError as e:
+        st.warning(describe_api_error(e))
         return []
 
 def products_all():
-    """Danh sách Loại sản phẩm: ưu tiên LOOKUPS, cộng thêm từ đơn phòng khi thiếu."""
-    base = safe_options("Loại sản phẩm")
-    add = []
-    for ws in ["XE_MAY","OTO"]:
-        try:
-            df = read_df(ws)
-            if not df.empty and "Loại sản phẩm" in df.columns:
-                add += df["Loại sản phẩm"].dropna().astype(str).tolist()
-        except:
-            pass
-    return sorted({x.strip() for x in list(base)+add if str(x).strip()})
+    """Danh sách Loại sản phẩm từ LOOKUPS + INVENTORY (không quét toàn bộ đơn)."""
+    try:
+        inv = items_from_inventory()
+    except APIError as e:
+        st.warning(f"Không đọc được INVENTORY. {describe_api_error(e)}")
+        inv = []
+    return sorted({str(x).strip() for x in safe_options("Loại sản phẩm") + inv if str(x).strip()})
 
 def month_days(month_str):
     """month_str: 'mm/YYYY' -> trả về list Timestamp từng ngày trong tháng."""
@@ -57,251 +52,183 @@ def month_days(month_str):
 # ---------- UI ----------
 st.set_page_config(page_title="quanlyngocvu", layout="wide")
 st.title("Quản lý Ngọc Vũ")
-
-tab1, tab2, tab3, tab4, tab5 = st.tabs(
-    ["Thống kê doanh thu", "Đối chiếu tồn kho", "Lương & Hoa hồng", "Chấm công (tháng)", "Thiết lập (PAY/Commission)"]
-)
+begin_run("quanlyngocvu")
 
 # =======================
-# TAB 1: Thống kê doanh thu (filter từ LOOKUPS)
+# VIEW 1: Thống kê doanh thu (filter từ LOOKUPS)
 # =======================
-with tab1:
-    st.subheader("Báo cáo theo ngày với bộ lọc đầy đủ")
+def view_thong_ke():
+    st.subheader("Doanh thu theo ngày / tuần / tháng với bộ lọc đầy đủ")
 
-    c1, c2, c3 = st.columns([1,1,1])
+    c1, c2, c3, c4 = st.columns([1,1,1,1])
     with c1:
         src = st.multiselect("Nguồn", ["XE_MAY","OTO"], default=["XE_MAY","OTO"], key="ql_stat_src")
     with c2:
         dfrom = st.date_input("Từ ngày", pd.Timestamp.today().replace(day=1), key="ql_stat_from")
     with c3:
         dto = st.date_input("Đến ngày", pd.Timestamp.today(), key="ql_stat_to")
+    with c4:
+        grain = st.radio("Theo", list(GRAINS), horizontal=True, key="ql_stat_grain")
 
-    frames = []
-    for s in src:
-        try:
-            d = read_df(s)
-            if not d.empty:
-                d["Nguồn"] = s
-                frames.append(d)
-        except:
-            pass
-
-    if not frames:
-        st.info("Chưa có dữ liệu.")
-    else:
-        df = pd.concat(frames, ignore_index=True)
-        df["Ngày"] = pd.to_datetime(df["Ngày"], errors="coerce", dayfirst=True)
-        df = df.dropna(subset=["Ngày"])
-        df = df[(df["Ngày"] >= pd.to_datetime(dfrom)) & (df["Ngày"] <= pd.to_datetime(dto))]
-
-        # Khách từ data; LSP & PP lấy từ LOOKUPS để chặt chẽ
-        df["Khách"] = df.get("Khách hàng/Địa chỉ", df.get("Khách hàng", ""))
-        lsp_opts = safe_options("Loại sản phẩm")
-        pp_opts = safe_options("PP Thanh toán")
-
-        f1, f2, f3 = st.columns(3)
+    # Cube dựng một lần cho mỗi version dữ liệu (utils/cube.py); đổi bộ lọc/chia theo chỉ cắt lát bảng đã gộp
+    try:
+        cube = revenue_cube()
+    except APIError as e:
+        cube = None
+        st.warning(f"Không đọc được XE_MAY/OTO. {describe_api_error(e)}")
+
+    if cube is not None and (not len(cube) or not src):
+        st.info("Chưa có dữ liệu." if not len(cube) else "Chọn ít nhất một nguồn.")
+    elif cube is not None:
+        filters = {"Nguồn": src}
+        f1, f2, f3, f4 = st.columns(4)
         with f1:
-            kh = st.multiselect("Khách hàng", sorted(df["Khách"].dropna().astype(str).unique().tolist()), key="ql_stat_kh")
+            filters["Khách hàng"] = st.multiselect("Khách hàng", cube.members("Khách hàng"), key="ql_stat_kh")
         with f2:
-            lsp = st.multiselect("Loại sản phẩm", lsp_opts, key="ql_stat_lsp")
+            filters["Loại sản phẩm"] = st.multiselect("Loại sản phẩm", cube.members("Loại sản phẩm"), key="ql_stat_lsp")
         with f3:
-            pp = st.multiselect("PP Thanh toán", pp_opts, key="ql_stat_pp")
-
-        if kh:  df = df[df["Khách"].astype(str).isin(kh)]
-        if lsp: df = df[df.get("Loại sản phẩm","").astype(str).isin(lsp)]
-        if pp:  df = df[df.get("PP Thanh toán","").astype(str).isin(pp)]
-
-        # KPIs an toàn cột
-        df["SL_Giao"] = 0.0; df["Vo_di"] = 0.0; df["Vo_ve"] = 0.0
-        m_xm = df["Nguồn"] == "XE_MAY"
-        if "Số lượng giao" in df.columns:
-            df.loc[m_xm,"SL_Giao"] = pd.to_numeric(df.loc[m_xm,"Số lượng giao"], errors="coerce").fillna(0)
-        if "Vỏ về" in df.columns:
-            df.loc[m_xm,"Vo_ve"] = pd.to_numeric(df.loc[m_xm,"Vỏ về"], errors="coerce").fillna(0)
-        df.loc[m_xm,"Vo_di"] = df.loc[m_xm,"SL_Giao"]
-
-        m_ot = df["Nguồn"] == "OTO"
-        if "Số lượng" in df.columns:
-            df.loc[m_ot,"SL_Giao"] = pd.to_numeric(df.loc[m_ot,"Số lượng"], errors="coerce").fillna(0)
-        df.loc[m_ot,["Vo_di","Vo_ve"]] = 0
-
-        rpt = df.groupby(df["Ngày"].dt.date).agg(
-            SL_Giao=("SL_Giao","sum"),
-            Vo_di=("Vo_di","sum"),
-            Vo_ve=("Vo_ve","sum"),
-        ).reset_index().rename(columns={"Ngày":"Mốc"})
-        rpt["Mốc"] = pd.to_datetime(rpt["Mốc"]).dt.strftime(DATE_FMT_SAVE)
-        st.dataframe(rpt, use_container_width=True)
+            filters["PP Thanh toán"] = st.multiselect("PP Thanh toán", cube.members("PP Thanh toán"), key="ql_stat_pp")
+        with f4:
+            filters["Người chở"] = st.multiselect("Người chở", cube.members("Người chở"), key="ql_stat_ship")
+        by = st.multiselect("Chia theo", [d for d in DIMS if d != "Nguồn" or len(src) > 1], key="ql_stat_by")
+
+        total = cube.query(None, (), dfrom, dto, filters).iloc[0]
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Số đơn", f"{int(total['Số đơn']):,}")
+        m2.metric("SL giao", f"{int(total['SL_Giao']):,}")
+        m3.metric("Vỏ đi / về", f"{int(total['Vo_di']):,} / {int(total['Vo_ve']):,}")
+        m4.metric("Doanh thu", f"{int(total['Thanh Toán']):,}")
+
+        rpt = cube.query(grain, by, dfrom, dto, filters)
+        st.dataframe(rpt.rename(columns={"Thanh Toán": "Doanh thu"}), use_container_width=True, hide_index=True)
+
+    with st.expander("Bảng tổng hợp DAILY_AGG"):
+        st.caption("DAILY_AGG được cộng dồn mỗi khi ghi đơn. Nếu sửa tay XE_MAY/OTO trên Google Sheets thì bấm dựng lại.")
+        agg_err = get_daily_agg().error
+        if agg_err is not None:
+            st.warning(f"Lần cập nhật DAILY_AGG gần nhất bị lỗi ({agg_err}); nên dựng lại.")
+        if st.button("Dựng lại DAILY_AGG từ XE_MAY + OTO", key="agg_rebuild"):
+            n = rebuild_daily_agg()
+            st.success(f"Đã dựng lại DAILY_AGG: {n} dòng.")
+
+    with st.expander("Kho lịch sử (tháng đã chốt)"):
+        store = get_cold_store()
+        if store is None:
+            st.caption("Chưa bật. Đặt [storage] COLD_DIR trong secrets (thư mục được giữ lại giữa các lần khởi động) "
+                       "để chuyển các tháng đã qua của " + ", ".join(COLD_SHEETS) + " khỏi Google Sheets; "
+                       "báo cáo nhiều tháng và lương các tháng cũ khi đó đọc từ file cục bộ.")
+        else:
+            prev = (pd.Timestamp.today().replace(day=1) - pd.Timedelta(days=1)).strftime("%m/%Y")
+            thang_cold = st.text_input("Tháng cần chốt (mm/YYYY)", value=prev, key="cold_month")
+            ok = st.checkbox("Tôi hiểu: các dòng của tháng này bị xoá khỏi Google Sheets sau khi lưu vào kho lịch sử",
+                             key="cold_confirm")
+            if st.button("Chốt tháng", key="cold_close", disabled=not ok):
+                for ws in COLD_SHEETS:
+                    try:
+                        n = close_month(ws, thang_cold)
+                        st.success(f"{ws}: đã chuyển {n} dòng tháng {thang_cold} sang kho lịch sử.")
+                    except ValueError as e:
+                        st.error(str(e))
+                        break
+                    except APIError as e:
+                        st.warning(f"{ws}: chưa chốt được. {describe_api_error(e)}")
+            st.dataframe(pd.DataFrame({"Sheet": COLD_SHEETS,
+                                       "Tháng đã chốt": [", ".join(pd.Period(m).strftime("%m/%Y") for m in store.months(ws))
+                                                         for ws in COLD_SHEETS]}),
+                         use_container_width=True, hide_index=True)
+
+    with st.expander("Chia sheet đơn theo tháng"):
+        parted = sorted(get_partitioned())
+        if not parted:
+            st.caption("Chưa bật. Đặt [sheets] PARTITION_SHEETS = [\"XE_MAY\", \"OTO\"] trong secrets: đơn mới ghi vào "
+                       "sheet của tháng (XE_MAY_2025_08...), thống kê một tháng chỉ đọc sheet của tháng đó.")
+        else:
+            st.caption("Đơn mới của " + ", ".join(parted) + " ghi vào sheet theo tháng. Đơn cũ còn trong sheet gốc vẫn "
+                       "được đọc; bấm nút dưới để chuyển chúng sang sheet theo tháng (chạy lại được).")
+            if st.button("Chuyển đơn cũ sang sheet theo tháng", key="part_migrate"):
+                for ws in parted:
+                    try:
+                        moved = migrate_partitions(ws)
+                        st.success(f"{ws}: " + (", ".join(f"{t} ({n} dòng)" for t, n in moved.items())
+                                                or "không còn dòng nào cần chuyển."))
+                    except APIError as e:
+                        st.warning(f"{ws}: chưa chuyển xong. {describe_api_error(e)}")
 
 # =======================
-# TAB 2: Đối chiếu tồn kho theo ngày (X + K - Y vs Xuất thực tế)
+# VIEW 2: Đối chiếu tồn kho theo ngày / khoảng ngày (X + K - Y vs Xuất thực tế)
 # =======================
-with tab2:
+def view_doi_chieu():
     st.subheader("Đối chiếu tồn kho theo ngày")
-    ngay_dc = st.date_input("Ngày đối chiếu (dd-mm-yyyy)", pd.Timestamp.today(), key="dc_ngay")
-    prev_day = pd.to_datetime(ngay_dc) - timedelta(days=1)
-
-    # DAILY_CLOSE (Loại sản phẩm, Tồn cuối)
-    close = read_df("DAILY_CLOSE")
-    if not close.empty and "Ngày" in close.columns:
-        close["Ngày"] = pd.to_datetime(close["Ngày"], errors="coerce", dayfirst=True)
-        close = close.dropna(subset=["Ngày"])
-        prev_sub = close[close["Ngày"].dt.date == prev_day.date()]
-        curr_sub = close[close["Ngày"].dt.date == pd.to_datetime(ngay_dc).date()]
-        ton_prev = pd.to_numeric(prev_sub.get("Tồn cuối", 0), errors="coerce").groupby(prev_sub.get("Loại sản phẩm","")).sum()
-        ton_curr = pd.to_numeric(curr_sub.get("Tồn cuối", 0), errors="coerce").groupby(curr_sub.get("Loại sản phẩm","")).sum()
-    else:
-        ton_prev = pd.Series(dtype=float); ton_curr = pd.Series(dtype=float)
+    c1, c2 = st.columns(2)
+    with c1:
+        dc_from = st.date_input("Từ ngày (dd-mm-yyyy)", pd.Timestamp.today(), key="dc_ngay")
+    with c2:
+        dc_to = st.date_input("Đến ngày (dd-mm-yyyy)", dc_from, key="dc_ngay_den")
 
-    # NHAP_HANG trong ngày
-    nh = read_df("NHAP_HANG")
-    if not nh.empty and "Ngày" in nh.columns:
-        nh["Ngày"] = pd.to_datetime(nh["Ngày"], errors="coerce", dayfirst=True)
-        nh = nh.dropna(subset=["Ngày"])
-        mask = nh["Ngày"].dt.date == pd.to_datetime(ngay_dc).date()
-        k = pd.to_numeric(nh.loc[mask,"Số lượng nhập"], errors="coerce").groupby(nh.loc[mask,"Loại sản phẩm"]).sum()
+    # sản phẩm có phát sinh trong khoảng ngày được thêm tự động, không cần quét toàn bộ đơn
+    try:
+        recon = reconciliation(dc_from, dc_to, safe_options("Loại sản phẩm"))
+    except APIError as e:
+        st.warning(f"Không đọc được dữ liệu đối chiếu. {describe_api_error(e)}")
+        return
+    if dc_from == dc_to:
+        st.dataframe(recon.drop(columns="Ngày"), use_container_width=True)
+        if recon["Thiếu chốt"].ne("").any():
+            st.info(f"Chưa có chốt tồn ({recon['Thiếu chốt'].iloc[0]}): tồn được tính là 0.")
     else:
-        k = pd.Series(dtype=float)
-
-    # Xuất thực tế = (XE_MAY: Số lượng giao) + (OTO: Số lượng) theo Loại sản phẩm
-    def take(ws, qty_col):
-        df = read_df(ws)
-        if df.empty or "Ngày" not in df.columns: return pd.Series(dtype=float)
-        df["Ngày"] = pd.to_datetime(df["Ngày"], errors="coerce", dayfirst=True)
-        df = df.dropna(subset=["Ngày"])
-        dday = df[df["Ngày"].dt.date == pd.to_datetime(ngay_dc).date()]
-        if dday.empty: return pd.Series(dtype=float)
-        q = pd.to_numeric(dday.get(qty_col, 0), errors="coerce")
-        return q.groupby(dday.get("Loại sản phẩm","")).sum()
-
-    z1 = take("XE_MAY", "Số lượng giao")
-    z2 = take("OTO",    "Số lượng")
-    zact = z1.add(z2, fill_value=0)
-
-    all_items = sorted(set(products_all()) | set(ton_prev.index) | set(ton_curr.index) | set(k.index) | set(zact.index))
-    rows = []
-    for it in all_items:
-        X = float(ton_prev.get(it, 0) or 0)
-        K = float(k.get(it, 0) or 0)
-        Y = float(ton_curr.get(it, 0) or 0)
-        Zexp = X + K - Y
-        Zreal = float(zact.get(it, 0) or 0)
-        rows.append({
-            "Loại sản phẩm": it,
-            "Tồn hôm qua (X)": int(X),
-            "Nhập hôm nay (K)": int(K),
-            "Tồn hôm nay (Y)": int(Y),
-            "Xuất kỳ vọng (X+K-Y)": int(Zexp),
-            "Xuất thực tế": int(Zreal),
-            "Chênh lệch": int(Zexp - Zreal)
-        })
-    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+        summary = day_summary(recon)
+        lech = summary["Tổng |chênh lệch|"].gt(0)
+        thieu = summary["Thiếu chốt"].ne("")
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Số ngày", len(summary))
+        c2.metric("Ngày có chênh lệch", int(lech.sum()))
+        c3.metric("Ngày thiếu chốt tồn", int(thieu.sum()))
+        st.dataframe(summary, use_container_width=True)
+        only = st.checkbox("Chỉ hiện dòng có chênh lệch", value=True, key="dc_only_diff")
+        st.dataframe(recon[recon["Chênh lệch"].ne(0)] if only else recon, use_container_width=True)
 
 # =======================
-# TAB 3: Lương & Hoa hồng (tính theo tháng, có nút ghi vào LUONG)
+# VIEW 3: Lương & Hoa hồng (một hoặc nhiều tháng, có nút ghi vào LUONG)
 # =======================
-with tab3:
+def view_luong():
     st.subheader("Bảng lương theo tháng")
-    thang = st.text_input("Tháng (mm/YYYY)", value=pd.Timestamp.today().strftime("%m/%Y"), key="pay_month2")
-
-    # Công theo tháng
-    cong = read_df("CONG")
-    if not cong.empty:
-        cong["Ngày"] = pd.to_datetime(cong["Ngày"], errors="coerce", dayfirst=True)
-        cong_m = cong[cong["Ngày"].dt.strftime("%m/%Y") == thang].copy()
-        cong_sum = cong_m.groupby("Nhân viên")["Công"].sum().reset_index(name="Công")
+    thang = st.text_input("Tháng (mm/YYYY; nhiều tháng: 07/2025, 08/2025 · cả năm: 2025 · khoảng: 01/2025-06/2025)",
+                          value=pd.Timestamp.today().strftime("%m/%Y"), key="pay_month2")
+    months = parse_months(thang)
+    if not months:
+        st.error("Định dạng tháng phải là mm/YYYY (ví dụ: 08/2025) hoặc năm YYYY.")
     else:
-        cong_sum = pd.DataFrame(columns=["Nhân viên","Công"])
-
-    # Doanh thu theo NV từ XE_MAY (có thể mở rộng sang OTO nếu có quy ước NV)
-    xm = read_df("XE_MAY")
-    if not xm.empty:
-        xm["Ngày"] = pd.to_datetime(xm["Ngày"], errors="coerce", dayfirst=True)
-        xm_m = xm[xm["Ngày"].dt.strftime("%m/%Y") == thang].copy()
-        xm_m["SL"] = pd.to_numeric(xm_m.get("Số lượng giao", 0), errors="coerce").fillna(0)
-        xm_m["TT"] = pd.to_numeric(xm_m.get("Thanh Toán", 0), errors="coerce").fillna(0)
-        by_nv_sp = xm_m.groupby(["Người chở","Loại sản phẩm"]).agg(SL=("SL","sum"), DT=("TT","sum")).reset_index()
-        by_nv_rev = xm_m.groupby(["Người chở"]).agg(DoanhThu=("TT","sum")).reset_index()
-        by_nv_rev.rename(columns={"Người chở":"Nhân viên"}, inplace=True)
-    else:
-        by_nv_sp = pd.DataFrame(columns=["Người chở","Loại sản phẩm","SL","DT"])
-        by_nv_rev = pd.DataFrame(columns=["Nhân viên","DoanhThu"])
-
-    df = pd.merge(cong_sum, by_nv_rev, on="Nhân viên", how="outer").fillna(0)
-
-    # PAY_RULES
-    pay = read_df("PAY_RULES")
-    pay_m = pay[pay.get("Tháng","") == thang].copy() if not pay.empty else pd.DataFrame()
-    if not pay_m.empty:
-        df = pd.merge(df, pay_m[["Nhân viên","Luong_co_ban","Don_gia_cong","Phu_cap","Tam_ung","Khau_tru"]], on="Nhân viên", how="left")
-    else:
-        df["Luong_co_ban"]=0; df["Don_gia_cong"]=250000; df["Phu_cap"]=0; df["Tam_ung"]=0; df["Khau_tru"]=0
-
-    # COMMISSION_RULES
-    com = read_df("COMMISSION_RULES")
-    com_m = com[com.get("Tháng","") == thang].copy() if not com.empty else pd.DataFrame()
-
-    # Chuẩn số
-    for c, default in [("Luong_co_ban",0),("Don_gia_cong",250000),("Phu_cap",0),("Tam_ung",0),("Khau_tru",0),("Công",0.0)]:
-        df[c] = pd.to_numeric(df.get(c, default), errors="coerce").fillna(default)
-
-    base_from_day = (df["Công"] * df["Don_gia_cong"]).round(0)
-    df["Luong_co_ban_tinh"] = df["Luong_co_ban"].where(df["Luong_co_ban"] > 0, base_from_day)
-
-    # Tính hoa hồng
-    hoa_hong_nv = {}
-    if not by_nv_sp.empty and not com_m.empty:
-        com_m["Ty_le_%"] = pd.to_numeric(com_m.get("Ty_le_%",0), errors="coerce").fillna(0.0)
-        com_m["Hoa_hong_moi_donvi"] = pd.to_numeric(com_m.get("Hoa_hong_moi_donvi",0), errors="coerce").fillna(0)
-        rate_map = {r["Loại sản phẩm"]: (float(r["Ty_le_%"]), int(r["Hoa_hong_moi_donvi"]))
-                    for _, r in com_m.iterrows()}
-        for nv in by_nv_sp["Người chở"].unique():
-            total = 0.0
-            sub = by_nv_sp[by_nv_sp["Người chở"] == nv]
-            for _, r in sub.iterrows():
-                sp = r["Loại sản phẩm"]; SL = float(r["SL"] or 0); DT = float(r["DT"] or 0)
-                rate, per_unit = rate_map.get(sp, (0.0, 0))
-                if per_unit > 0:
-                    total += SL * per_unit
-                elif rate > 0:
-                    total += DT * rate / 100.0
-            if total == 0:
-                dt_nv = float(by_nv_rev.loc[by_nv_rev["Nhân viên"] == nv, "DoanhThu"].sum() or 0)
-                total = dt_nv * 0.02  # fallback 2%
-            hoa_hong_nv[nv] = round(total, 0)
-    else:
-        for _, r in by_nv_rev.iterrows():
-            hoa_hong_nv[r["Nhân viên"]] = round(float(r["DoanhThu"] or 0) * 0.02, 0)
-
-    df["Hoa_hồng"] = df["Nhân viên"].map(hoa_hong_nv).fillna(0)
-    df["Tổng lương"] = (df["Luong_co_ban_tinh"] + df["Phu_cap"] + df["Hoa_hồng"] - df["Tam_ung"] - df["Khau_tru"]).round(0)
-    df.insert(0, "Tháng", thang)
-
-    for col in ["Luong_co_ban_tinh","Phu_cap","Hoa_hồng","Tam_ung","Khau_tru","Tổng lương"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-
-    st.dataframe(df[["Tháng","Nhân viên","Công","Luong_co_ban_tinh","Phu_cap","Hoa_hồng","Tam_ung","Khau_tru","Tổng lương"]], use_container_width=True)
-
-    if st.button("Ghi vào LUONG (ghi đè tháng)", key="luong_write"):
-        old = read_df("LUONG")
-        if old.empty:
-            old = pd.DataFrame(columns=["Tháng","Nhân viên","Công","Lương cơ bản","Phụ cấp","Hoa hồng","Tạm ứng","Khấu trừ","Tổng lương"])
-        out = df.copy().rename(columns={
-            "Luong_co_ban_tinh":"Lương cơ bản",
-            "Phu_cap":"Phụ cấp",
-            "Hoa_hồng":"Hoa hồng",
-            "Tam_ung":"Tạm ứng",
-            "Khau_tru":"Khấu trừ"
-        })
-        keep = old[old.get("Tháng","") != thang].copy()
-        keep = pd.concat([keep, out[["Tháng","Nhân viên","Công","Lương cơ bản","Phụ cấp","Hoa hồng","Tạm ứng","Khấu trừ","Tổng lương"]]], ignore_index=True)
-        write_df("LUONG", keep)
-        st.success("Đã cập nhật LUONG cho tháng " + thang)
+        m_from, m_to = months_range(months)
+        # CONG & XE_MAY chỉ đọc trong khoảng các tháng đã chọn
+        try:
+            df = payroll(months,
+                         read_df("CONG", date_from=m_from, date_to=m_to),
+                         read_df("XE_MAY", date_from=m_from, date_to=m_to),
+                         read_df("PAY_RULES"), read_df("COMMISSION_RULES"))
+        except APIError as e:
+            st.warning(f"Không đọc được CONG/XE_MAY/PAY_RULES/COMMISSION_RULES. {describe_api_error(e)}")
+            return
+        st.dataframe(df, use_container_width=True)
+        if len(months) > 1:
+            st.caption(f"{len(months)} tháng, tổng lương: {int(df['Tổng lương'].sum()):,}")
+
+        # LUONG của các tháng này lúc mở: có người vừa ghi thì đọc lại, tính lại rồi mới ghi đè
+        try:
+            luong = month_block(read_df("LUONG"), months)
+        except APIError as e:
+            st.warning(f"Không đọc được LUONG, chưa ghi được. {describe_api_error(e)}")
+            return
+        guard = EditGuard("luong_guard", thang, df, luong)
+        label = "Ghi vào LUONG (ghi đè " + ("tháng)" if len(months) == 1 else f"{len(months)} tháng)")
+        if st.button(label, key="luong_write") or guard.pending():
+            # chỉ ghi lại các dòng của các tháng này
+            if guard.save(lambda exp: replace_rows_by_month("LUONG", months, to_luong(df), expected=exp)):
+                st.success("Đã cập nhật LUONG cho tháng " + (", ".join(months) if len(months) <= 3 else f"{months[0]} … {months[-1]}"))
 
 # =======================
-# TAB 4: Chấm công (tháng) – ma trận NV × Ngày, ghi đè cả tháng
+# VIEW 4: Chấm công (tháng) – ma trận NV × Ngày, ghi đè cả tháng
 # =======================
-with tab4:
+def view_cham_cong():
     st.subheader("Chấm công theo tháng (ma trận Nhân viên × Ngày)")
     thang_txt = st.text_input("Tháng (mm/YYYY)", value=pd.Timestamp.today().strftime("%m/%Y"), key="cc_month")
     days = month_days(thang_txt)
@@ -312,28 +239,9 @@ with tab4:
         if not nv_list:
             st.info("Thêm danh mục Nhân viên trong LOOKUPS để chấm công.")
         else:
-            cong = read_df("CONG")
-            if not cong.empty:
-                cong["Ngày"] = pd.to_datetime(cong["Ngày"], errors="coerce", dayfirst=True)
-                cong_m = cong[cong["Ngày"].dt.strftime("%m/%Y") == thang_txt].copy()
-            else:
-                cong_m = pd.DataFrame(columns=["Ngày","Nhân viên","Ca","Công","Ghi chú"])
-
-            if not cong_m.empty:
-                piv = cong_m.pivot_table(index="Nhân viên",
-                                         columns=cong_m["Ngày"].dt.day,
-                                         values="Công",
-                                         aggfunc="sum",
-                                         fill_value=0.0)
-            else:
-                piv = pd.DataFrame(index=nv_list, columns=[d.day for d in days]).fillna(0.0)
-
-            piv = piv.reindex(index=nv_list, columns=[d.day for d in days], fill_value=0.0)
-            piv = piv.reset_index().rename(columns={"index":"Nhân viên"})
-            for c in [d.day for d in days]:
-                piv[c] = pd.to_numeric(piv.get(c, 0), errors="coerce").fillna(0.0).clip(0,1)
-
-            piv["Tổng công"] = piv[[d.day for d in days]].sum(axis=1)
+            cong_m = read_df("CONG", date_from=days[0], date_to=days[-1])
+            piv = month_matrix(cong_m, nv_list, days)
+            guard = EditGuard("cc_editor", thang_txt, piv, cong_m, key_col="Nhân viên")
 
             edited = st.data_editor(
                 piv,
@@ -346,51 +254,33 @@ with tab4:
                 }
             )
 
-            if st.button("Lưu chấm công (ghi đè THÁNG)", key="cc_save"):
-                rows=[]
-                for _, r in edited.iterrows():
-                    nv = r["Nhân viên"]
-                    for d in days:
-                        val = float(r.get(d.day, 0) or 0)
-                        if val <= 0: 
-                            continue
-                        if val >= 1:
-                            ca, cong_val = "Full ngày", 1.0
-                        else:
-                            ca, cong_val = "Nửa ngày sáng", 0.5  # quy ước nửa ngày
-                        rows.append({
-                            "Ngày": fmt_date(d),
-                            "Nhân viên": nv,
-                            "Ca": ca,
-                            "Công": cong_val,
-                            "Ghi chú": ""
-                        })
-                new_df = pd.DataFrame(rows, columns=["Ngày","Nhân viên","Ca","Công","Ghi chú"])
-
-                old = read_df("CONG")
-                if not old.empty:
-                    old["Ngày"] = pd.to_datetime(old["Ngày"], errors="coerce", dayfirst=True)
-                    keep = old[old["Ngày"].dt.strftime("%m/%Y") != thang_txt].copy()
-                else:
-                    keep = pd.DataFrame(columns=["Ngày","Nhân viên","Ca","Công","Ghi chú"])
-                write_df("CONG", pd.concat([keep, new_df], ignore_index=True))
-                st.success(f"Đã lưu chấm công cho tháng {thang_txt}")
+            guard.panel()
+            if st.button("Lưu chấm công (ghi đè THÁNG)", key="cc_save") or guard.pending():
+                rows, n_changed = merge_month(cong_m, piv, edited, days)
+                if not n_changed:
+                    st.info("Không có ô nào thay đổi.")
+                # chỉ ghi các dòng của tháng này, không đụng tới các tháng khác
+                elif guard.save(lambda exp: replace_rows_by_date("CONG", "Ngày", fmt_date(days[0]), rows,
+                                                                 date_to=fmt_date(days[-1]), expected=exp)):
+                    st.success(f"Đã lưu chấm công cho tháng {thang_txt} ({n_changed} ô thay đổi)")
 
 # =======================
-# TAB 5: Thiết lập (PAY_RULES & COMMISSION_RULES)
+# VIEW 5: Thiết lập (PAY_RULES & COMMISSION_RULES)
 # =======================
-with tab5:
+def view_thiet_lap():
     st.subheader("Thiết lập lương cơ bản & hoa hồng theo tháng")
     thang_cfg = st.text_input("Tháng (mm/YYYY)", value=pd.Timestamp.today().strftime("%m/%Y"), key="cfg_month")
+    if not norm_month(thang_cfg):
+        st.error("Định dạng tháng phải là mm/YYYY (ví dụ: 08/2025).")
+        return
 
     colA, colB = st.columns(2)
 
     # PAY_RULES
     with colA:
         st.markdown("**PAY_RULES** – lương cơ bản / đơn giá công / phụ cấp / tạm ứng / khấu trừ")
-        pay = read_df("PAY_RULES")
-        pay = pay if not pay.empty else pd.DataFrame(columns=["Tháng","Nhân viên","Luong_co_ban","Don_gia_cong","Phu_cap","Tam_ung","Khau_tru"])
-        pay_cur = pay[pay.get("Tháng","") == thang_cfg].copy()
+        pay_block = month_block(read_df("PAY_RULES"), [thang_cfg])
+        pay_cur = plain(pay_block).copy()
         if pay_cur.empty:
             nv = safe_options("Nhân viên") or safe_options("Người chở")
             pay_cur = pd.DataFrame({
@@ -402,6 +292,7 @@ with tab5:
                 "Tam_ung": 0,
                 "Khau_tru": 0
             })
+        pay_guard = EditGuard("pay_rules_edit", thang_cfg, pay_cur, pay_block, key_col="Nhân viên")
         pay_edit = st.data_editor(
             pay_cur,
             key="pay_rules_edit",
@@ -416,19 +307,17 @@ with tab5:
                 "Khau_tru": st.column_config.NumberColumn(min_value=0, step=1000),
             }
         )
-        if st.button("Lưu PAY_RULES (ghi đè tháng)", key="save_pay_rules"):
-            base = pay[pay.get("Tháng","") != thang_cfg].copy()
-            base = pd.concat([base, pay_edit], ignore_index=True)
-            write_df("PAY_RULES", base)
-            st.success("Đã lưu PAY_RULES cho tháng " + thang_cfg)
+        pay_guard.panel()
+        if st.button("Lưu PAY_RULES (ghi đè tháng)", key="save_pay_rules") or pay_guard.pending():
+            if pay_guard.save(lambda exp: replace_rows_by_month("PAY_RULES", [thang_cfg], pay_edit, expected=exp)):
+                st.success("Đã lưu PAY_RULES cho tháng " + thang_cfg)
 
     # COMMISSION_RULES
     with colB:
         st.markdown("**COMMISSION_RULES** – hoa hồng theo *Loại sản phẩm*")
-        com = read_df("COMMISSION_RULES")
-        com = com if not com.empty else pd.DataFrame(columns=["Tháng","Loại sản phẩm","Ty_le_%","Hoa_hong_moi_donvi"])
+        com_block = month_block(read_df("COMMISSION_RULES"), [thang_cfg])
         items = products_all()
-        com_cur = com[com.get("Tháng","") == thang_cfg].copy()
+        com_cur = plain(com_block).copy()
         if com_cur.empty:
             com_cur = pd.DataFrame({
                 "Tháng":[thang_cfg]*len(items),
@@ -436,6 +325,7 @@ with tab5:
                 "Ty_le_%": 0.0,
                 "Hoa_hong_moi_donvi": 0
             })
+        com_guard = EditGuard("com_rules_edit", thang_cfg, com_cur, com_block, key_col="Loại sản phẩm")
         com_edit = st.data_editor(
             com_cur,
             key="com_rules_edit",
@@ -447,8 +337,58 @@ with tab5:
                 "Hoa_hong_moi_donvi": st.column_config.NumberColumn(min_value=0, step=100),
             }
         )
-        if st.button("Lưu COMMISSION_RULES (ghi đè tháng)", key="save_com_rules"):
-            base = com[com.get("Tháng","") != thang_cfg].copy()
-            base = pd.concat([base, com_edit], ignore_index=True)
-            write_df("COMMISSION_RULES", base)
-            st.success("Đã lưu COMMISSION_RULES cho tháng " + thang_cfg)
+        com_guard.panel()
+        if st.button("Lưu COMMISSION_RULES (ghi đè tháng)", key="save_com_rules") or com_guard.pending():
+            if com_guard.save(lambda exp: replace_rows_by_month("COMMISSION_RULES", [thang_cfg], com_edit, expected=exp)):
+                st.success("Đã lưu COMMISSION_RULES cho tháng " + thang_cfg)
+
+# =======================
+# VIEW 6: Công nợ khách hàng (vỏ & tiền, đọc sổ CONG_NO)
+# =======================
+def view_cong_no():
+    st.subheader("Công nợ vỏ & tiền theo khách hàng")
+    try:
+        df = customer_ledger()
+    except APIError as e:
+        st.warning(f"Không đọc được {LEDGER_SHEET}. {describe_api_error(e)}")
+        df = pd.DataFrame()
+
+    if df.empty:
+        st.info("Chưa có dữ liệu.")
+    else:
+        c1, c2 = st.columns([2,1])
+        with c1:
+            kh = st.multiselect("Khách hàng", df["Khách hàng"].tolist(), key="cn_kh")
+        with c2:
+            only = st.checkbox("Chỉ khách còn nợ vỏ hoặc tiền", value=True, key="cn_only")
+        if kh: df = df[df["Khách hàng"].isin(kh)]
+        if only: df = df[df["Vỏ còn nợ"].ne(0) | df["Còn nợ"].ne(0)]
+
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Số khách", len(df))
+        m2.metric("Vỏ khách đang giữ", f"{int(df['Vỏ còn nợ'].sum()):,}")
+        m3.metric("Tiền còn nợ", f"{int(df['Còn nợ'].sum()):,}")
+        st.dataframe(df.sort_values(["Còn nợ", "Vỏ còn nợ"], ascending=False), use_container_width=True, hide_index=True)
+
+    with st.expander("Sổ công nợ CONG_NO"):
+        st.caption("CONG_NO được cộng dồn mỗi khi ghi đơn: vỏ còn nợ = vỏ đi − vỏ về (XE_MAY); "
+                   "còn nợ = tiền hàng − đã trả (đơn \"Kí Giấy\" chưa trả; dòng số lượng 0 có tiền là khách trả nợ). "
+                   "Nếu sửa tay XE_MAY/OTO trên Google Sheets thì bấm dựng lại.")
+        err = get_ledger().error
+        if err is not None:
+            st.warning(f"Lần cập nhật CONG_NO gần nhất bị lỗi ({err}); nên dựng lại.")
+        if st.button("Dựng lại CONG_NO từ XE_MAY + OTO", key="ledger_rebuild"):
+            n = rebuild_ledger()
+            st.success(f"Đã dựng lại CONG_NO: {n} khách.")
+
+# ========= Chỉ chạy view đang mở =========
+# Mỗi view đọc trước trong 1 request các sheet nó cần toàn bộ; CONG/XE_MAY... chỉ đọc theo khoảng ngày
+route({
+    "Thống kê doanh thu": View(view_thong_ke, (),
+                               ("ql_stat_src", "ql_stat_from", "ql_stat_to", "ql_stat_grain", "ql_stat_by", "cold_month")),
+    "Đối chiếu tồn kho": View(view_doi_chieu, ("LOOKUPS",), ("dc_ngay", "dc_ngay_den", "dc_only_diff")),
+    "Lương & Hoa hồng": View(view_luong, ("PAY_RULES", "COMMISSION_RULES"), ("pay_month2",)),
+    "Chấm công (tháng)": View(view_cham_cong, ("LOOKUPS",), ("cc_month",)),
+    "Công nợ khách hàng": View(view_cong_no, (), ("cn_kh", "cn_only")),
+    "Thiết lập (PAY/Commission)": View(view_thiet_lap, ("PAY_RULES", "COMMISSION_RULES", "LOOKUPS", "INVENTORY"), ("cfg_month",)),
+}, key="ql_view")
@@ -0,0 +1,53 @@
+# tests/conftest.py
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.gs as gs  # noqa: E402
+from utils.fake import FakeSpreadsheet  # noqa: E402
+
+
+def day(offset: int = 0) -> str:
+    """Ngày dd-mm-yyyy cách hôm nay `offset` ngày."""
+    return (date.today() + timedelta(days=offset)).strftime("%d-%m-%Y")
+
+
+class Sheets:
+    """Spreadsheet giả + secrets giả cho một test."""
+
+    def __init__(self):
+        self.sh = FakeSpreadsheet("test")
+        self.cfg = {}
+        for name, cols in gs.REQUIRED_SHEETS.items():
+            self.sh.load(name, [list(cols)])
+
+    def setting(self, section, key, default=None):
+        return self.cfg.get((section, key), default)
+
+    def load(self, name: str, rows: list):
+        """Thêm dòng vào sheet (sau header) mà không tính vào `calls`."""
+        ws = self.sh._sheets[name]
+        self.sh.load(name, ws._rows + [list(r) for r in rows])
+
+    def values(self, name: str) -> list:
+        return self.sh._sheets[name].get_all_values()
+
+
+@pytest.fixture
+def sheets(monkeypatch):
+    """Mọi module utils dùng spreadsheet giả & secrets của test; cache_resource sạch."""
+    s = Sheets()
+    for mod in [m for n, m in sys.modules.items() if n == "utils" or n.startswith("utils.")]:
+        if hasattr(mod, "get_spreadsheet"):
+            monkeypatch.setattr(mod, "get_spreadsheet", lambda: s.sh)
+        if hasattr(mod, "setting"):
+            monkeypatch.setattr(mod, "setting", s.setting)
+    st.cache_resource.clear()
+    yield s
+    gs.flush_writes()
+    st.cache_resource.clear()
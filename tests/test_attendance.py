@@ -0,0 +1,77 @@
+# tests/test_attendance.py
+# month_matrix() / matrix_rows() so với vòng lặp cũ của trang 02 (bản đầu, commit 33dedba), chép lại bên dưới
+# gần như nguyên văn, chỉ đổi read_df -> tham số.
+import pandas as pd
+import pytest
+
+import utils.gs as gs
+from utils.attendance import month_matrix, matrix_rows
+from utils.schema import plain
+
+
+def _read(*names):
+    # như bản đầu: read_df trả về cột thường (không Categorical)
+    return [plain(gs.read_df(n)) for n in names]
+
+
+def old_matrix(cong, nv_list, thang_txt, days):
+    if not cong.empty:
+        cong["Ngày"] = pd.to_datetime(cong["Ngày"], errors="coerce", dayfirst=True)
+        cong_m = cong[cong["Ngày"].dt.strftime("%m/%Y") == thang_txt].copy()
+    else:
+        cong_m = pd.DataFrame(columns=["Ngày", "Nhân viên", "Ca", "Công", "Ghi chú"])
+    if not cong_m.empty:
+        piv = cong_m.pivot_table(index="Nhân viên", columns=cong_m["Ngày"].dt.day, values="Công",
+                                 aggfunc="sum", fill_value=0.0)
+    else:
+        piv = pd.DataFrame(index=nv_list, columns=[d.day for d in days]).fillna(0.0)
+    piv = piv.reindex(index=nv_list, columns=[d.day for d in days], fill_value=0.0)
+    piv = piv.reset_index().rename(columns={"index": "Nhân viên"})
+    for c in [d.day for d in days]:
+        piv[c] = pd.to_numeric(piv.get(c, 0), errors="coerce").fillna(0.0).clip(0, 1)
+    piv["Tổng công"] = piv[[d.day for d in days]].sum(axis=1)
+    return piv
+
+
+def old_rows(edited, days, fmt):
+    rows = []
+    for _, r in edited.iterrows():
+        nv = r["Nhân viên"]
+        for d in days:
+            val = float(r.get(d.day, 0) or 0)
+            if val <= 0:
+                continue
+            if val >= 1:
+                ca, cong_val = "Full ngày", 1.0
+            else:
+                ca, cong_val = "Nửa ngày sáng", 0.5
+            rows.append({"Ngày": d.strftime(fmt), "Nhân viên": nv, "Ca": ca, "Công": cong_val, "Ghi chú": ""})
+    return pd.DataFrame(rows, columns=["Ngày", "Nhân viên", "Ca", "Công", "Ghi chú"])
+
+
+@pytest.fixture
+def books(sheets):
+    sheets.load("CONG", [["01-08-2026", "Pháp", "Full ngày", 1, ""], ["02-08-2026", "Pháp", "Nửa ngày sáng", 0.5, ""],
+                         ["02-08-2026", "Sâm", "Full ngày", 1, ""], ["03-08-2026", "", "Full ngày", 1, ""],
+                         ["01-09-2026", "Sâm", "Full ngày", 1, ""]])
+    return sheets
+
+
+@pytest.mark.parametrize("thang", ["08/2026", "10/2026"])
+def test_matches_old_loop(books, thang):
+    (cong,) = _read("CONG")
+    start = pd.to_datetime("01/" + thang, format="%d/%m/%Y")
+    days = list(pd.date_range(start, start + pd.offsets.MonthEnd(1)))
+    nv = ["Pháp", "Sâm", "Khoa"]
+    in_month = cong[pd.to_datetime(cong["Ngày"]).dt.strftime("%m/%Y") == thang]
+    piv = month_matrix(in_month, nv, days)
+    want = old_matrix(cong.copy(), nv, thang, days)
+    pd.testing.assert_frame_equal(piv, want, check_dtype=False, check_names=False)
+
+    edited = piv.copy()
+    edited[days[4].day] = [1.0, 0.5, 0.0]
+    got = matrix_rows(edited, days)
+    old = old_rows(edited, days, "%d-%m-%Y")
+    key = ["Ngày", "Nhân viên"]
+    pd.testing.assert_frame_equal(got.sort_values(key, ignore_index=True), old.sort_values(key, ignore_index=True),
+                                  check_dtype=False)
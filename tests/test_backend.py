@@ -0,0 +1,31 @@
+# tests/test_backend.py
+import pandas as pd
+import pytest
+
+import utils.gs as gs
+from conftest import day
+
+
+@pytest.fixture(params=["sheets", "sqlite"])
+def backend(request, sheets, tmp_path):
+    if request.param == "sqlite":
+        sheets.cfg.update({("storage", "BACKEND"): "sqlite", ("storage", "SQLITE_PATH"): str(tmp_path / "t.db"),
+                           ("storage", "SYNC_SECONDS"): 3600})
+    return sheets
+
+
+def test_filters_compare_stripped_values(backend):
+    backend.load("XE_MAY", [[day(), " K1 ", "", "", "Aqua 500", "", 1, 0, 1000, "", "", ""],
+                            [day(), "K2", "", "", "Aqua 5l ", "", 2, 0, 2000, "", "", ""]])
+    assert gs.read_df("XE_MAY", filters={"Khách hàng": "K1"})["Số lượng giao"].tolist() == [1]
+    assert gs.read_df("XE_MAY", filters={"Loại sản phẩm": [" Aqua 5l"]})["Số lượng giao"].tolist() == [2]
+
+
+def test_replace_by_other_date_column(backend):
+    backend.load("CONG_NO", [["K1", 1, 1, 0, 10, 0, 1, 10, day(-1)],
+                             ["K2", 1, 1, 0, 20, 0, 1, 20, day()]])
+    new = pd.DataFrame([["K3", 1, 2, 0, 30, 0, 2, 30, day()]], columns=gs.REQUIRED_SHEETS["CONG_NO"])
+    gs.replace_rows_by_date("CONG_NO", "Đơn cuối", day(), new)
+    assert gs.read_df("CONG_NO")["Khách hàng"].astype(str).tolist() == ["K1", "K3"]
+    gs.sync_now()
+    assert [r[0] for r in backend.values("CONG_NO")[1:]] == ["K1", "K3"]
@@ -0,0 +1,51 @@
+# tests/test_coldstore.py
+import pandas as pd
+
+import utils.gs as gs
+from utils.coldstore import ColdStore
+from utils.conflicts import fingerprint
+from utils.schema import apply_schema
+
+
+def _cong(*days):
+    return apply_schema("CONG", pd.DataFrame({"Ngày": list(days), "Nhân viên": "A", "Ca": "Sáng",
+                                              "Công": 1, "Ghi chú": ""}))
+
+
+def test_read_bounds_are_day_first(tmp_path):
+    store = ColdStore(str(tmp_path))
+    store.put("CONG", "2026-05", _cong("10-05-2026", "20-05-2026"))
+    assert store.read("CONG", "05-10-2026", "05-10-2026").empty
+    got = store.read("CONG", "10-05-2026", "10-05-2026")
+    assert got["Ngày"].dt.strftime("%d-%m-%Y").tolist() == ["10-05-2026"]
+    assert len(store.read("CONG", "01-05-2026", "12-05-2026")) == 1
+
+
+def test_close_month_then_read_day(sheets, tmp_path):
+    sheets.cfg[("storage", "COLD_DIR")] = str(tmp_path)
+    sheets.load("CONG", [["10-05-2026", "A", "Sáng", 1, ""], ["05-10-2026", "A", "Sáng", 1, ""]])
+    assert gs.close_month("CONG", "05/2026") == 1
+    assert [r[0] for r in sheets.values("CONG")[1:]] == ["05-10-2026"]
+    got = gs.read_df("CONG", "05-10-2026", "05-10-2026")
+    assert got["Ngày"].dt.strftime("%d-%m-%Y").tolist() == ["05-10-2026"]
+    cold = gs.read_df("CONG", "10-05-2026", "10-05-2026")
+    assert cold["Ngày"].dt.strftime("%d-%m-%Y").tolist() == ["10-05-2026"]
+
+
+def test_save_day_after_close_is_not_a_conflict(sheets, tmp_path):
+    sheets.cfg[("storage", "COLD_DIR")] = str(tmp_path)
+    sheets.load("CONG", [["10-05-2026", "A", "Sáng", 1, ""], ["05-10-2026", "A", "Sáng", 1, ""]])
+    gs.close_month("CONG", "05/2026")
+    block = gs.read_df("CONG", "05-10-2026", "05-10-2026")
+    new = block.assign(**{"Công": 0.5})
+    gs.replace_rows_by_date("CONG", "Ngày", "05-10-2026", new, expected=fingerprint(block))
+    assert gs.read_df("CONG", "05-10-2026", "05-10-2026")["Công"].tolist() == [0.5]
+
+
+def test_put_keeps_blank_cells_blank(tmp_path):
+    store = ColdStore(str(tmp_path))
+    df = _cong("10-05-2026", "11-05-2026").assign(**{"Thêm": pd.Series([1, None], dtype=object)})
+    store.put("CONG", "2026-05", df)
+    got = store.read("CONG")
+    assert got["Thêm"].isna().tolist() == [False, True]
+    assert got["Thêm"].tolist()[0] == "1"
@@ -0,0 +1,94 @@
+# tests/test_conflicts.py
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import utils.gs as gs
+from utils.conflicts import WriteConflict, fingerprint
+from conftest import day
+
+
+def _editor_app():
+    import streamlit as st
+    from utils.conflicts import EditGuard, WriteConflict, fingerprint
+
+    ss = st.session_state
+    sheet = ss["_sheet"]
+    guard = EditGuard("ed", "block", sheet, sheet, key_col="Mặt hàng")
+    edited = st.data_editor(sheet, key="ed", num_rows="fixed")
+    guard.panel()
+
+    def write(expected):
+        if ss.pop("_race", False) or fingerprint(ss["_sheet"]) != expected:
+            raise WriteConflict("DAILY_CLOSE", "block")
+        ss["_sheet"] = edited
+        ss["_saves"] = ss.get("_saves", 0) + 1
+
+    if st.button("Lưu", key="save") or guard.pending():
+        if guard.save(write):
+            st.success("Đã lưu")
+
+
+def _start():
+    at = AppTest.from_function(_editor_app, default_timeout=30)
+    at.session_state["_sheet"] = pd.DataFrame({"Mặt hàng": ["A", "B"], "Tồn cuối": [1, 2]})
+    return at.run()
+
+
+def _edit(at, row, value):
+    at.session_state["ed"] = {"edited_rows": {row: {"Tồn cuối": value}}, "added_rows": [], "deleted_rows": []}
+
+
+def _other_user(at, row, value):
+    sheet = at.session_state["_sheet"].copy()
+    sheet.loc[row, "Tồn cuối"] = value
+    at.session_state["_sheet"] = sheet
+
+
+def test_fingerprint_ignores_row_order_and_types():
+    a = pd.DataFrame({"x": ["A", "B"], "n": [1, 2]})
+    b = pd.DataFrame({"n": [2.0, 1.0], "x": ["B ", "A"]}, index=[5, 3])
+    assert fingerprint(a) == fingerprint(b)
+    assert fingerprint(a) != fingerprint(a.assign(n=[1, 3]))
+    assert fingerprint(a.iloc[0:0]) == fingerprint(None) == "empty"
+
+
+def test_other_cells_are_rebased():
+    at = _start()
+    _edit(at, 0, 7)
+    _other_user(at, 1, 9)
+    at.button(key="save").click().run()
+    assert not at.exception and [s.value for s in at.success] == ["Đã lưu"]
+    assert at.session_state["_sheet"]["Tồn cuối"].tolist() == [7, 9]
+
+
+def test_same_cell_shows_conflict_then_force():
+    at = _start()
+    _edit(at, 0, 7)
+    _other_user(at, 0, 3)
+    at.button(key="save").click().run()
+    assert at.error and not at.success
+    assert at.session_state["_sheet"]["Tồn cuối"].tolist() == [3, 2]
+    at.button(key="ed__force_btn").click().run()
+    assert [s.value for s in at.success] == ["Đã lưu"]
+    assert at.session_state["_sheet"]["Tồn cuối"].tolist() == [7, 2]
+
+
+def test_race_during_write_retries():
+    at = _start()
+    _edit(at, 1, 5)
+    at.session_state["_race"] = True
+    at.button(key="save").click().run()
+    assert [s.value for s in at.success] == ["Đã lưu"]
+    assert at.session_state["_saves"] == 1
+    assert at.session_state["_sheet"]["Tồn cuối"].tolist() == [1, 5]
+
+
+def test_stale_block_is_not_written(sheets):
+    sheets.load("DAILY_CLOSE", [[day(), "Aqua 500", 5, "", "A"]])
+    block = gs.read_df("DAILY_CLOSE", day(), day())
+    sheets.load("DAILY_CLOSE", [[day(), "Aqua 5l", 1, "", "B"]])
+    with pytest.raises(WriteConflict):
+        gs.replace_rows_by_date("DAILY_CLOSE", "Ngày", day(), block.assign(**{"Tồn cuối": 9}),
+                                expected=fingerprint(block))
+    assert [r[2] for r in sheets.values("DAILY_CLOSE")[1:]] == ["5", "1"]
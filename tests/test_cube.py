@@ -0,0 +1,62 @@
+# tests/test_cube.py
+import pandas as pd
+import pytest
+
+import utils.gs as gs
+from conftest import day
+
+
+def _orders():
+    xe = [[day(-70 + i % 3), f"K{i % 4}", "", "", ["Aqua 500", "Aqua 5l"][i % 2], "bình", i % 5 + 1, 0,
+           f"{(i + 1) * 1000:,}", "Tiền Mặt", "", "Pháp"] for i in range(12)]
+    xe += [[day(-35 + i % 2), "K1", "", "", "Aqua 500", "bình", 2, 1, 4000, "Kí Giấy", "", "Sâm"] for i in range(5)]
+    xe += [["", "K9", "", "", "Aqua 500", "bình", 99, 0, 99000, "", "", ""]]   # không có ngày: không tính
+    oto = [[day(-69), "K2", "Aqua 5l", "bình", 3, 10000, "30.000 đ", "Chuyển Khoản", "", "Sâm", ""],
+           [day(-1), "K3", "Aqua 500", "bình", 1, 5000, 5000, "Tiền Mặt", "", "Pháp", ""]]
+    return xe, oto
+
+
+def _expected(xe, oto) -> pd.DataFrame:
+    cols = gs.REQUIRED_SHEETS
+    a = pd.DataFrame(xe, columns=cols["XE_MAY"]).rename(columns={"Số lượng giao": "SL_Giao"})
+    b = pd.DataFrame(oto, columns=cols["OTO"]).rename(columns={"Số lượng": "SL_Giao"})
+    df = pd.concat([a, b], ignore_index=True)
+    days = pd.to_datetime(df["Ngày"], format="%d-%m-%Y", errors="coerce")
+    df = df[days.notna()].assign(**{"Mốc": days.dt.strftime("%m/%Y"),
+                                    "Thanh Toán": df["Thanh Toán"].astype(str).str.replace(r"\D", "", regex=True)
+                                    .astype(int)})
+    df["SL_Giao"] = df["SL_Giao"].astype(int)
+    return df.groupby(["Mốc", "Loại sản phẩm"], as_index=False)[["SL_Giao", "Thanh Toán"]].sum()
+
+
+@pytest.mark.parametrize("layout", ["sheet", "partitions", "cold"])
+def test_cube_totals_match_raw_orders(sheets, tmp_path, monkeypatch, layout):
+    xe, oto = _orders()
+    sheets.load("XE_MAY", xe)
+    sheets.load("OTO", oto)
+    if layout == "partitions":
+        sheets.cfg[("sheets", "PARTITION_SHEETS")] = ["XE_MAY", "OTO"]
+        gs.migrate_partitions("XE_MAY")
+        gs.migrate_partitions("OTO")
+    if layout == "cold":
+        sheets.cfg[("storage", "COLD_DIR")] = str(tmp_path)
+        month = pd.Timestamp.today() - pd.Timedelta(days=70)
+        gs.close_month("XE_MAY", month.strftime("%m/%Y"))
+        gs.close_month("OTO", month.strftime("%m/%Y"))
+
+    def check():
+        got = gs.revenue_cube().query("Tháng", by=["Loại sản phẩm"])
+        got = got[["Mốc", "Loại sản phẩm", "SL_Giao", "Thanh Toán"]].sort_values(["Mốc", "Loại sản phẩm"])
+        want = _expected(xe, oto).sort_values(["Mốc", "Loại sản phẩm"])
+        pd.testing.assert_frame_equal(got.reset_index(drop=True), want.reset_index(drop=True), check_dtype=False)
+
+    check()
+    built = []
+    real = gs.cube_facts
+    monkeypatch.setattr(gs, "cube_facts", lambda frames: built.append(list(frames)) or real(frames))
+    new = [day(), "K5", "", "", "Aqua 5l", "bình", 4, 0, 8000, "Tiền Mặt", "", "Pháp"]
+    gs.append_row("XE_MAY", new)
+    xe.append(new)
+    check()
+    # chỉ tính lại phần chứa đơn mới (phân vùng tháng này + sheet gốc khi chia theo tháng)
+    assert built == [["XE_MAY"]] * (2 if layout == "partitions" else 1)
@@ -0,0 +1,97 @@
+# tests/test_dailyagg.py
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+import utils.gs as gs
+from conftest import day
+
+
+def _order(d, kh, qty, money, pp="Tiền Mặt"):
+    return [d, kh, "", "Lê Lợi", "Aqua 500", "bình", qty, 1, money, pp, "", "Pháp"]
+
+
+@pytest.mark.parametrize("write_behind, upkeep", [(0, 0), (2, 0), (0, 60), (2, 60)])
+def test_increment_matches_rebuild(sheets, write_behind, upkeep):
+    sheets.cfg[("sheets", "WRITE_BEHIND_SECONDS")] = write_behind
+    sheets.cfg[("sheets", "UPKEEP_SECONDS")] = upkeep
+    sheets.load("XE_MAY", [_order(day(-1), "K1", 2, 40000)])
+    gs.rebuild_daily_agg()
+    gs.append_row("XE_MAY", _order(day(), "K1", 3, "1,500,000"))
+    gs.append_row("XE_MAY", _order(day(), "K2", 1, "20.000 đ", "Kí Giấy"))
+    gs.append_row("OTO", [day(), "K2", "Aqua 5l", "bình", 2, 10000, "20,000", "Chuyển Khoản", "", "Sâm", ""])
+    pending = gs.daily_agg(day(), day())
+    gs.flush_writes()
+    inc = gs.daily_agg()
+    assert inc.loc[inc["Ngày"] == day(), "Thanh Toán"].sum() == 1540000
+    assert pending.equals(gs.daily_agg(day(), day()))
+    gs.rebuild_daily_agg()
+    assert inc.equals(gs.daily_agg())
+
+
+def _sheet_rows(sheets, name, d):
+    return [i + 1 for i, r in enumerate(sheets.values(name)) if i and r[0] == d]
+
+
+def test_block_writes_keep_date_index_in_place(sheets):
+    days = [day(-i) for i in range(4)]
+    sheets.load("DAILY_CLOSE", [[d, f"SP{i}", i, "", ""] for i in range(3) for d in days])
+    gs.read_df("DAILY_CLOSE", days[0], days[0])
+    before = len(sheets.sh.calls)
+    for d, n in [(days[1], 5), (days[2], 1), (days[0], 0), (days[3], 3), (days[1], 2)]:
+        new = pd.DataFrame({"Ngày": d, "Loại sản phẩm": [f"N{i}" for i in range(n)], "Tồn cuối": 1})
+        gs.replace_rows_by_date("DAILY_CLOSE", "Ngày", d, new)
+        gs.append_row("DAILY_CLOSE", [d, "X", 1, "", ""])
+    reads = [c for c in sheets.sh.calls[before:] if c[0] in ("values_get", "values_batch_get")]
+    assert reads == []
+    idx = gs._date_index("DAILY_CLOSE")
+    for d in days:
+        assert idx.rows_between(d, d) == _sheet_rows(sheets, "DAILY_CLOSE", d)
+    gs.clear_cache("DAILY_CLOSE")
+    for d in days:
+        got = gs.read_df("DAILY_CLOSE", d, d)["Loại sản phẩm"].astype(str).tolist()
+        assert got == [r[1] for r in sheets.values("DAILY_CLOSE")[1:] if r[0] == d]
+
+
+def test_orders_do_not_reread_aggregate_columns(sheets):
+    sheets.load("XE_MAY", [_order(day(-i % 5), f"K{i % 3}", 1, 1000) for i in range(200)])
+    gs.rebuild_daily_agg()
+    gs.rebuild_ledger()
+    gs.append_row("XE_MAY", _order(day(), "K1", 1, 1000))
+    before = len(sheets.sh.calls)
+    for i in range(10):
+        gs.append_row("XE_MAY", _order(day(-i % 3), f"K{i % 4}", 1, 1000))
+    rows_read = sum(r for op, _, r in sheets.sh.calls[before:] if op in ("values_get", "values_batch_get"))
+    assert rows_read == 0
+    agg = gs.daily_agg()
+    gs.rebuild_daily_agg()
+    assert agg.equals(gs.daily_agg())
+
+
+def test_order_upkeep_is_batched(sheets):
+    sheets.cfg[("sheets", "UPKEEP_SECONDS")] = 60
+    sheets.load("XE_MAY", [_order(day(-1), "K1", 1, 1000)])
+    gs.rebuild_daily_agg()
+    gs.rebuild_ledger()
+    before = len(sheets.sh.calls)
+    for _ in range(10):
+        gs.append_row("XE_MAY", _order(day(), "K1", 1, 1000))
+    assert gs.daily_agg(day(), day())["SL_Giao"].sum() == 10
+    assert gs.customer_ledger(["K1"])["Số đơn"].tolist() == [11]
+    gs.flush_writes()
+    calls = sheets.sh.calls[before:]
+    writes = Counter(sh for op, sh, _ in calls if op in ("values_append", "values_batch_update", "batch_update"))
+    assert writes == {"XE_MAY": 10, "DAILY_AGG": 1, "CONG_NO": 1}
+    assert [op for op, _, _ in calls].count("fetch_sheet_metadata") <= 1
+
+
+def test_rebuild_drops_queued_upkeep(sheets):
+    sheets.cfg[("sheets", "UPKEEP_SECONDS")] = 60
+    gs.rebuild_daily_agg()
+    gs.append_row("XE_MAY", _order(day(), "K1", 2, 1000))
+    gs.rebuild_daily_agg()
+    gs.rebuild_ledger()
+    gs.flush_writes()
+    assert gs.daily_agg(day(), day())["SL_Giao"].sum() == 2
+    assert gs.customer_ledger(["K1"])["Số đơn"].tolist() == [1]
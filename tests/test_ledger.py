@@ -0,0 +1,59 @@
+# tests/test_ledger.py
+import pytest
+
+import utils.gs as gs
+from utils.ledger import LEDGER_SHEET, ledger, order_entries
+from conftest import day
+
+
+def _brute():
+    gs.flush_writes()
+    return ledger([order_entries(s, gs.read_df(s)) for s in ("XE_MAY", "OTO")])
+
+
+@pytest.mark.parametrize("write_behind", [0, 2])
+def test_increment_matches_rebuild(sheets, write_behind):
+    sheets.cfg[("sheets", "WRITE_BEHIND_SECONDS")] = write_behind
+    sheets.load("XE_MAY", [[day(-1), "K1", "", "Lê Lợi", "Aqua 500", "bình", 5, 2, "100.000", "Kí Giấy", "", "Pháp"]])
+    gs.append_row("XE_MAY", [day(), " K1 ", "", "Lê Lợi", "", "", 0, "x", "60.000", "Tiền Mặt", "trả nợ", "Pháp"])
+    gs.append_row("XE_MAY", [day(), "K2", "", "Lê Lợi", "Aqua 500", "bình", 3, 1, "90.000", "Kí Giấy", "", "Pháp"])
+    gs.append_row("OTO", [day(), "K1", "Aqua 5l", "bình", 2, 10000, "1.000.000 đ", "ký giấy", "", "Sâm", ""])
+    pending = gs.customer_ledger()
+    gs.flush_writes()
+    inc = gs.customer_ledger()
+    assert inc.equals(_brute())
+    k1 = inc.set_index("Khách hàng").loc["K1"]
+    assert (k1["Tiền hàng"], k1["Đã trả"], k1["Còn nợ"], k1["Vỏ còn nợ"]) == (1100000, 60000, 1040000, 3)
+    assert pending.equals(inc)
+    gs.rebuild_ledger()
+    assert gs.customer_ledger().equals(inc)
+    assert len(sheets.values(LEDGER_SHEET)) == 3
+
+
+def test_replace_day_refreshes_customers(sheets):
+    sheets.load("XE_MAY", [[day(), "K1", "", "", "Aqua 500", "bình", 2, 0, "40.000", "Kí Giấy", "", "Pháp"],
+                           [day(), "K2", "", "", "Aqua 500", "bình", 1, 0, "20.000", "Kí Giấy", "", "Pháp"]])
+    assert set(gs.customer_ledger()["Khách hàng"]) == {"K1", "K2"}
+    cur = gs.read_df("XE_MAY", day(), day())
+    gs.replace_rows_by_date("XE_MAY", "Ngày", day(), cur[cur["Khách hàng"] == "K1"])
+    assert gs.customer_ledger().equals(_brute())
+    assert set(gs.customer_ledger()["Khách hàng"]) == {"K1"}
+
+
+@pytest.mark.parametrize("write_behind", [0, 60])
+def test_recent_balance_without_reading(sheets, write_behind):
+    sheets.cfg[("sheets", "WRITE_BEHIND_SECONDS")] = write_behind
+    sheets.load("XE_MAY", [[day(-1), "K1", "", "", "Aqua 500", "bình", 5, 2, "100.000", "Kí Giấy", "", "Pháp"]])
+    gs.rebuild_ledger()
+    assert gs.recent_balance("K1") is None
+    gs.append_row("XE_MAY", [day(), "K1", "", "", "Aqua 500", "bình", 1, 0, "20.000", "Kí Giấy", "", "Pháp"])
+    gs.flush_writes()
+    before = len(sheets.sh.calls)
+    gs.append_row("XE_MAY", [day(), " K1 ", "", "", "", "", 0, 3, "50.000", "Tiền Mặt", "", "Pháp"])
+    after = len(sheets.sh.calls)
+    got = gs.recent_balance("K1")
+    assert len(sheets.sh.calls) == after
+    assert not [c for c in sheets.sh.calls[before:] if c[0] in ("values_get", "values_batch_get") and c[1].startswith(LEDGER_SHEET)]
+    assert got.reset_index(drop=True).equals(_brute())
+    gs.get_ledger().error = RuntimeError("x")
+    assert gs.recent_balance("K1") is None
@@ -0,0 +1,99 @@
+# tests/test_partitions.py
+import pytest
+
+import utils.gs as gs
+from utils.fake import FakeWorksheet
+from utils.writequeue import PartialSend
+
+
+def _order(d, kh):
+    return [d, kh, "", "", "Aqua 500", "bình", 1, 0, 20000, "Tiền Mặt", "", "Pháp"]
+
+
+@pytest.fixture
+def parts(sheets):
+    sheets.cfg[("sheets", "PARTITION_SHEETS")] = ["XE_MAY"]
+    return sheets
+
+
+def _names(sheets, title):
+    return [r[1] for r in sheets.values(title)[1:]]
+
+
+def test_cross_month_batch_lands_in_each_partition(parts):
+    parts.cfg[("sheets", "WRITE_BEHIND_SECONDS")] = 60
+    gs.append_row("XE_MAY", _order("28-02-2026", "K1"))
+    gs.append_row("XE_MAY", _order("02-03-2026", "K2"))
+    assert gs.flush_writes() == 2
+    assert _names(parts, "XE_MAY_2026_02") == ["K1"]
+    assert _names(parts, "XE_MAY_2026_03") == ["K2"]
+    assert _names(parts, "XE_MAY") == []
+
+
+def test_partial_failure_retries_only_unsent_rows(parts, monkeypatch):
+    parts.cfg[("sheets", "WRITE_BEHIND_SECONDS")] = 60
+    gs.append_row("XE_MAY", _order("02-03-2026", "K0"))
+    gs.flush_writes()   # phân vùng tháng 3 đã có
+    real = FakeWorksheet.append_rows
+    fail = {"XE_MAY_2026_03"}
+
+    def flaky(self, values, *a, **kw):
+        if self.title in fail:
+            fail.discard(self.title)
+            raise RuntimeError("quota")
+        return real(self, values, *a, **kw)
+
+    monkeypatch.setattr(FakeWorksheet, "append_rows", flaky)
+    gs.append_row("XE_MAY", _order("28-02-2026", "K1"))
+    gs.append_row("XE_MAY", _order("03-03-2026", "K2"))
+    with pytest.raises(PartialSend):
+        gs.flush_writes()
+    assert _names(parts, "XE_MAY_2026_02") == ["K1"]
+    assert gs.flush_writes() == 1
+    assert _names(parts, "XE_MAY_2026_02") == ["K1"]
+    assert _names(parts, "XE_MAY_2026_03") == ["K0", "K2"]
+    assert gs.daily_agg("01-02-2026", "31-03-2026")["SL_Giao"].sum() == 3
+
+
+def test_partial_failure_through_sqlite_outbox(parts, monkeypatch, tmp_path):
+    parts.cfg.update({("storage", "BACKEND"): "sqlite", ("storage", "SQLITE_PATH"): str(tmp_path / "t.db"),
+                      ("storage", "SYNC_SECONDS"): 3600})
+    parts.load("XE_MAY", [_order("01-03-2026", "K0")])
+    gs.migrate_partitions("XE_MAY")
+    real = FakeWorksheet.append_rows
+    fail = {"XE_MAY_2026_03"}
+
+    def flaky(self, values, *a, **kw):
+        if self.title in fail:
+            fail.discard(self.title)
+            raise RuntimeError("quota")
+        return real(self, values, *a, **kw)
+
+    monkeypatch.setattr(FakeWorksheet, "append_rows", flaky)
+    gs.get_backend().append_rows("XE_MAY", [_order("28-02-2026", "K1"), _order("03-03-2026", "K2")])
+    with pytest.raises(PartialSend):
+        gs.sync_now()
+    gs.sync_now()
+    assert _names(parts, "XE_MAY_2026_02") == ["K1"]
+    assert _names(parts, "XE_MAY_2026_03") == ["K0", "K2"]
+
+
+def test_read_spans_base_and_partitions(parts):
+    parts.load("XE_MAY", [_order("27-02-2026", "K0")])
+    parts.sh.load("XE_MAY_2026_02", [list(gs.REQUIRED_SHEETS["XE_MAY"]), _order("28-02-2026", "K1")])
+    parts.sh.load("XE_MAY_2026_03", [list(gs.REQUIRED_SHEETS["XE_MAY"]), _order("01-03-2026", "K2"),
+                                     _order("20-03-2026", "K3")])
+    parts.sh.load("XE_MAY_2026_04", [list(gs.REQUIRED_SHEETS["XE_MAY"]), _order("01-04-2026", "K4")])
+    got = gs.read_df("XE_MAY", "27-02-2026", "10-03-2026")
+    assert sorted(got["Khách hàng"]) == ["K0", "K1", "K2"]
+    assert len(gs.read_df("XE_MAY")) == 5
+
+
+def test_migrate_moves_rows_once(parts):
+    parts.load("XE_MAY", [_order("28-02-2026", "K1"), _order("01-03-2026", "K2"), _order("", "K3")])
+    before = gs.read_df("XE_MAY")
+    assert gs.migrate_partitions("XE_MAY") == {"XE_MAY_2026_02": 1, "XE_MAY_2026_03": 1}
+    assert _names(parts, "XE_MAY") == ["K3"]
+    assert sorted(gs.read_df("XE_MAY")["Khách hàng"]) == sorted(before["Khách hàng"])
+    assert gs.migrate_partitions("XE_MAY") == {}
+    assert _names(parts, "XE_MAY_2026_02") == ["K1"]
@@ -0,0 +1,118 @@
+# tests/test_payroll.py
+# payroll() so với vòng lặp cũ của trang 02 (bản đầu, commit 33dedba), chép lại bên dưới
+# gần như nguyên văn, chỉ đổi read_df -> tham số.
+import pandas as pd
+import pytest
+
+import utils.gs as gs
+from utils.payroll import payroll, PAYROLL_COLS
+from utils.schema import plain
+
+
+def _order(d, sp, sl, tt, nv):
+    return [d, "K", "", "", sp, "bình", sl, 0, tt, "Tiền Mặt", "", nv]
+
+
+def _read(*names):
+    # như bản đầu: read_df trả về cột thường (không Categorical)
+    return [plain(gs.read_df(n)) for n in names]
+
+
+def old_payroll(thang, cong, xm, pay, com):
+    if not cong.empty:
+        cong["Ngày"] = pd.to_datetime(cong["Ngày"], errors="coerce", dayfirst=True)
+        cong_m = cong[cong["Ngày"].dt.strftime("%m/%Y") == thang].copy()
+        cong_sum = cong_m.groupby("Nhân viên")["Công"].sum().reset_index(name="Công")
+    else:
+        cong_sum = pd.DataFrame(columns=["Nhân viên", "Công"])
+
+    if not xm.empty:
+        xm["Ngày"] = pd.to_datetime(xm["Ngày"], errors="coerce", dayfirst=True)
+        xm_m = xm[xm["Ngày"].dt.strftime("%m/%Y") == thang].copy()
+        xm_m["SL"] = pd.to_numeric(xm_m.get("Số lượng giao", 0), errors="coerce").fillna(0)
+        xm_m["TT"] = pd.to_numeric(xm_m.get("Thanh Toán", 0), errors="coerce").fillna(0)
+        by_nv_sp = xm_m.groupby(["Người chở", "Loại sản phẩm"]).agg(SL=("SL", "sum"), DT=("TT", "sum")).reset_index()
+        by_nv_rev = xm_m.groupby(["Người chở"]).agg(DoanhThu=("TT", "sum")).reset_index()
+        by_nv_rev.rename(columns={"Người chở": "Nhân viên"}, inplace=True)
+    else:
+        by_nv_sp = pd.DataFrame(columns=["Người chở", "Loại sản phẩm", "SL", "DT"])
+        by_nv_rev = pd.DataFrame(columns=["Nhân viên", "DoanhThu"])
+
+    df = pd.merge(cong_sum, by_nv_rev, on="Nhân viên", how="outer").fillna(0)
+
+    pay_m = pay[pay.get("Tháng", "") == thang].copy() if not pay.empty else pd.DataFrame()
+    if not pay_m.empty:
+        df = pd.merge(df, pay_m[["Nhân viên", "Luong_co_ban", "Don_gia_cong", "Phu_cap", "Tam_ung", "Khau_tru"]],
+                      on="Nhân viên", how="left")
+    else:
+        df["Luong_co_ban"] = 0; df["Don_gia_cong"] = 250000; df["Phu_cap"] = 0; df["Tam_ung"] = 0; df["Khau_tru"] = 0
+
+    com_m = com[com.get("Tháng", "") == thang].copy() if not com.empty else pd.DataFrame()
+
+    for c, default in [("Luong_co_ban", 0), ("Don_gia_cong", 250000), ("Phu_cap", 0), ("Tam_ung", 0),
+                       ("Khau_tru", 0), ("Công", 0.0)]:
+        df[c] = pd.to_numeric(df.get(c, default), errors="coerce").fillna(default)
+
+    base_from_day = (df["Công"] * df["Don_gia_cong"]).round(0)
+    df["Luong_co_ban_tinh"] = df["Luong_co_ban"].where(df["Luong_co_ban"] > 0, base_from_day)
+
+    hoa_hong_nv = {}
+    if not by_nv_sp.empty and not com_m.empty:
+        com_m["Ty_le_%"] = pd.to_numeric(com_m.get("Ty_le_%", 0), errors="coerce").fillna(0.0)
+        com_m["Hoa_hong_moi_donvi"] = pd.to_numeric(com_m.get("Hoa_hong_moi_donvi", 0), errors="coerce").fillna(0)
+        rate_map = {r["Loại sản phẩm"]: (float(r["Ty_le_%"]), int(r["Hoa_hong_moi_donvi"]))
+                    for _, r in com_m.iterrows()}
+        for nv in by_nv_sp["Người chở"].unique():
+            total = 0.0
+            sub = by_nv_sp[by_nv_sp["Người chở"] == nv]
+            for _, r in sub.iterrows():
+                sp = r["Loại sản phẩm"]; SL = float(r["SL"] or 0); DT = float(r["DT"] or 0)
+                rate, per_unit = rate_map.get(sp, (0.0, 0))
+                if per_unit > 0:
+                    total += SL * per_unit
+                elif rate > 0:
+                    total += DT * rate / 100.0
+            if total == 0:
+                dt_nv = float(by_nv_rev.loc[by_nv_rev["Nhân viên"] == nv, "DoanhThu"].sum() or 0)
+                total = dt_nv * 0.02
+            hoa_hong_nv[nv] = round(total, 0)
+    else:
+        for _, r in by_nv_rev.iterrows():
+            hoa_hong_nv[r["Nhân viên"]] = round(float(r["DoanhThu"] or 0) * 0.02, 0)
+
+    df["Hoa_hồng"] = df["Nhân viên"].map(hoa_hong_nv).fillna(0)
+    df["Tổng lương"] = (df["Luong_co_ban_tinh"] + df["Phu_cap"] + df["Hoa_hồng"] - df["Tam_ung"] - df["Khau_tru"]).round(0)
+    df.insert(0, "Tháng", thang)
+    for col in ["Luong_co_ban_tinh", "Phu_cap", "Hoa_hồng", "Tam_ung", "Khau_tru", "Tổng lương"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+    return df[PAYROLL_COLS]
+
+
+@pytest.fixture
+def books(sheets):
+    sheets.load("CONG", [["01-08-2026", "Pháp", "Full ngày", 1, ""], ["02-08-2026", "Pháp", "Nửa ngày sáng", 0.5, ""],
+                         ["02-08-2026", "Sâm", "Full ngày", 1, ""], ["03-08-2026", "", "Full ngày", 1, ""],
+                         ["01-09-2026", "Sâm", "Full ngày", 1, ""]])
+    sheets.load("XE_MAY", [_order("01-08-2026", "Aqua 500", 10, 200000, "Pháp"),
+                           _order("02-08-2026", "Aqua 5l", 3, 90000, "Pháp"),
+                           _order("02-08-2026", "Lavie", 5, 100000, "Sâm"),     # không có quy tắc
+                           _order("03-08-2026", "Aqua 500", 2, 40000, ""),      # thiếu người chở
+                           _order("04-08-2026", "Aqua 500", "", 30000, "Khoa"),
+                           _order("01-09-2026", "Aqua 500", 4, 80000, "Sâm")])
+    sheets.load("PAY_RULES", [["08/2026", "Pháp", 5000000, "", 100000, 0, 50000],
+                              ["09/2026", "Sâm", 0, 300000, 0, 200000, 0]])
+    sheets.load("COMMISSION_RULES", [["08/2026", "Aqua 500", "", 1500], ["08/2026", "Aqua 5l", 10, ""]])
+    return sheets
+
+
+@pytest.mark.parametrize("months", [["08/2026"], ["09/2026"], ["10/2026"], ["08/2026", "09/2026", "10/2026"]])
+def test_matches_old_loop(books, months):
+    args = _read("CONG", "XE_MAY", "PAY_RULES", "COMMISSION_RULES")
+    want = pd.concat([old_payroll(m, *[a.copy() for a in args]) for m in months], ignore_index=True)
+    got = payroll(months, *args)
+    assert not want["Nhân viên"].isna().any()
+    pd.testing.assert_frame_equal(got, want.sort_values(["Tháng", "Nhân viên"], kind="stable").reset_index(drop=True),
+                                  check_dtype=False)
+    if months == ["10/2026"]:
+        assert got.empty
+
@@ -0,0 +1,43 @@
+# tests/test_read.py
+import utils.gs as gs
+
+
+def test_formatted_values_are_typed_by_schema(sheets):
+    sheets.load("XE_MAY", [["05-10-2026", "K1", "007", "", "Aqua 500", "", "3", "x", "100.000", "", "", ""],
+                           ["2026-10-06", "K2", "", "", "", "", 2, 1, 1500000, "", "", ""]])
+    df = gs.read_df("XE_MAY")
+    assert df["Thanh Toán"].tolist() == [100000, 1500000]
+    assert df["Code"].tolist()[0] == "007"
+    assert df["Ngày"].dt.strftime("%d-%m-%Y").tolist() == ["05-10-2026", "06-10-2026"]
+    assert df["Vỏ về"].isna().tolist() == [True, False]
+
+
+def test_percent_cells(sheets):
+    sheets.load("COMMISSION_RULES", [["10/2026", "Aqua 500", "10%", "1.000"], ["10/2026", "Aqua 5l", "2,5", ""]])
+    df = gs.read_df("COMMISSION_RULES")
+    assert df["Ty_le_%"].tolist() == [10.0, 2.5]
+    assert df["Hoa_hong_moi_donvi"].tolist()[0] == 1000
+
+
+def test_derived_cache_keeps_latest_version_only(sheets):
+    gs.read_df("OTO")
+    for i in range(3):
+        gs.append_row("XE_MAY", ["05-10-2026", f"K{i}", "", "", "Aqua 500", "", 1, 0, 1000, "", "", ""])
+        assert len(gs.read_df("XE_MAY")) == i + 1
+    keys = [k[:2] for k in gs.get_derived_cache()._frames]
+    assert keys.count(("read_df", ("XE_MAY",))) == 1
+    assert keys.count(("read_df", ("OTO",))) == 1
+
+
+def test_metrics_record_the_sheet_read(sheets):
+    from utils.metrics import get_metrics
+    gs.daily_agg("01-10-2026", "31-10-2026")
+    gs.customer_ledger(["K1"])
+    gs.reconciliation("01-10-2026", "02-10-2026")
+    gs.read_df("XE_MAY")
+    recs = get_metrics().records()
+    got = dict(zip(recs.loc[recs["layer"] == "gs", "op"], recs.loc[recs["layer"] == "gs", "sheet"]))
+    assert got["daily_agg"] == "DAILY_AGG"
+    assert got["customer_ledger"] == "CONG_NO"
+    assert got["reconciliation"] == ",".join(gs.RECON_SHEETS)
+    assert got["read_df"] == "XE_MAY"
@@ -0,0 +1,99 @@
+# tests/test_reconcile.py
+# reconcile() so với vòng lặp cũ của trang 02 (bản đầu, commit 33dedba), chép lại bên dưới
+# gần như nguyên văn, chỉ đổi read_df -> tham số.
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+import utils.gs as gs
+from utils.reconcile import reconcile
+from utils.schema import plain
+
+
+def _order(d, sp, sl, tt, nv):
+    return [d, "K", "", "", sp, "bình", sl, 0, tt, "Tiền Mặt", "", nv]
+
+
+def _oto(d, sp, sl):
+    return [d, "K", sp, "bình", sl, 0, 0, "Tiền Mặt", "", "", ""]
+
+
+def _read(*names):
+    # như bản đầu: read_df trả về cột thường (không Categorical)
+    return [plain(gs.read_df(n)) for n in names]
+
+
+def old_reconcile(ngay_dc, close, nh, xm, oto, products):
+    prev_day = pd.to_datetime(ngay_dc) - timedelta(days=1)
+    if not close.empty and "Ngày" in close.columns:
+        close["Ngày"] = pd.to_datetime(close["Ngày"], errors="coerce", dayfirst=True)
+        close = close.dropna(subset=["Ngày"])
+        prev_sub = close[close["Ngày"].dt.date == prev_day.date()]
+        curr_sub = close[close["Ngày"].dt.date == pd.to_datetime(ngay_dc).date()]
+        ton_prev = pd.to_numeric(prev_sub.get("Tồn cuối", 0), errors="coerce").groupby(prev_sub.get("Loại sản phẩm", "")).sum()
+        ton_curr = pd.to_numeric(curr_sub.get("Tồn cuối", 0), errors="coerce").groupby(curr_sub.get("Loại sản phẩm", "")).sum()
+    else:
+        ton_prev = pd.Series(dtype=float); ton_curr = pd.Series(dtype=float)
+
+    if not nh.empty and "Ngày" in nh.columns:
+        nh["Ngày"] = pd.to_datetime(nh["Ngày"], errors="coerce", dayfirst=True)
+        nh = nh.dropna(subset=["Ngày"])
+        mask = nh["Ngày"].dt.date == pd.to_datetime(ngay_dc).date()
+        k = pd.to_numeric(nh.loc[mask, "Số lượng nhập"], errors="coerce").groupby(nh.loc[mask, "Loại sản phẩm"]).sum()
+    else:
+        k = pd.Series(dtype=float)
+
+    def take(df, qty_col):
+        if df.empty or "Ngày" not in df.columns: return pd.Series(dtype=float)
+        df["Ngày"] = pd.to_datetime(df["Ngày"], errors="coerce", dayfirst=True)
+        df = df.dropna(subset=["Ngày"])
+        dday = df[df["Ngày"].dt.date == pd.to_datetime(ngay_dc).date()]
+        if dday.empty: return pd.Series(dtype=float)
+        q = pd.to_numeric(dday.get(qty_col, 0), errors="coerce")
+        return q.groupby(dday.get("Loại sản phẩm", "")).sum()
+
+    zact = take(xm, "Số lượng giao").add(take(oto, "Số lượng"), fill_value=0)
+    all_items = sorted(set(products) | set(ton_prev.index) | set(ton_curr.index) | set(k.index) | set(zact.index))
+    rows = []
+    for it in all_items:
+        X = float(ton_prev.get(it, 0) or 0)
+        K = float(k.get(it, 0) or 0)
+        Y = float(ton_curr.get(it, 0) or 0)
+        Zexp = X + K - Y
+        Zreal = float(zact.get(it, 0) or 0)
+        rows.append({"Loại sản phẩm": it, "Tồn hôm qua (X)": int(X), "Nhập hôm nay (K)": int(K),
+                     "Tồn hôm nay (Y)": int(Y), "Xuất kỳ vọng (X+K-Y)": int(Zexp), "Xuất thực tế": int(Zreal),
+                     "Chênh lệch": int(Zexp - Zreal)})
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def books(sheets):
+    sheets.load("DAILY_CLOSE", [["31-07-2026", "Aqua 500", 100, "", ""], ["01-08-2026", "Aqua 500", 92, "", ""],
+                                ["01-08-2026", "Aqua 5l", 20, "", ""], ["02-08-2026", "Aqua 500", 90, "", ""],
+                                ["02-08-2026", "", 7, "", ""]])    # thiếu tên sản phẩm
+    sheets.load("NHAP_HANG", [["01-08-2026", "Aqua 500", 5, 0, 0, "", ""], ["02-08-2026", "Lavie", 10, 0, 0, "", ""]])
+    sheets.load("XE_MAY", [_order("01-08-2026", "Aqua 500", 10, 200000, "Pháp"),
+                           _order("02-08-2026", "Aqua 5l", 3, 90000, "Pháp"),
+                           _order("02-08-2026", "Lavie", 5, 100000, "Sâm"),
+                           _order("03-08-2026", "Aqua 500", "", 40000, "")])
+    sheets.load("OTO", [_oto("01-08-2026", "Aqua 500", 2), _oto("02-08-2026", "Aqua 5l", 1)])
+    return sheets
+
+
+def test_matches_old_loop(books):
+    close, nh, xm, oto = _read("DAILY_CLOSE", "NHAP_HANG", "XE_MAY", "OTO")
+    days = pd.date_range("2026-08-01", "2026-08-03")
+    got = reconcile(days[0], days[-1], close, nh, {"XE_MAY": xm, "OTO": oto}, ["Aqua 1l"])
+    for d in days.strftime("%d-%m-%Y"):
+        want = old_reconcile(pd.to_datetime(d, dayfirst=True), close.copy(), nh.copy(), xm.copy(), oto.copy(),
+                             ["Aqua 1l"])
+        want = want[want["Loại sản phẩm"].notna() & want["Loại sản phẩm"].ne("")]
+        day = got[got["Ngày"] == d].drop(columns=["Ngày", "Thiếu chốt"]).set_index("Loại sản phẩm")
+        # sản phẩm chỉ phát sinh ở ngày khác trong khoảng: thêm dòng toàn 0
+        extra = day.drop(index=want["Loại sản phẩm"])
+        assert (extra == 0).all().all()
+        pd.testing.assert_frame_equal(day.loc[want["Loại sản phẩm"]], want.set_index("Loại sản phẩm"),
+                                      check_dtype=False)
+
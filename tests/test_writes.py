@@ -0,0 +1,18 @@
+# tests/test_writes.py
+import utils.gs as gs
+from conftest import day
+
+
+def test_orders_are_written_through_by_default(sheets):
+    assert gs.get_write_queue() is None
+    gs.append_row("XE_MAY", [day(), "K1", "", "", "Aqua 500", "bình", 1, 0, 20000, "Tiền Mặt", "", "Pháp"])
+    assert [r[1] for r in sheets.values("XE_MAY")[1:]] == ["K1"]
+
+
+def test_write_behind_is_opt_in(sheets):
+    sheets.cfg[("sheets", "WRITE_BEHIND_SECONDS")] = 60
+    gs.append_row("XE_MAY", [day(), "K1", "", "", "Aqua 500", "bình", 1, 0, 20000, "Tiền Mặt", "", "Pháp"])
+    assert len(sheets.values("XE_MAY")) == 1
+    assert gs.read_df("XE_MAY")["Khách hàng"].tolist() == ["K1"]
+    assert gs.flush_writes() == 1
+    assert len(sheets.values("XE_MAY")) == 2
@@ -0,0 +1,132 @@
+# utils/aggsheet.py
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+from .dailyagg import AGG_SHEET, ORDER_SHEETS, order_measures, aggregate, rows_to_frame
+from .dates import filter_dates
+from .schema import SCHEMAS, apply_schema
+from .writequeue import WriteQueue
+
+def typed_rows(ws_name: str, rows: list) -> pd.DataFrame:
+    """Các dòng append (chưa lên sheet) -> DataFrame đã đổi kiểu như read_df
+    ("1,500,000" -> 1500000), để cộng dồn khớp với dựng lại."""
+    return apply_schema(ws_name, rows_to_frame(list(SCHEMAS[ws_name]), rows))
+
+class DerivedSheet:
+    """Phần chung của DAILY_AGG & CONG_NO: sheet tính từ XE_MAY + OTO, cộng dồn các đơn
+    đã lên sheet (`add`); lớp con cài `_apply(sheet đơn, dòng)` và `rebuild()`.
+
+    Không tự đọc sheet đơn, các hàm được truyền vào lúc tạo (utils.gs):
+    `backend` lưu sheet tổng hợp; `read_orders(date_from, date_to)` -> {sheet đơn: DataFrame
+    như read_df}, gồm tháng đã chốt; `pending()` là context manager giữ khoá hàng đợi ghi
+    đơn và trả {sheet đơn: dòng chưa lên sheet}; `flush()` ghi hết hàng đợi ghi đơn.
+
+    `delay` > 0: `add` chỉ xếp đơn vào hàng đợi cập nhật (WriteQueue riêng), thread nền
+    cộng theo lô khi đủ `max_rows` đơn hoặc đơn cũ nhất chờ quá `delay` giây: mỗi lô tốn
+    một lần ghi cho mỗi ngày/nhóm khách thay vì mỗi đơn một lần. Đơn chờ chỉ nằm trong
+    bộ nhớ: tiến trình chết khi còn đơn chờ thì sheet tổng hợp thiếu, cần dựng lại.
+    """
+
+    def __init__(self, backend, read_orders, pending, flush, delay: float = 0, max_rows: int = 100):
+        self.backend = backend
+        self.read_orders = read_orders
+        self.pending = pending
+        self.flush = flush
+        self.error = None     # lỗi lần cập nhật gần nhất (sheet tổng hợp có thể lệch, cần dựng lại)
+        self.checked = False
+        self._lock = threading.Lock()
+        self.queue = WriteQueue(self._add_now, max_rows=max_rows, max_delay=delay).start() if delay > 0 else None
+
+    def add(self, ws_name: str, rows: list):
+        """Cộng các đơn vừa lên sheet (ngay, hoặc theo lô qua hàng đợi cập nhật)."""
+        if self.queue is not None:
+            self.queue.put(ws_name, rows)
+        else:
+            self._add_now(ws_name, rows)
+
+    def _add_now(self, ws_name: str, rows: list):
+        # lỗi không được làm hỏng lần ghi đơn: chỉ ghi nhận để báo cần dựng lại
+        try:
+            self._apply(ws_name, rows)
+        except Exception as e:
+            self.error = e
+
+    def flush_upkeep(self) -> int:
+        """Cộng ngay các đơn còn trong hàng đợi cập nhật. Trả về số đơn."""
+        return self.queue.flush() if self.queue is not None else 0
+
+    @contextmanager
+    def _held(self):
+        # khoá hàng đợi cập nhật của các sheet đơn (luôn lấy TRƯỚC khoá hàng đợi ghi đơn)
+        if self.queue is None:
+            yield
+            return
+        with self.queue.sheet_lock(ORDER_SHEETS[0]), self.queue.sheet_lock(ORDER_SHEETS[1]):
+            yield
+
+    @contextmanager
+    def unapplied(self):
+        """Trong khối with: {sheet đơn: dòng chưa vào sheet tổng hợp} (còn trong hàng đợi ghi
+        đơn hoặc hàng đợi cập nhật); mỗi đơn hoặc đã vào sheet tổng hợp, hoặc nằm trong đây."""
+        with self._held(), self.pending() as queued:
+            if self.queue is not None:
+                queued = {s: self.queue.pending(s) + queued.get(s, []) for s in ORDER_SHEETS}
+            yield queued
+
+    @contextmanager
+    def _rebuilding(self):
+        # đơn còn trong hàng đợi cập nhật đã lên sheet: dựng lại sẽ tính, bỏ khỏi hàng đợi
+        self.flush()
+        with self._held():
+            if self.queue is not None:
+                self.queue.discard()
+            yield
+        self.error, self.checked = None, True
+
+class DailyAggSheet(DerivedSheet):
+    """DAILY_AGG: tổng theo (ngày, nguồn, sản phẩm, PP thanh toán, người chở), cộng dồn
+    mỗi lần ghi đơn (cách tính xem utils/dailyagg.py; tham số xem DerivedSheet)."""
+
+    def _write_day(self, day: str, block: pd.DataFrame):
+        self.backend.replace_rows_by_date(AGG_SHEET, "Ngày", day, block)
+
+    def _apply(self, ws_name: str, rows: list):
+        # chỉ ghi lại block của những ngày có đơn
+        delta = aggregate([order_measures(ws_name, typed_rows(ws_name, rows))])
+        with self._lock:
+            for day, part in delta.groupby("Ngày", sort=False):
+                cur = apply_schema(AGG_SHEET, self.backend.read_df(AGG_SHEET, date_from=day, date_to=day))
+                self._write_day(day, aggregate([cur, part]))
+
+    def refresh_day(self, day: str):
+        """Tính lại DAILY_AGG của một ngày từ đơn gốc (sau khi sửa/ghi đè đơn của ngày đó)."""
+        try:
+            with self._held():
+                self.flush_upkeep()
+                frames = [order_measures(s, d) for s, d in self.read_orders(day, day).items()]
+                with self._lock:
+                    self._write_day(day, aggregate(frames))
+        except Exception as e:
+            self.error = e
+
+    def rebuild(self) -> int:
+        """Dựng lại toàn bộ DAILY_AGG từ XE_MAY + OTO. Trả về số dòng tổng hợp."""
+        with self._rebuilding():
+            agg = aggregate([order_measures(s, d) for s, d in self.read_orders(None, None).items()])
+            with self._lock:
+                self.backend.write_df(AGG_SHEET, agg)
+        return len(agg)
+
+    def read(self, date_from=None, date_to=None) -> pd.DataFrame:
+        """DAILY_AGG trong khoảng ngày, gồm cả đơn chưa cộng vào (còn trong các hàng đợi).
+        Lần đầu thấy DAILY_AGG trống thì tự dựng từ đơn gốc."""
+        if not self.checked:
+            self.checked = True
+            if self.backend.read_df(AGG_SHEET).empty:
+                self.rebuild()
+        with self.unapplied() as queued:
+            cur = apply_schema(AGG_SHEET, self.backend.read_df(AGG_SHEET, date_from=date_from, date_to=date_to))
+            pend = [order_measures(s, typed_rows(s, queued[s])) for s in ORDER_SHEETS if queued.get(s)]
+        return aggregate([cur] + [filter_dates(p, date_from, date_to) for p in pend])
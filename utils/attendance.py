@@ -0,0 +1,69 @@
+# utils/attendance.py
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates, DATE_FMT_SAVE
+
+CONG_COLS = ["Ngày", "Nhân viên", "Ca", "Công", "Ghi chú"]
+
+def month_matrix(cong_m: pd.DataFrame, employees: list, days: list) -> pd.DataFrame:
+    """Các dòng CONG của tháng -> ma trận Nhân viên × ngày (cột là số ngày, giá trị 0..1) + "Tổng công"."""
+    cols = [d.day for d in days]
+    if cong_m is not None and not cong_m.empty:
+        piv = pd.DataFrame({"nv": cong_m["Nhân viên"].astype(str).str.strip(),
+                            "d": parse_dates(cong_m["Ngày"]).dt.day,
+                            "v": pd.to_numeric(cong_m["Công"], errors="coerce")}) \
+                .pivot_table(index="nv", columns="d", values="v", aggfunc="sum", fill_value=0.0)
+    else:
+        piv = pd.DataFrame()
+    piv = piv.reindex(index=employees, columns=cols).astype(float).fillna(0.0).clip(0, 1)
+    piv = piv.rename_axis(index="Nhân viên", columns=None).reset_index()
+    piv["Tổng công"] = piv[cols].sum(axis=1)
+    return piv
+
+def _int_cols(matrix: pd.DataFrame) -> pd.DataFrame:
+    # data_editor trả tên cột ngày dạng chuỗi ("1", "2"...): đưa về số ngày
+    return matrix.rename(columns=lambda c: int(c) if str(c).isdigit() else c)
+
+def matrix_rows(matrix: pd.DataFrame, days: list) -> pd.DataFrame:
+    """Ma trận đã sửa -> dòng CONG (một dòng mỗi ô > 0), xếp theo ngày rồi nhân viên.
+    Quy ước cũ: >= 1 là "Full ngày" (1 công), còn lại là "Nửa ngày sáng" (0.5 công)."""
+    cols = [d.day for d in days]
+    long = _int_cols(matrix).melt(id_vars="Nhân viên", value_vars=cols, var_name="d", value_name="v")
+    v = pd.to_numeric(long["v"], errors="coerce").fillna(0.0)
+    long, v = long[v > 0], v[v > 0]
+    full = (v >= 1).to_numpy()
+    day_str = {d.day: d.strftime(DATE_FMT_SAVE) for d in days}
+    out = pd.DataFrame({
+        "Ngày": long["d"].map(day_str).to_numpy(),
+        "Nhân viên": long["Nhân viên"].to_numpy(),
+        "Ca": np.where(full, "Full ngày", "Nửa ngày sáng"),
+        "Công": np.where(full, 1.0, 0.5),
+        "Ghi chú": "",
+        "_d": long["d"].to_numpy(),
+    })
+    return out.sort_values("_d", kind="stable").drop(columns="_d").reset_index(drop=True)[CONG_COLS]
+
+def merge_month(cong_m: pd.DataFrame, before: pd.DataFrame, after: pd.DataFrame, days: list):
+    """Các dòng CONG của cả tháng sau khi sửa ma trận `before` -> `after`.
+
+    Chỉ các ô (nhân viên, ngày) bị sửa được thay bằng dòng mới (matrix_rows);
+    ô không đổi và nhân viên không có trong ma trận giữ nguyên dòng cũ (Ca,
+    Ghi chú...). Trả về (dòng CONG của tháng, số ô thay đổi).
+    """
+    cols = [d.day for d in days]
+    before, after = _int_cols(before), _int_cols(after)
+    b = before.set_index("Nhân viên")[cols].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+    a = after.set_index("Nhân viên")[cols].apply(pd.to_numeric, errors="coerce").fillna(0.0).reindex(b.index)
+    diff = a.ne(b).stack()
+    changed = diff[diff].index   # (nhân viên, số ngày)
+
+    old = cong_m.reindex(columns=CONG_COLS) if cong_m is not None else pd.DataFrame(columns=CONG_COLS)
+    old_days = parse_dates(old["Ngày"])
+    okey = pd.MultiIndex.from_arrays([old["Nhân viên"].astype(str).str.strip(), old_days.dt.day])
+    new = matrix_rows(after, days)
+    nkey = pd.MultiIndex.from_arrays([new["Nhân viên"].astype(str).str.strip(), parse_dates(new["Ngày"]).dt.day])
+    keep = old[~okey.isin(changed)].assign(Ngày=old_days.dt.strftime(DATE_FMT_SAVE))
+    out = pd.concat([keep, new[nkey.isin(changed)]], ignore_index=True)
+    out = out.assign(_d=parse_dates(out["Ngày"])).sort_values("_d", kind="stable").drop(columns="_d")
+    return out.reset_index(drop=True)[CONG_COLS], len(changed)
@@ -1,16 +1,29 @@
 import streamlit as st
 from google.oauth2.service_account import Credentials
 import gspread
+from .quota import QuotaHTTPClient
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
+def setting(section: str, key: str, default=None):
+    """Đọc một mục tuỳ chọn trong secrets; không có file/mục thì trả về default."""
+    try:
+        return st.secrets[section][key]
+    except Exception:
+        return default
+
 @st.cache_resource(show_spinner=False)
 def get_client():
     creds = Credentials.from_service_account_info(
         dict(st.secrets["gcp_service_account"]),
         scopes=SCOPES
     )
-    return gspread.authorize(creds)
+    # giới hạn hạn mức đọc/ghi mỗi phút + thử lại 429/5xx (xem utils/quota.py)
+    http_client = QuotaHTTPClient.configure(
+        read_per_minute=setting("sheets", "READS_PER_MINUTE"),
+        write_per_minute=setting("sheets", "WRITES_PER_MINUTE"),
+    )
+    return gspread.authorize(creds, http_client=http_client)
 
 @st.cache_resource(show_spinner=False)
 def get_spreadsheet():
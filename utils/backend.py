@@ -0,0 +1,410 @@
+# utils/backend.py
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from .dates import parse_days, to_day
+from .payroll import norm_month
+from .writequeue import PartialSend
+
+DATE_COL = "Ngày"
+MONTH_COL = "Tháng"   # sheet theo tháng (PAY_RULES, COMMISSION_RULES, LUONG): 'mm/YYYY'
+# Cột hay lọc, được đánh index trong SQLite
+INDEXED_COLS = ["Loại sản phẩm", "Nhân viên", "Khách hàng"]
+
+def _q(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _sql_value(v):
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, str):
+        return v if v.strip() else None
+    return v.item() if hasattr(v, "item") else v
+
+def _day_keys(values) -> list:
+    """Ngày chuẩn ISO (yyyy-mm-dd) lưu ở cột _day để lọc/đánh index; không đọc được -> None."""
+    return [None if np.isnat(d) else str(d) for d in parse_days(values)]
+
+class Backend(ABC):
+    """Nơi lưu dữ liệu đứng sau read_df / append_row / write_df / replace_rows_by_date.
+
+    `filters` là {tên cột: giá trị hoặc list giá trị} (lọc bằng), `date_from`/
+    `date_to` lọc theo cột "Ngày" (gồm cả hai đầu).
+    """
+
+    @abstractmethod
+    def read_df(self, ws_name: str, date_from=None, date_to=None, filters: dict = None) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def frame(self, ws_name: str) -> pd.DataFrame:
+        """Toàn bộ sheet dạng DataFrame dùng chung (không sửa trực tiếp); cùng object cho tới lần ghi sau."""
+
+    @abstractmethod
+    def version(self, ws_name: str):
+        """Giá trị đổi sau mỗi lần ghi vào sheet (so sánh bằng ==), để cache kết quả tính từ sheet."""
+
+    @abstractmethod
+    def append_rows(self, ws_name: str, rows: list):
+        ...
+
+    @abstractmethod
+    def write_df(self, ws_name: str, df: pd.DataFrame):
+        ...
+
+    @abstractmethod
+    def replace_rows_by_date(self, ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame,
+                             date_to: str = None):
+        """Thay các dòng có `date_col` = `date_str` (hoặc trong [date_str, date_to]) bằng `new_rows`."""
+
+    @abstractmethod
+    def replace_rows_by_month(self, ws_name: str, months: list, new_rows: pd.DataFrame):
+        """Thay các dòng có cột "Tháng" thuộc `months` ('mm/YYYY') bằng `new_rows`."""
+
+    @abstractmethod
+    def replace_rows_by_key(self, ws_name: str, key_col: str, keys: list, new_rows: pd.DataFrame):
+        """Thay các dòng có `key_col` thuộc `keys` (vd. các khách trong sổ công nợ) bằng `new_rows`."""
+
+def in_months(values, months) -> np.ndarray:
+    """Mask các giá trị cột "Tháng" thuộc `months` (so sau khi chuẩn hoá: '8/2025' = '08/2025')."""
+    months = {norm_month(m) for m in months} - {None}
+    return np.asarray([norm_month(v) in months for v in values], dtype=bool)
+
+def in_keys(values, keys) -> np.ndarray:
+    """Mask các giá trị (đã strip) thuộc `keys`."""
+    keys = {str(k).strip() for k in keys}
+    return np.asarray([v is not None and not (not isinstance(v, str) and pd.isna(v)) and str(v).strip() in keys
+                       for v in values], dtype=bool)
+
+def apply_filters(df: pd.DataFrame, filters: dict = None) -> pd.DataFrame:
+    """Lọc bằng trên DataFrame (dùng khi backend không đẩy được điều kiện xuống)."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, val in filters.items():
+        if col not in df.columns:
+            return df.iloc[0:0]
+        vals = val if isinstance(val, (list, tuple, set)) else [val]
+        mask &= df[col].astype(str).str.strip().isin([str(v).strip() for v in vals])
+    return df[mask]
+
+class SQLiteBackend(Backend):
+    """Lưu trữ cục bộ bằng SQLite: mỗi sheet một bảng (cột theo REQUIRED_SHEETS),
+    thêm cột `_day` (ngày ISO) có index để lọc ngày/sản phẩm ngay trong SQL.
+
+    Mỗi lần ghi được xếp vào bảng `_outbox`; `SheetSync` đẩy dần lên Google Sheets.
+    Bảng rỗng chưa từng đồng bộ thì nạp ban đầu bằng `pull(ws_name)` (nếu có).
+    """
+
+    def __init__(self, path: str, schemas: dict, pull=None):
+        self.path = path
+        self.schemas = {k: list(v) for k, v in schemas.items()}
+        self.pull = pull
+        self.sync = None   # SheetSync gắn vào sau (nếu có)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._versions = {}
+        self._frames = {}
+        self._cols = {}
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS _meta (sheet TEXT PRIMARY KEY, pulled_at REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS _outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "sheet TEXT, op TEXT, payload TEXT, created_at REAL)")
+
+    # ---------- bảng ----------
+    def _table_cols(self, ws_name: str) -> list:
+        cols = self._cols.get(ws_name)
+        if cols is None:
+            info = self._conn.execute(f"PRAGMA table_info({_q(ws_name)})").fetchall()
+            cols = [r[1] for r in info if not r[1].startswith("_")]
+            self._cols[ws_name] = cols
+        return cols
+
+    def _ensure_table(self, ws_name: str, columns: list = None):
+        """Tạo bảng nếu chưa có; thêm cột còn thiếu (vd. cột mới trong DataFrame ghi vào)."""
+        with self._lock:
+            first = ws_name not in self._cols
+            cols = self._table_cols(ws_name)
+            if not cols:
+                cols = list(columns or self.schemas.get(ws_name) or [])
+                defs = ", ".join(["_row INTEGER PRIMARY KEY AUTOINCREMENT", "_day TEXT"] + [_q(c) for c in cols])
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {_q(ws_name)} ({defs})")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {_q('ix_' + ws_name + '__day')} "
+                                   f"ON {_q(ws_name)} (_day)")
+                self._cols[ws_name] = cols
+                self._bootstrap(ws_name)
+            if first:
+                # lọc so giá trị đã trim (như apply_filters) -> index trên trim(cột)
+                for c in INDEXED_COLS:
+                    if c in cols:
+                        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {_q('ix_' + ws_name + '_' + c + '_trim')} "
+                                           f"ON {_q(ws_name)} (trim({_q(c)}))")
+            for c in columns or []:
+                if c not in self._cols[ws_name]:
+                    self._conn.execute(f"ALTER TABLE {_q(ws_name)} ADD COLUMN {_q(c)}")
+                    self._cols[ws_name].append(c)
+            return self._cols[ws_name]
+
+    def _bootstrap(self, ws_name: str):
+        """Nạp dữ liệu hiện có trên Google Sheets vào bảng mới tạo (chỉ một lần)."""
+        if self.pull is None:
+            return
+        done = self._conn.execute("SELECT 1 FROM _meta WHERE sheet = ?", (ws_name,)).fetchone()
+        if done:
+            return
+        df = self.pull(ws_name)
+        if df is not None and not df.empty:
+            for c in df.columns:
+                if c not in self._cols[ws_name]:
+                    self._conn.execute(f"ALTER TABLE {_q(ws_name)} ADD COLUMN {_q(c)}")
+                    self._cols[ws_name].append(c)
+            self._insert(ws_name, list(df.columns), df.itertuples(index=False, name=None))
+        self._conn.execute("INSERT OR REPLACE INTO _meta VALUES (?, ?)", (ws_name, time.time()))
+
+    def _insert(self, ws_name: str, columns: list, rows):
+        cols = self._cols[ws_name]
+        pos = {c: i for i, c in enumerate(columns)}
+        rows = list(rows)
+        if not rows:
+            return
+        day_i = pos.get(DATE_COL)
+        days = _day_keys([r[day_i] if day_i is not None and day_i < len(r) else None for r in rows])
+        data = [[day] + [_sql_value(r[pos[c]]) if c in pos and pos[c] < len(r) else None for c in cols]
+                for day, r in zip(days, rows)]
+        marks = ", ".join(["?"] * (len(cols) + 1))
+        names = ", ".join(["_day"] + [_q(c) for c in cols])
+        self._conn.executemany(f"INSERT INTO {_q(ws_name)} ({names}) VALUES ({marks})", data)
+
+    def _touch(self, ws_name: str, op: str, payload):
+        self._versions[ws_name] = self._versions.get(ws_name, 0) + 1
+        self._frames.pop(ws_name, None)
+        self._conn.execute("INSERT INTO _outbox (sheet, op, payload, created_at) VALUES (?, ?, ?, ?)",
+                           (ws_name, op, json.dumps(payload, ensure_ascii=False, default=str), time.time()))
+
+    def version(self, ws_name: str) -> int:
+        return self._versions.get(ws_name, 0)
+
+    # ---------- đọc ----------
+    def read_df(self, ws_name: str, date_from=None, date_to=None, filters: dict = None) -> pd.DataFrame:
+        with self._lock:
+            cols = self._ensure_table(ws_name)
+            where, args = [], []
+            if date_from is not None:
+                where.append("_day >= ?"); args.append(str(to_day(date_from)))
+            if date_to is not None:
+                where.append("_day <= ?"); args.append(str(to_day(date_to)))
+            for col, val in (filters or {}).items():
+                if col not in cols:
+                    return pd.DataFrame(columns=cols)
+                vals = list(val) if isinstance(val, (list, tuple, set)) else [val]
+                where.append(f"trim({_q(col)}) IN ({', '.join(['?'] * len(vals))})")
+                args += [str(v).strip() for v in vals]
+            sql = f"SELECT {', '.join(_q(c) for c in cols)} FROM {_q(ws_name)}"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY _row"
+            rows = self._conn.execute(sql, args).fetchall()
+        df = pd.DataFrame(rows, columns=cols)
+        return df.dropna(how="all") if not df.empty else df
+
+    def frame(self, ws_name: str) -> pd.DataFrame:
+        with self._lock:
+            df = self._frames.get(ws_name)
+            if df is None:
+                df = self.read_df(ws_name)
+                self._frames[ws_name] = df
+            return df
+
+    # ---------- ghi ----------
+    def append_rows(self, ws_name: str, rows: list):
+        with self._lock:
+            cols = self._ensure_table(ws_name)
+            self._conn.execute("BEGIN")
+            self._insert(ws_name, cols[:max(len(r) for r in rows)] if rows else cols, rows)
+            self._touch(ws_name, "append", {"rows": rows})
+            self._conn.execute("COMMIT")
+
+    def write_df(self, ws_name: str, df: pd.DataFrame):
+        columns = [str(c).strip() for c in df.columns]
+        with self._lock:
+            self._ensure_table(ws_name, columns)
+            self._conn.execute("BEGIN")
+            self._conn.execute(f"DELETE FROM {_q(ws_name)}")
+            self._insert(ws_name, columns, df.itertuples(index=False, name=None))
+            self._touch(ws_name, "write", None)
+            self._conn.execute("COMMIT")
+
+    def replace_rows_by_date(self, ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame,
+                             date_to: str = None):
+        columns = [str(c).strip() for c in new_rows.columns]
+        rows = [[_sql_value(v) for v in r] for r in new_rows.itertuples(index=False, name=None)]
+        lo, hi = str(to_day(date_str)), str(to_day(date_to if date_to is not None else date_str))
+        with self._lock:
+            cols = self._ensure_table(ws_name, columns)
+            self._conn.execute("BEGIN")
+            if date_col == DATE_COL:
+                self._conn.execute(f"DELETE FROM {_q(ws_name)} WHERE _day BETWEEN ? AND ?", (lo, hi))
+            elif date_col in cols:
+                # cột ngày khác "Ngày" (không có _day): so từng dòng như SheetsBackend
+                cur = self._conn.execute(f"SELECT _row, {_q(date_col)} FROM {_q(ws_name)}").fetchall()
+                days = _day_keys([v for _, v in cur])
+                self._conn.executemany(f"DELETE FROM {_q(ws_name)} WHERE _row = ?",
+                                       [(r,) for (r, _), d in zip(cur, days) if d is not None and lo <= d <= hi])
+            self._insert(ws_name, columns, rows)
+            self._touch(ws_name, "replace_date",
+                        {"date_col": date_col, "date_str": date_str, "date_to": date_to,
+                         "columns": columns, "rows": rows})
+            self._conn.execute("COMMIT")
+
+    def replace_rows_by_month(self, ws_name: str, months: list, new_rows: pd.DataFrame):
+        columns = [str(c).strip() for c in new_rows.columns]
+        rows = [[_sql_value(v) for v in r] for r in new_rows.itertuples(index=False, name=None)]
+        with self._lock:
+            cols = self._ensure_table(ws_name, columns)
+            self._conn.execute("BEGIN")
+            if MONTH_COL in cols:
+                cur = self._conn.execute(f"SELECT _row, {_q(MONTH_COL)} FROM {_q(ws_name)}").fetchall()
+                hit = in_months([m for _, m in cur], months)
+                self._conn.executemany(f"DELETE FROM {_q(ws_name)} WHERE _row = ?",
+                                       [(r,) for (r, _), h in zip(cur, hit) if h])
+            self._insert(ws_name, columns, rows)
+            self._touch(ws_name, "replace_month", {"months": list(months), "columns": columns, "rows": rows})
+            self._conn.execute("COMMIT")
+
+    def replace_rows_by_key(self, ws_name: str, key_col: str, keys: list, new_rows: pd.DataFrame):
+        columns = [str(c).strip() for c in new_rows.columns]
+        rows = [[_sql_value(v) for v in r] for r in new_rows.itertuples(index=False, name=None)]
+        keys = [str(k).strip() for k in keys]
+        with self._lock:
+            cols = self._ensure_table(ws_name, columns)
+            self._conn.execute("BEGIN")
+            if key_col in cols and keys:
+                self._conn.execute(f"DELETE FROM {_q(ws_name)} WHERE trim({_q(key_col)}) IN "
+                                   f"({', '.join(['?'] * len(keys))})", keys)
+            self._insert(ws_name, columns, rows)
+            self._touch(ws_name, "replace_key", {"key_col": key_col, "keys": keys, "columns": columns, "rows": rows})
+            self._conn.execute("COMMIT")
+
+    # ---------- outbox ----------
+    def pending(self, limit: int = 100) -> list:
+        with self._lock:
+            return self._conn.execute("SELECT id, sheet, op, payload FROM _outbox ORDER BY id LIMIT ?",
+                                      (limit,)).fetchall()
+
+    def take_sheet(self, ws_name: str):
+        """(id các thao tác đang chờ của sheet, toàn bộ bảng) lấy cùng lúc, để đẩy
+        một bản đầy đủ thay cho mọi thao tác chờ đó."""
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute("SELECT id FROM _outbox WHERE sheet = ?", (ws_name,))]
+            return ids, self.read_df(ws_name)
+
+    def keep_unsent(self, ids: list, rows: list):
+        """Các append `ids` mới đẩy được một phần: thao tác đầu giữ lại `rows` (chưa ghi),
+        bỏ các thao tác sau; vị trí trong outbox không đổi."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("UPDATE _outbox SET payload = ? WHERE id = ?",
+                               (json.dumps({"rows": rows}, ensure_ascii=False, default=str), ids[0]))
+            self._conn.executemany("DELETE FROM _outbox WHERE id = ?", [(i,) for i in ids[1:]])
+            self._conn.execute("COMMIT")
+
+    def done(self, ids: list):
+        with self._lock:
+            self._conn.executemany("DELETE FROM _outbox WHERE id = ?", [(i,) for i in ids])
+
+class SheetSync:
+    """Luồng nền đẩy `_outbox` của SQLiteBackend lên Google Sheets.
+
+    `push_append(ws, rows)`, `push_write(ws, df)`, `push_replace(ws, date_col, date_str, df, date_to)`,
+    `push_replace_month(ws, months, df)`, `push_replace_key(ws, key_col, keys, df)` là các hàm ghi
+    Sheets thật (hoặc spreadsheet giả). Các append liên tiếp cùng sheet gộp thành một lần; nhiều lần
+    ghi đè cả sheet chỉ đẩy bản mới nhất. Append chỉ ghi được một phần (PartialSend) thì outbox
+    chỉ giữ lại các dòng chưa ghi.
+    """
+
+    def __init__(self, backend: SQLiteBackend, push_append, push_write, push_replace, interval: float = 5.0,
+                 push_replace_month=None, push_replace_key=None):
+        self.backend = backend
+        self.push_append = push_append
+        self.push_write = push_write
+        self.push_replace = push_replace
+        self.push_replace_month = push_replace_month
+        self.push_replace_key = push_replace_key
+        self.interval = interval
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sheet-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.drain()
+            except Exception as e:   # lỗi mạng/quota: giữ outbox, thử lại lần sau
+                self.last_error = e
+
+    def drain(self) -> int:
+        """Đẩy hết outbox (gọi trực tiếp khi kiểm thử). Trả về số thao tác đã đẩy."""
+        pushed = 0
+        with self._lock:
+            while True:
+                batch = self.backend.pending()
+                if not batch:
+                    return pushed
+                pushed += self._push_batch(batch)
+
+    def _push_batch(self, batch: list) -> int:
+        first_id, sheet, op, payload = batch[0]
+        if op == "append":
+            # gộp các append liên tiếp của cùng sheet
+            ids, rows = [], []
+            for i, s, o, p in batch:
+                if s != sheet or o != "append":
+                    break
+                ids.append(i)
+                rows += json.loads(p)["rows"]
+            try:
+                self.push_append(sheet, rows)
+            except PartialSend as e:
+                self.backend.keep_unsent(ids, e.unsent)   # lần sau chỉ đẩy các dòng chưa ghi
+                raise
+            self.backend.done(ids)
+            return len(ids)
+        if op == "write":
+            # ghi đè cả sheet: đẩy bảng hiện tại là đủ cho mọi thao tác chờ của sheet này
+            ids, df = self.backend.take_sheet(sheet)
+            self.push_write(sheet, df)
+            self.backend.done(ids)
+            return len(ids)
+        p = json.loads(payload)
+        if op == "replace_month":
+            self.push_replace_month(sheet, p["months"], pd.DataFrame(p["rows"], columns=p["columns"]))
+            self.backend.done([first_id])
+            return 1
+        if op == "replace_key":
+            self.push_replace_key(sheet, p["key_col"], p["keys"], pd.DataFrame(p["rows"], columns=p["columns"]))
+            self.backend.done([first_id])
+            return 1
+        self.push_replace(sheet, p["date_col"], p["date_str"], pd.DataFrame(p["rows"], columns=p["columns"]),
+                          p.get("date_to"))
+        self.backend.done([first_id])
+        return 1
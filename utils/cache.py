@@ -0,0 +1,106 @@
+# utils/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+class SheetCache:
+    """Cache DataFrame theo sheet, dùng chung cho mọi session.
+
+    Mỗi sheet có một số version tăng sau mỗi lần ghi; bản cache chỉ hợp lệ khi
+    trùng version hiện tại và chưa quá TTL. Quá `max_entries` thì bỏ sheet ít
+    dùng nhất (LRU).
+
+    Khoá có thể là tên sheet hoặc tuple `(tên sheet, ...)` cho dữ liệu suy ra
+    từ sheet đó (vd. một khoảng ngày); mọi khoá cùng sheet chung một version.
+    """
+
+    def __init__(self, ttl: float = 120, max_entries: int = 32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._frames = OrderedDict()   # key -> (version, fetched_at, df)
+        self._versions = {}
+
+    @staticmethod
+    def _sheet(key) -> str:
+        return key[0] if isinstance(key, tuple) else key
+
+    def version(self, name: str) -> int:
+        with self._lock:
+            return self._versions.get(name, 0)
+
+    def get(self, key):
+        with self._lock:
+            item = self._frames.get(key)
+            if item is None:
+                return None
+            ver, fetched_at, df = item
+            if ver != self._versions.get(self._sheet(key), 0) or time.monotonic() - fetched_at > self.ttl:
+                del self._frames[key]
+                return None
+            self._frames.move_to_end(key)
+            return df
+
+    def put(self, key, df: pd.DataFrame, version: int = None):
+        """Lưu kết quả đọc. `version` là version lúc bắt đầu đọc: nếu trong lúc
+        đọc đã có người ghi thì bỏ qua, tránh ghi đè cache bằng dữ liệu cũ."""
+        with self._lock:
+            cur = self._versions.get(self._sheet(key), 0)
+            if version is not None and version != cur:
+                return
+            self._frames[key] = (cur, time.monotonic(), df)
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+
+    def bump(self, name: str, df: pd.DataFrame = None) -> int:
+        """Tăng version sau khi ghi. Có `df` thì đặt luôn làm bản cache mới
+        (write-through), không thì xoá bản cũ."""
+        with self._lock:
+            ver = self._versions.get(name, 0) + 1
+            self._versions[name] = ver
+            if df is None:
+                self._frames.pop(name, None)
+            else:
+                self._frames[name] = (ver, time.monotonic(), df)
+                self._frames.move_to_end(name)
+            return ver
+
+    def append_rows(self, name: str, rows: list, since: float = None) -> int:
+        """Write-through cho append: nối các dòng (list theo thứ tự cột của sheet)
+        vào bản cache hiện có. Không có bản cache hoặc dòng dài hơn header thì
+        chỉ invalidate.
+
+        `since` (time.monotonic() lúc bắt đầu ghi): bản cache đọc về sau thời
+        điểm đó có thể đã chứa các dòng này, nên cũng chỉ invalidate."""
+        with self._lock:
+            df = self.get(name)
+            stale = since is not None and df is not None and self._frames[name][1] > since
+            if df is None or stale or any(len(r) > len(df.columns) for r in rows):
+                return self.bump(name)
+            start = (df.index.max() + 1) if len(df.index) else 0
+            # ô rỗng đọc từ sheet là NaN, giữ giống vậy cho dòng mới
+            rows = [[None if isinstance(v, str) and not v.strip() else v for v in r] for r in rows]
+            add = pd.DataFrame([dict(zip(df.columns, r)) for r in rows],
+                               columns=df.columns,
+                               index=range(start, start + len(rows)))
+            return self.bump(name, pd.concat([df, add]) if not df.empty else add)
+
+    def discard(self, match) -> int:
+        """Bỏ mọi bản cache có khoá thoả `match(key)`. Trả về số bản đã bỏ."""
+        with self._lock:
+            keys = [k for k in self._frames if match(k)]
+            for k in keys:
+                del self._frames[k]
+            return len(keys)
+
+    def invalidate(self, name: str = None):
+        with self._lock:
+            if name is None:
+                for n in set(self._versions) | {self._sheet(k) for k in self._frames}:
+                    self._versions[n] = self._versions.get(n, 0) + 1
+                self._frames.clear()
+            else:
+                self.bump(name)
@@ -0,0 +1,114 @@
+# utils/coldstore.py
+import os
+import threading
+
+import pandas as pd
+
+from .dates import parse_dates, to_day
+from .schema import concat
+
+# Sheet có thể chuyển các tháng đã chốt sang kho lịch sử
+COLD_SHEETS = ("XE_MAY", "OTO", "CONG", "NHAP_HANG")
+PART_FMT = "%Y-%m"   # tên file mỗi tháng: 2025-08.parquet
+
+def month_of(values) -> pd.Series:
+    """Cột ngày -> khoá tháng 'YYYY-mm' (NaN nếu không đọc được ngày)."""
+    return parse_dates(values).dt.strftime(PART_FMT)
+
+class ColdStore:
+    """Kho lịch sử cục bộ dạng Parquet: `root/<SHEET>/<YYYY-mm>.parquet`, mỗi file
+    là toàn bộ dòng (đã áp schema) của một tháng đã chốt.
+
+    Tháng đã có file là tháng "lạnh": dữ liệu của tháng đó chỉ đọc từ đây, không
+    đọc lại từ Google Sheets. File đọc lên được nhớ trong RAM theo mtime.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._memo = {}   # (sheet, tháng) -> (mtime_ns, DataFrame)
+
+    def _dir(self, ws_name: str) -> str:
+        return os.path.join(self.root, ws_name)
+
+    def _path(self, ws_name: str, month: str) -> str:
+        return os.path.join(self._dir(ws_name), month + ".parquet")
+
+    def _files(self, ws_name: str) -> dict:
+        """{tháng: mtime_ns} của các file hiện có."""
+        try:
+            entries = list(os.scandir(self._dir(ws_name)))
+        except FileNotFoundError:
+            return {}
+        return {e.name[:-len(".parquet")]: e.stat().st_mtime_ns for e in entries if e.name.endswith(".parquet")}
+
+    def months(self, ws_name: str) -> list:
+        """Các tháng đã chốt ('YYYY-mm'), tăng dần."""
+        return sorted(self._files(ws_name))
+
+    def stamp(self, ws_name: str) -> tuple:
+        """Đổi khi có tháng được thêm/ghi lại; dùng làm khoá cache."""
+        return tuple(sorted(self._files(ws_name).items()))
+
+    def partition(self, ws_name: str, month: str) -> pd.DataFrame:
+        """Dòng của một tháng lạnh (None nếu chưa chốt). KHÔNG sửa trực tiếp."""
+        mtime = self._files(ws_name).get(month)
+        if mtime is None:
+            return None
+        with self._lock:
+            hit = self._memo.get((ws_name, month))
+            if hit is not None and hit[0] == mtime:
+                return hit[1]
+        df = pd.read_parquet(self._path(ws_name, month))
+        with self._lock:
+            self._memo[(ws_name, month)] = (mtime, df)
+        return df
+
+    def read(self, ws_name: str, date_from=None, date_to=None) -> pd.DataFrame:
+        """Các dòng lạnh có "Ngày" trong [date_from, date_to] (None = không giới hạn)."""
+        # chuỗi dd-mm-yyyy đọc qua to_day như _hot_range (pd.Timestamp đọc "05-10-2026" thành 10/05)
+        lo = None if date_from is None else pd.Timestamp(to_day(date_from))
+        hi = None if date_to is None else pd.Timestamp(to_day(date_to))
+        first = None if lo is None else lo.strftime(PART_FMT)
+        last = None if hi is None else hi.strftime(PART_FMT)
+        parts = [self.partition(ws_name, m) for m in self.months(ws_name)
+                 if (first is None or m >= first) and (last is None or m <= last)]
+        df = concat(ws_name, parts)
+        if (date_from is None and date_to is None) or df.empty:
+            return df
+        days = parse_dates(df["Ngày"]).dt.normalize()
+        mask = days.notna()
+        if lo is not None:
+            mask &= days >= lo
+        if hi is not None:
+            mask &= days <= hi
+        return df[mask].reset_index(drop=True)
+
+    def put(self, ws_name: str, month: str, df: pd.DataFrame):
+        """Ghi (đè) file của tháng, nguyên tử (file tạm rồi đổi tên).
+        Trả về hàm `undo()` đưa file về như trước khi ghi."""
+        os.makedirs(self._dir(ws_name), exist_ok=True)
+        path = self._path(ws_name, month)
+        # cột chữ lẫn số (cột ngoài schema) -> chuỗi, Parquet cần một kiểu mỗi cột;
+        # dtype "string" giữ ô trống là ô trống (astype(str) biến NaN thành "nan")
+        obj = [c for c in df.columns if df[c].dtype == object]
+        df = df.astype({c: "string" for c in obj}) if obj else df
+        df.reset_index(drop=True).to_parquet(path + ".tmp", index=False)
+        backup = path + ".bak"
+        had_old = os.path.exists(path)
+        if had_old:
+            os.replace(path, backup)
+        os.replace(path + ".tmp", path)
+
+        def undo():
+            if had_old:
+                os.replace(backup, path)
+            elif os.path.exists(path):
+                os.remove(path)
+        return undo
+
+    def commit(self, ws_name: str, month: str):
+        """Bỏ bản sao lưu của lần `put` trước (sau khi đã xoá xong dòng trên sheet)."""
+        backup = self._path(ws_name, month) + ".bak"
+        if os.path.exists(backup):
+            os.remove(backup)
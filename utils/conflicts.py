@@ -0,0 +1,150 @@
+# utils/conflicts.py
+import hashlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from .dates import DATE_FMT_SAVE
+
+# Số lần tự đọc lại & lưu lại khi block vừa bị người khác ghi
+MAX_RETRIES = 3
+
+class WriteConflict(Exception):
+    """Block (ngày/tháng) trên sheet đã đổi so với lúc đọc: không ghi gì cả."""
+
+    def __init__(self, ws_name: str, block: str = ""):
+        super().__init__(f"{ws_name} {block}: dữ liệu vừa được người khác lưu.".replace("  ", " "))
+        self.ws_name = ws_name
+        self.block = block
+
+def _norm(v) -> str:
+    """Giá trị ô -> chuỗi để so sánh: ô trống = "", 5.0 = 5, ngày = dd-mm-yyyy."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return ""
+    if isinstance(v, pd.Timestamp):
+        return v.strftime(DATE_FMT_SAVE)
+    if isinstance(v, (bool, np.bool_)):
+        return str(bool(v))
+    if isinstance(v, (int, float, np.integer, np.floating)):
+        return str(int(v)) if float(v).is_integer() else repr(float(v))
+    return str(v).strip()
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """Dấu vân tay của một block dòng: không phụ thuộc thứ tự dòng, index, kiểu cột."""
+    if df is None or df.empty:
+        return "empty"
+    cols = sorted(str(c) for c in df.columns)
+    rows = sorted("\x1f".join(_norm(v) for v in r)
+                  for r in df.reindex(columns=cols).astype(object).itertuples(index=False, name=None))
+    return hashlib.sha1("\x1e".join(["\x1f".join(cols)] + rows).encode("utf-8")).hexdigest()
+
+class EditGuard:
+    """Lưu một block qua data_editor với kiểm tra xung đột lạc quan, không khoá.
+
+    - `base`: bảng lúc người dùng bắt đầu sửa (giữ trong session_state khi còn ô
+      đang sửa; chưa sửa gì thì luôn là bảng mới nhất).
+    - Xung đột thật: ô người dùng sửa mà người khác cũng đã đổi sang giá trị khác
+      kể từ `base` -> hiện bảng xung đột, chọn ghi đè hoặc bỏ phần mình sửa.
+    - `expected`: dấu vân tay block đọc trong lần chạy này; lúc ghi block trên
+      sheet đã khác thì hàm ghi raise WriteConflict -> tự chạy lại trang (đọc
+      block mới, áp lại các ô đã sửa) rồi lưu lại, tối đa MAX_RETRIES lần.
+    """
+
+    def __init__(self, key: str, ident, frame: pd.DataFrame, block: pd.DataFrame, key_col: str = None):
+        self.key = key            # key của data_editor
+        self.frame = frame        # bảng đưa vào data_editor ở lần chạy này
+        self.key_col = key_col    # cột định danh dòng (vd. "Mặt hàng")
+        self.expected = fingerprint(block)
+        ss = st.session_state
+        state = ss.get(key) or {}
+        dirty = any(state.get(k) for k in ("edited_rows", "added_rows", "deleted_rows"))
+        held = ss.get(self._k("base"))
+        if not dirty or held is None or held[0] != ident:
+            ss[self._k("base")] = (ident, frame)
+        self.base = ss[self._k("base")][1]
+
+    def _k(self, name: str) -> str:
+        return f"{self.key}__{name}"
+
+    def conflicts(self) -> pd.DataFrame:
+        """Các ô vừa bị cả mình và người khác sửa (khác nhau) kể từ lúc bắt đầu sửa."""
+        state = st.session_state.get(self.key) or {}
+        base, cur = self.base.reset_index(drop=True), self.frame.reset_index(drop=True)
+        out = []
+
+        def who(i):
+            return _norm(cur[self.key_col].iloc[i]) if self.key_col in cur.columns else str(i + 1)
+
+        def moved(i):
+            return i >= len(base) or i >= len(cur) or (
+                self.key_col in cur.columns and _norm(base[self.key_col].iloc[i]) != _norm(cur[self.key_col].iloc[i]))
+
+        for i, cells in (state.get("edited_rows") or {}).items():
+            i = int(i)
+            if moved(i):
+                out.append({"Dòng": str(i + 1), "Cột": "(cả dòng)", "Lúc mở": "", "Hiện tại": "", "Bạn sửa": ""})
+                continue
+            for c, mine in cells.items():
+                col = next((x for x in cur.columns if str(x) == str(c)), None)
+                if col is None:
+                    continue
+                b, t = _norm(base[col].iloc[i]), _norm(cur[col].iloc[i])
+                if b != t and _norm(mine) != t:
+                    out.append({"Dòng": who(i), "Cột": str(col), "Lúc mở": b, "Hiện tại": t, "Bạn sửa": _norm(mine)})
+        for i in state.get("deleted_rows") or []:
+            if moved(i) or fingerprint(base.iloc[[i]]) != fingerprint(cur.iloc[[i]]):
+                out.append({"Dòng": who(i) if i < len(cur) else str(i + 1), "Cột": "(xoá dòng)",
+                            "Lúc mở": "", "Hiện tại": "", "Bạn sửa": ""})
+        return pd.DataFrame(out, columns=["Dòng", "Cột", "Lúc mở", "Hiện tại", "Bạn sửa"])
+
+    def panel(self):
+        """Hiện xung đột của lần lưu trước (gọi trước nút lưu)."""
+        ss = st.session_state
+        clash = ss.get(self._k("clash"))
+        if clash is None:
+            return
+        st.error("Các ô dưới đây vừa được người khác lưu giá trị khác với bạn. "
+                 "Chọn giữ bản của bạn (ghi đè) hoặc bỏ các ô bạn đã sửa.")
+        st.dataframe(clash, use_container_width=True, hide_index=True)
+        c1, c2 = st.columns(2)
+        if c1.button("Giữ bản của tôi (ghi đè)", key=self._k("force_btn")):
+            ss.pop(self._k("clash"), None)
+            ss[self._k("force")] = True
+            st.rerun()
+        if c2.button("Bỏ các ô tôi sửa", key=self._k("drop_btn")):
+            for name in ("clash", "base", "retries"):
+                ss.pop(self._k(name), None)
+            ss.pop(self.key, None)
+            st.rerun()
+
+    def pending(self) -> bool:
+        """Lần chạy này phải tự lưu (tự thử lại sau WriteConflict, hoặc vừa chọn ghi đè)."""
+        ss = st.session_state
+        return bool(ss.pop(self._k("retry"), False)) or bool(ss.get(self._k("force")))
+
+    def save(self, write) -> bool:
+        """`write(expected)` ghi block (raise WriteConflict nếu block đã đổi). Trả về True nếu đã lưu."""
+        ss = st.session_state
+        force = ss.pop(self._k("force"), False)
+        clash = pd.DataFrame() if force else self.conflicts()
+        if not clash.empty:
+            ss[self._k("clash")] = clash
+            ss.pop(self._k("retries"), None)
+            st.rerun()
+        try:
+            write(self.expected)
+        except WriteConflict as e:
+            n = ss.get(self._k("retries"), 0) + 1
+            if n > MAX_RETRIES:
+                ss.pop(self._k("retries"), None)
+                st.error(f"{e} Đã thử lại {MAX_RETRIES} lần vẫn bị ghi chồng, hãy lưu lại sau.")
+                return False
+            ss[self._k("retries")] = n
+            ss[self._k("retry")] = True
+            if force:
+                ss[self._k("force")] = True
+            st.rerun()
+        for name in ("base", "retries", "clash"):
+            ss.pop(self._k(name), None)
+        return True
@@ -0,0 +1,146 @@
+# utils/cube.py
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .dailyagg import MEASURES, order_facts
+from .dates import DATE_FMT_SAVE, to_day
+from .schema import text_col
+
+# Chiều của cube (ngoài thời gian) và các mức thời gian
+DIMS = ["Nguồn", "Loại sản phẩm", "PP Thanh toán", "Người chở", "Khách hàng"]
+GRAINS = {"Ngày": "D", "Tuần": "W", "Tháng": "M"}
+# Số kết quả truy vấn nhớ lại trên mỗi cube (đổi bộ lọc qua lại không phải tính lại)
+MAX_SLICES = 256
+
+def _period_start(days: np.ndarray, grain: str) -> np.ndarray:
+    """Ngày đầu kỳ (datetime64[D]) của từng ngày: chính nó / thứ Hai của tuần / mùng 1 của tháng."""
+    if grain == "D":
+        return days
+    if grain == "W":
+        # 1970-01-01 là thứ Năm -> lùi (số ngày + 3) % 7 ngày về thứ Hai
+        n = days.astype("int64")
+        return (n - (n + 3) % 7).astype("datetime64[D]")
+    return days.astype("datetime64[M]").astype("datetime64[D]")
+
+def _period_label(start: pd.Series, grain: str) -> pd.Series:
+    if grain == "M":
+        return start.dt.strftime("%m/%Y")
+    return start.dt.strftime(DATE_FMT_SAVE)
+
+def cube_facts(frames: dict) -> pd.DataFrame:
+    """{"XE_MAY": df, "OTO": df} (đã đọc bằng read_df) -> bảng dựng cube: các đơn gộp theo
+    (ngày, các chiều). Các bảng của từng phần dữ liệu (tháng đã chốt, phân vùng...) nối
+    lại rồi đưa vào RevenueCube vẫn ra đúng cube của cả dữ liệu."""
+    parts = [order_facts("XE_MAY", None)]
+    for source, df in frames.items():
+        m = order_facts(source, df)
+        m["Khách hàng"] = text_col(df.loc[m.index], "Khách hàng") if len(m) else ""
+        parts.append(m)
+    facts = pd.concat(parts, ignore_index=True)
+    facts["Khách hàng"] = facts["Khách hàng"].fillna("")
+    return facts.groupby(["Ngày"] + DIMS, as_index=False, sort=False)[MEASURES].sum()
+
+class RevenueCube:
+    """Cube doanh thu dựng một lần từ XE_MAY + OTO (mỗi version dữ liệu một lần),
+    từ bảng cube_facts (hoặc nhiều bảng cube_facts nối lại).
+
+    Lúc dựng: gộp các đơn theo (ngày, các chiều), mã hoá mỗi chiều thành số
+    nguyên và tính sẵn ngày đầu tuần/tháng của từng dòng. Truy vấn (khoảng
+    ngày + bộ lọc + chia theo) chỉ là mask & cộng dồn numpy trên bảng đã gộp;
+    kết quả mỗi truy vấn được nhớ lại. Dùng chung giữa các session: không sửa
+    thuộc tính của cube, không sửa DataFrame trả về.
+    """
+
+    def __init__(self, facts: pd.DataFrame):
+        codes, self.labels = {}, {}
+        for d in DIMS:
+            c, uniq = pd.factorize(facts[d], sort=True)
+            codes[d], self.labels[d] = c.astype("int64"), pd.Index(uniq, dtype=object)
+        # gộp các đơn trùng (ngày, chiều) -> bảng gốc của cube
+        days = facts["Ngày"].to_numpy().astype("datetime64[D]")
+        key = pd.DataFrame({"_d": days.astype("int64"), **codes})
+        grp = key.groupby(list(key.columns), sort=True)
+        gid = grp.ngroup().to_numpy()
+        base = grp.size().reset_index()
+        vals = np.zeros((len(base), len(MEASURES)))
+        np.add.at(vals, gid, facts[MEASURES].to_numpy(dtype=float))
+        self.days = base["_d"].to_numpy().astype("datetime64[D]")
+        self.codes = {d: base[d].to_numpy() for d in DIMS}
+        self.values = vals
+        self.starts = {g: _period_start(self.days, g) for g in GRAINS.values()}
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, frames: dict) -> "RevenueCube":
+        """{"XE_MAY": df, "OTO": df} (đã đọc bằng read_df) -> cube."""
+        return cls(cube_facts(frames))
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def members(self, dim: str) -> list:
+        """Các giá trị của một chiều (để làm danh sách chọn), bỏ giá trị trống."""
+        return [v for v in self.labels[dim] if v != ""]
+
+    def _mask(self, date_from, date_to, filters: dict) -> np.ndarray:
+        mask = np.ones(len(self.days), dtype=bool)
+        if date_from is not None:
+            mask &= self.days >= np.datetime64(to_day(date_from), "D")
+        if date_to is not None:
+            mask &= self.days <= np.datetime64(to_day(date_to), "D")
+        for d, vals in (filters or {}).items():
+            if vals:
+                wanted = self.labels[d].get_indexer([str(v).strip() for v in vals])
+                mask &= np.isin(self.codes[d], wanted[wanted >= 0])
+        return mask
+
+    def query(self, grain: str = "Ngày", by=(), date_from=None, date_to=None, filters: dict = None) -> pd.DataFrame:
+        """Tổng các chỉ số theo kỳ (`grain`: Ngày/Tuần/Tháng, None = cả khoảng) và
+        các chiều `by`, sau khi lọc khoảng ngày & `filters` ({chiều: list giá trị}).
+        Cột "Mốc" là nhãn kỳ (dd-mm-yyyy của ngày/đầu tuần, mm/YYYY của tháng)."""
+        by = [d for d in by if d in DIMS]
+        flt = tuple(sorted((d, tuple(sorted(map(str, v)))) for d, v in (filters or {}).items() if v))
+        key = (grain, tuple(by), str(to_day(date_from)) if date_from is not None else None,
+               str(to_day(date_to)) if date_to is not None else None, flt)
+        with self._lock:
+            out = self._memo.get(key)
+            if out is not None:
+                self._memo.move_to_end(key)
+                return out
+        out = self._query(grain, by, date_from, date_to, dict(flt))
+        with self._lock:
+            self._memo[key] = out
+            while len(self._memo) > MAX_SLICES:
+                self._memo.popitem(last=False)
+        return out
+
+    def _query(self, grain, by, date_from, date_to, filters) -> pd.DataFrame:
+        mask = self._mask(date_from, date_to, filters)
+        cols = {}
+        if grain is not None:
+            cols["_t"] = self.starts[GRAINS[grain]][mask].astype("int64")
+        for d in by:
+            cols[d] = self.codes[d][mask]
+        vals = self.values[mask]
+        if not cols:
+            out = pd.DataFrame([vals.sum(axis=0)], columns=MEASURES)
+        else:
+            keys = pd.DataFrame(cols)
+            grp = keys.groupby(list(keys.columns), sort=True)
+            sums = np.zeros((grp.ngroups, len(MEASURES)))
+            np.add.at(sums, grp.ngroup().to_numpy(), vals)
+            out = grp.size().reset_index().drop(columns=0)
+            for d in by:
+                out[d] = self.labels[d][out[d].to_numpy()]
+            if grain is not None:
+                start = pd.Series(out.pop("_t").to_numpy().astype("datetime64[D]").astype("datetime64[ns]"))
+                out.insert(0, "Mốc", _period_label(start, GRAINS[grain]))
+            out = pd.concat([out, pd.DataFrame(sums, columns=MEASURES)], axis=1)
+        for c in MEASURES:
+            if len(out) and (out[c] % 1 == 0).all():
+                out[c] = out[c].astype("int64")
+        return out
@@ -0,0 +1,87 @@
+# utils/dailyagg.py
+import pandas as pd
+
+from .dates import parse_dates, DATE_FMT_SAVE
+from .schema import num_col, text_col
+
+AGG_SHEET = "DAILY_AGG"
+ORDER_SHEETS = ("XE_MAY", "OTO")
+KEY_COLS = ["Ngày", "Nguồn", "Loại sản phẩm", "PP Thanh toán", "Người chở"]
+MEASURES = ["Số đơn", "SL_Giao", "Vo_di", "Vo_ve", "Thanh Toán"]
+AGG_COLS = KEY_COLS + MEASURES
+
+# cột số lượng & người chở của từng sheet đơn (OTO: tính cho người chở 1)
+_QTY = {"XE_MAY": "Số lượng giao", "OTO": "Số lượng"}
+_SHIPPER = {"XE_MAY": "Người chở", "OTO": "Người chở 1"}
+
+def _fmt_days(days: pd.Series) -> pd.Series:
+    """datetime -> 'dd-mm-yyyy', mỗi ngày khác nhau chỉ format một lần."""
+    codes, uniq = pd.factorize(days)
+    labels = pd.DatetimeIndex(uniq).strftime(DATE_FMT_SAVE).to_numpy(dtype=object)
+    return pd.Series(labels[codes], index=days.index, dtype=object)
+
+def order_facts(source: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Như order_measures nhưng cột "Ngày" là datetime64 (không format lại thành chuỗi)."""
+    if df is None or df.empty or "Ngày" not in df.columns:
+        return pd.DataFrame({"Ngày": pd.Series(dtype="datetime64[ns]"),
+                             **{c: pd.Series(dtype=object) for c in KEY_COLS[1:]},
+                             **{c: pd.Series(dtype=float) for c in MEASURES}})
+    days = parse_dates(df["Ngày"])
+    ok = days.notna()
+    df, days = df[ok], days[ok]
+    qty = num_col(df, _QTY[source])
+    return pd.DataFrame({
+        "Ngày": days,
+        "Nguồn": source,
+        "Loại sản phẩm": text_col(df, "Loại sản phẩm"),
+        "PP Thanh toán": text_col(df, "PP Thanh toán"),
+        "Người chở": text_col(df, _SHIPPER[source]),
+        "Số đơn": 1,
+        "SL_Giao": qty,
+        "Vo_di": qty if source == "XE_MAY" else 0.0,
+        "Vo_ve": num_col(df, "Vỏ về") if source == "XE_MAY" else 0.0,
+        "Thanh Toán": num_col(df, "Thanh Toán"),
+    }, index=df.index)
+
+def order_measures(source: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Mỗi đơn (dòng của XE_MAY/OTO) -> khoá DAILY_AGG + các chỉ số.
+
+    Quy ước như trang thống kê: XE_MAY vỏ đi = số lượng giao, vỏ về lấy số
+    (chữ 'x' -> 0); OTO không tính vỏ. Dòng không đọc được ngày bị bỏ.
+    """
+    if df is None or df.empty or "Ngày" not in df.columns:
+        return pd.DataFrame(columns=AGG_COLS)
+    out = order_facts(source, df)
+    out["Ngày"] = _fmt_days(out["Ngày"])
+    return out
+
+def aggregate(frames) -> pd.DataFrame:
+    """Gộp các bảng chỉ số (order_measures hoặc DAILY_AGG) theo khoá."""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=AGG_COLS)
+    df = pd.concat([f[AGG_COLS] for f in frames], ignore_index=True)
+    days = parse_dates(df["Ngày"])
+    df = df[days.notna()].copy()
+    # ngày đọc từ sheet có thể khác định dạng (Sheets tự đổi) -> chuẩn hoá trước khi gộp
+    df["Ngày"] = days[days.notna()].dt.strftime(DATE_FMT_SAVE)
+    for c in KEY_COLS[1:]:
+        df[c] = text_col(df, c)
+    for c in MEASURES:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
+    out = df.groupby(KEY_COLS, as_index=False, sort=False)[MEASURES].sum()
+    for c in MEASURES:
+        if (out[c] % 1 == 0).all():
+            out[c] = out[c].astype("int64")
+    return _sorted(out)
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return df
+    return (df.assign(_d=parse_dates(df["Ngày"])).sort_values(["_d"] + KEY_COLS[1:], kind="stable")
+              .drop(columns="_d").reset_index(drop=True))
+
+def rows_to_frame(header: list, rows: list) -> pd.DataFrame:
+    """Các dòng append (list theo thứ tự cột) -> DataFrame với tên cột của sheet."""
+    rows = [list(r[:len(header)]) + [None] * (len(header) - len(r)) for r in rows]
+    return pd.DataFrame(rows, columns=header)
@@ -0,0 +1,94 @@
+# utils/dateindex.py
+import threading
+import time
+
+import numpy as np
+
+from .dates import parse_days, to_day
+
+class ColumnIndex:
+    """Chỉ mục giá trị -> dòng trên sheet của một cột, dựng từ riêng cột đó.
+
+    `column` là toàn bộ cột như Sheets trả về (phần tử 0 là header,
+    phần tử i là dòng i+1). `version` là version cache của sheet lúc dựng;
+    sau mỗi lần app tự append / ghi đè block, chỉ mục được cập nhật tại chỗ
+    (add, apply_block) thay vì đọc lại cột.
+    """
+
+    def __init__(self, header: list, column: list, version: int = 0):
+        self.header = header
+        self.version = version
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        raw = list(column[1:])
+        self._rows = np.arange(2, len(raw) + 2)
+        self._data = self._derive(raw)
+        self._sorted = None
+
+    def _derive(self, values) -> dict:
+        """Các mảng song song với `_rows` cho các giá trị mới (lớp con thêm mảng suy ra)."""
+        out = np.empty(len(values), dtype=object)
+        out[:] = list(values)
+        return {"values": out}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, row: int, value):
+        """Ghi nhận một dòng vừa append."""
+        with self._lock:
+            self._rows = np.append(self._rows, row)
+            for k, v in self._derive([value]).items():
+                self._data[k] = np.append(self._data[k], v)
+            self._sorted = None
+
+    def rows_where(self, match) -> list:
+        """Các dòng (tăng dần) có `match(giá trị)` đúng (match nhận cả mảng giá trị)."""
+        with self._lock:
+            return self._rows[np.asarray(match(self._data["values"]), dtype=bool)].tolist()
+
+    def apply_block(self, targets: list, n_updates: int, values: list, appended_at: int = None):
+        """Ghi nhận một lần ghi đè block: `targets` (tăng dần) là các dòng cũ của block;
+        `n_updates` dòng đầu được ghi giá trị values[:n_updates], các dòng còn lại bị xoá
+        (dòng bên dưới dồn lên), values[n_updates:] được append từ dòng `appended_at`."""
+        t = np.asarray(targets, dtype=np.int64)
+        extra = list(values[n_updates:])
+        with self._lock:
+            if n_updates:
+                at = np.searchsorted(self._rows, t[:n_updates])
+                for k, v in self._derive(values[:n_updates]).items():
+                    self._data[k][at] = v
+            gone = np.sort(t[n_updates:])
+            if len(gone):
+                keep = ~np.isin(self._rows, gone)
+                self._rows = self._rows[keep] - np.searchsorted(gone, self._rows[keep])
+                self._data = {k: v[keep] for k, v in self._data.items()}
+            if extra:
+                self._rows = np.append(self._rows, np.arange(appended_at, appended_at + len(extra)))
+                for k, v in self._derive(extra).items():
+                    self._data[k] = np.append(self._data[k], v)
+            self._sorted = None
+
+class DateIndex(ColumnIndex):
+    """Chỉ mục cột ngày: thêm tra theo khoảng ngày (rows_between)."""
+
+    def _derive(self, values) -> dict:
+        out = super()._derive(values)
+        out["days"] = parse_days(list(values)) if len(values) else np.array([], dtype="datetime64[D]")
+        return out
+
+    def _ensure_sorted(self):
+        if self._sorted is None:
+            days = self._data["days"]
+            ok = ~np.isnat(days)
+            order = np.argsort(days[ok], kind="stable")
+            self._sorted = (days[ok][order], self._rows[ok][order])
+        return self._sorted
+
+    def rows_between(self, date_from=None, date_to=None) -> list:
+        """Các dòng (tăng dần) có ngày trong [date_from, date_to]; None = không giới hạn."""
+        with self._lock:
+            days, rows = self._ensure_sorted()
+        lo = 0 if date_from is None else np.searchsorted(days, to_day(date_from), side="left")
+        hi = len(days) if date_to is None else np.searchsorted(days, to_day(date_to), side="right")
+        return sorted(rows[lo:hi].tolist())
@@ -0,0 +1,92 @@
+# utils/dates.py
+import threading
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+DATE_FMT_SAVE = "%d-%m-%Y"  # dd-mm-yyyy
+# Thử lần lượt trên cả cột; chỉ các dòng chưa đọc được mới sang định dạng sau
+DATE_FORMATS = ["%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S"]
+
+# chuỗi đã chuẩn hoá -> Timestamp/NaT, dùng chung giữa các lần rerun
+_MEMO = {}
+_MEMO_MAX = 200_000
+_MEMO_LOCK = threading.Lock()
+
+def _parse_unique(keys: np.ndarray) -> pd.Series:
+    """Parse mảng chuỗi KHÔNG trùng: từng định dạng trên cả mảng, cuối cùng mới đoán (dayfirst)."""
+    keys = pd.Series(keys, dtype=object)
+    out = pd.Series(pd.NaT, index=keys.index, dtype="datetime64[ns]")
+    for fmt in DATE_FORMATS:
+        todo = out.isna()
+        if not todo.any():
+            break
+        out[todo] = pd.to_datetime(keys[todo], format=fmt, errors="coerce")
+    todo = out.isna() & ~keys.isin(["", "nan", "NaT", "None", "<NA>"])
+    if todo.any():
+        out[todo] = pd.to_datetime(keys[todo], format="mixed", dayfirst=True, errors="coerce")
+    return out
+
+def parse_dates(values) -> pd.Series:
+    """Chuẩn hoá cả cột ngày -> Series datetime64 (NaT nếu không đọc được), giữ nguyên index.
+
+    Mỗi giá trị khác nhau chỉ parse một lần và được nhớ lại cho các lần gọi sau.
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    keys = s.astype(str).str.strip()
+    uniq = pd.unique(keys.to_numpy())
+    with _MEMO_LOCK:
+        known = {k: _MEMO[k] for k in uniq if k in _MEMO}
+    new = [k for k in uniq if k not in known]
+    if new:
+        parsed = dict(zip(new, _parse_unique(np.asarray(new, dtype=object))))
+        with _MEMO_LOCK:
+            if len(_MEMO) + len(parsed) > _MEMO_MAX:
+                _MEMO.clear()
+            _MEMO.update(parsed)
+        known.update(parsed)
+    lookup = pd.Series([known[k] for k in uniq], index=uniq, dtype="datetime64[ns]")
+    out = lookup.reindex(keys.to_numpy())
+    out.index = s.index
+    return out
+
+def parse_date(value):
+    """Một giá trị bất kỳ (chuỗi, date, datetime) -> Timestamp hoặc NaT."""
+    if isinstance(value, (datetime, date)):
+        return pd.to_datetime(value)
+    return parse_dates([value]).iloc[0]
+
+def parse_days(values) -> np.ndarray:
+    """Như parse_dates nhưng trả về mảng datetime64[D] (bỏ phần giờ)."""
+    return parse_dates(values).to_numpy().astype("datetime64[D]")
+
+def to_day(d) -> np.datetime64:
+    return np.datetime64(parse_date(d).date(), "D")
+
+def fmt_date(d):
+    if d is None or (not isinstance(d, str) and pd.isna(d)): return ""
+    if isinstance(d, (pd.Timestamp, datetime, date)):
+        return pd.to_datetime(d).strftime(DATE_FMT_SAVE)
+    return str(d)
+
+def in_days(values, date_str, date_to=None) -> np.ndarray:
+    """Mask các giá trị ngày bằng `date_str` (hoặc nằm trong [date_str, date_to])."""
+    days = parse_days(values)
+    if date_to is None:
+        return days == to_day(date_str)
+    return (days >= to_day(date_str)) & (days <= to_day(date_to))
+
+def filter_dates(df: pd.DataFrame, date_from, date_to, col: str = "Ngày") -> pd.DataFrame:
+    """Các dòng có cột `col` trong [date_from, date_to] (None = không giới hạn); bỏ dòng không đọc được ngày."""
+    if col not in df.columns:
+        return df
+    days = parse_days(df[col])
+    mask = ~np.isnat(days)
+    if date_from is not None:
+        mask &= days >= to_day(date_from)
+    if date_to is not None:
+        mask &= days <= to_day(date_to)
+    return df[mask]
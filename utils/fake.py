@@ -0,0 +1,280 @@
+# utils/fake.py
+import re
+import threading
+import time
+
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+from .metrics import get_metrics
+
+_NUMBER = re.compile(r"^-?\d+(\.\d+)?$")
+
+def _stored(v):
+    """Giá trị ô lưu lại khi ghi: giữ đúng thứ người dùng gõ (None -> rỗng)."""
+    return "" if v is None else v
+
+def _unformatted(v):
+    """UNFORMATTED_VALUE: chuỗi số thành số, còn lại giữ nguyên."""
+    if isinstance(v, str) and _NUMBER.match(v.strip()):
+        f = float(v)
+        return int(f) if f.is_integer() and "." not in v else f
+    return v
+
+def _formatted(v):
+    """FORMATTED_VALUE (mặc định của API): ô hiển thị thế nào trả về chuỗi đó."""
+    if isinstance(v, str):
+        return v
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+def _render(row: list, option: str) -> list:
+    if option == "UNFORMATTED_VALUE":
+        return [_unformatted(v) for v in row]
+    return [v if type(v) is str else _formatted(v) for v in row]
+
+def _split_range(rng: str):
+    """"'XE_MAY'!A2:L9" -> ("XE_MAY", "A2:L9"); "'XE_MAY'" -> ("XE_MAY", None)."""
+    m = re.match(r"^'((?:[^']|'')*)'(?:!(.*))?$", rng)
+    if m:
+        return m.group(1).replace("''", "'"), m.group(2)
+    if "!" in rng:
+        title, a1 = rng.split("!", 1)
+        return title, a1
+    return rng, None
+
+def a1_col(col: int) -> str:
+    s = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        s = chr(65 + rem) + s
+    return s
+
+class FakeWorksheet:
+    """Worksheet trong bộ nhớ, đủ các hàm gspread mà utils.gs dùng."""
+
+    def __init__(self, spreadsheet, title: str, rows: int = 1000, cols: int = 30, sheet_id: int = 0):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.row_count = rows
+        self.col_count = cols
+        self._rows = []
+
+    # ---- đọc ----
+    def get_all_values(self, value_render_option: str = None, **kwargs):
+        width = max((len(r) for r in self._rows), default=0)
+        return [_render(list(r), value_render_option) + [""] * (width - len(r)) for r in self._rows]
+
+    def _get(self, a1: str = None, option: str = None):
+        """Giá trị của một vùng A1 giống Sheets API: bỏ ô rỗng cuối dòng và dòng rỗng cuối vùng.
+        `option`: valueRenderOption (mặc định FORMATTED_VALUE, mọi ô là chuỗi)."""
+        if a1:
+            grid = a1_range_to_grid_range(a1)
+            r0, r1 = grid.get("startRowIndex", 0), grid.get("endRowIndex")
+            c0, c1 = grid.get("startColumnIndex", 0), grid.get("endColumnIndex")
+        else:
+            r0, r1, c0, c1 = 0, None, 0, None
+        out = []
+        for r in self._rows[r0:r1]:
+            row = _render(list(r[c0:c1]), option)
+            while row and row[-1] == "":
+                row.pop()
+            out.append(row)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def row_values(self, row: int, **kwargs):
+        self.spreadsheet._call("values_get", self.title)
+        vals = self._get(f"{row}:{row}")
+        return vals[0] if vals else []
+
+    def col_values(self, col: int, **kwargs):
+        self.spreadsheet._call("values_get", self.title)
+        return [(_formatted(r[col - 1]) if len(r) >= col else "") for r in self._trimmed()]
+
+    def _trimmed(self):
+        rows = list(self._rows)
+        while rows and not any(v != "" for v in rows[-1]):
+            rows.pop()
+        return rows
+
+    # ---- ghi ----
+    def _set(self, r: int, c: int, v):
+        while len(self._rows) < r:
+            self._rows.append([])
+        row = self._rows[r - 1]
+        while len(row) < c:
+            row.append("")
+        row[c - 1] = v
+        self.row_count = max(self.row_count, r)
+        self.col_count = max(self.col_count, c)
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        self.spreadsheet._call("values_append", self.title, rows=len(values))
+        with self.spreadsheet._lock:
+            self._rows = self._trimmed()
+            start = len(self._rows) + 1
+            for row in values:
+                self._rows.append([_stored(v) for v in row])
+            end = len(self._rows)
+            self.row_count = max(self.row_count, end)
+        width = max((len(r) for r in values), default=1)
+        last = a1_col(width)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{last}{end}",
+                            "updatedRows": len(values)}}
+
+    def append_row(self, values, value_input_option=None, **kwargs):
+        return self.append_rows([values], value_input_option=value_input_option)
+
+    def clear(self):
+        self.spreadsheet._call("values_clear", self.title)
+        with self.spreadsheet._lock:
+            self._rows = []
+
+    def resize(self, rows=None, cols=None):
+        if rows is not None:
+            self.row_count = rows
+            self._rows = self._rows[:rows]
+        if cols is not None:
+            self.col_count = cols
+
+    def update_cells(self, cell_list, value_input_option=None):
+        self.spreadsheet._call("values_batch_update", self.title, rows=len({c.row for c in cell_list}))
+        with self.spreadsheet._lock:
+            for c in cell_list:
+                self._set(c.row, c.col, _stored(c.value))
+
+    def batch_update(self, data, raw=True, value_input_option=None, **kwargs):
+        self.spreadsheet._call("values_batch_update", self.title,
+                               rows=sum(len(d["values"]) for d in data))
+        with self.spreadsheet._lock:
+            for d in data:
+                _, a1 = _split_range(d["range"])
+                grid = a1_range_to_grid_range(a1 or d["range"])
+                r0, c0 = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+                for i, row in enumerate(d["values"]):
+                    for j, v in enumerate(row):
+                        self._set(r0 + i + 1, c0 + j + 1, _stored(v))
+
+    def update(self, values, range_name="A1", **kwargs):
+        return self.batch_update([{"range": range_name, "values": values}])
+
+    def _delete_rows(self, start: int, end: int):
+        """Xoá dòng [start, end) theo chỉ số 0 (giống deleteDimension)."""
+        del self._rows[start:end]
+        self.row_count = max(self.row_count - (end - start), 1)
+
+class FakeSpreadsheet:
+    """Spreadsheet trong bộ nhớ thay cho gspread.Spreadsheet khi chạy offline/kiểm thử
+    (bench/run.py và tests/ gán thay cho get_spreadsheet; app thật không dùng tới).
+
+    `calls` ghi lại mọi request "mạng" (tên thao tác, sheet, số dòng) để đếm
+    số lần gọi API. `latency` (giây/request) và `per_row` (giây/dòng) giả lập
+    độ trễ mạng của Google Sheets.
+
+    Ô lưu đúng giá trị đã ghi; đọc mặc định (FORMATTED_VALUE) trả về chuỗi như
+    ô hiển thị, vd. "100.000" gõ vào thì đọc lại đúng "100.000".
+    """
+
+    def __init__(self, title: str = "fake", latency: float = 0.0, per_row: float = 0.0):
+        self.title = title
+        self.latency = latency
+        self.per_row = per_row
+        self.id = "fake"
+        self._sheets = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+        self.calls = []
+
+    def _call(self, op: str, sheet: str = None, rows: int = 0):
+        self.calls.append((op, sheet, rows))
+        delay = self.latency + rows * self.per_row
+        if delay > 0:
+            time.sleep(delay)
+        get_metrics().record(op, sheet, rows=rows, seconds=delay, layer="api", fake=True)
+
+    # ---- worksheet ----
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._call("fetch_sheet_metadata", title)
+        try:
+            return self._sheets[title]
+        except KeyError:
+            raise WorksheetNotFound(title)
+
+    def worksheets(self, **kwargs):
+        self._call("fetch_sheet_metadata")
+        return list(self._sheets.values())
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 30, **kwargs) -> FakeWorksheet:
+        self._call("add_sheet", title)
+        with self._lock:
+            if title in self._sheets:
+                raise ValueError(f"Sheet {title} đã tồn tại")
+            ws = FakeWorksheet(self, title, rows, cols, self._next_id)
+            self._next_id += 1
+            self._sheets[title] = ws
+            return ws
+
+    def del_worksheet(self, worksheet):
+        self._call("delete_sheet", worksheet.title)
+        with self._lock:
+            self._sheets.pop(worksheet.title, None)
+
+    def load(self, title: str, values: list) -> FakeWorksheet:
+        """Nạp sẵn dữ liệu (dòng đầu là header) mà không tính vào `calls`."""
+        with self._lock:
+            ws = self._sheets.get(title)
+            if ws is None:
+                ws = FakeWorksheet(self, title, sheet_id=self._next_id)
+                self._next_id += 1
+                self._sheets[title] = ws
+            ws._rows = [list(r) for r in values]
+            ws.row_count = max(len(ws._rows), 1000)
+            return ws
+
+    # ---- values API ----
+    def _value_range(self, rng: str, params: dict = None) -> dict:
+        title, a1 = _split_range(rng)
+        ws = self._sheets.get(title)
+        if ws is None:
+            raise APIError(_FakeResponse(400, f"Unable to parse range: {rng}"))
+        return {"range": rng, "majorDimension": "ROWS", "values": ws._get(a1, (params or {}).get("valueRenderOption"))}
+
+    def values_get(self, range, params=None, **kwargs):
+        title, _ = _split_range(range)
+        vr = self._value_range(range, params)
+        self._call("values_get", title, rows=len(vr["values"]))
+        return vr
+
+    def values_batch_get(self, ranges, params=None, **kwargs):
+        out = [self._value_range(r, params) for r in ranges]
+        self._call("values_batch_get", ",".join(_split_range(r)[0] for r in ranges),
+                   rows=sum(len(v["values"]) for v in out))
+        return {"spreadsheetId": self.id, "valueRanges": out}
+
+    def batch_update(self, body):
+        reqs = body.get("requests", [])
+        self._call("batch_update", None, rows=len(reqs))
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        with self._lock:
+            for req in reqs:
+                if "deleteDimension" in req:
+                    rng = req["deleteDimension"]["range"]
+                    by_id[rng["sheetId"]]._delete_rows(rng["startIndex"], rng["endIndex"])
+        return {"replies": [{} for _ in reqs]}
+
+class _FakeResponse:
+    """Đủ để dựng gspread APIError giống lỗi thật."""
+
+    def __init__(self, code: int, message: str):
+        self.status_code = code
+        self.text = message
+        self._message = message
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self._message, "status": "INVALID_ARGUMENT"}}
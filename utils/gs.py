@@ -1,120 +1,1102 @@
 # utils/gs.py
+import re
+import time
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import streamlit as st
 import pandas as pd
-from gspread_dataframe import get_as_dataframe, set_with_dataframe
-from .auth import get_spreadsheet
-from gspread.exceptions import APIError
-
-REQUIRED_SHEETS = {
-    "XE_MAY": ["Ngày","Khách hàng","Code","Đường","Loại sản phẩm","Loại bình","Số lượng giao","Vỏ về","Thanh Toán","PP Thanh toán","Chú thích","Người chở"],
-    "OTO": ["Ngày","Khách hàng","Loại sản phẩm","Loại bình","Số lượng","Đơn giá","Thanh Toán","PP Thanh toán","Chú thích","Người chở 1","Người chở 2"],
-    "DAILY_CLOSE": ["Ngày","Loại sản phẩm","Tồn cuối","Ghi chú","Người nhập"],
-    "NHAP_HANG": ["Ngày","Loại sản phẩm","Số lượng nhập","Đơn giá","Thành tiền","Nhà cung cấp","Ghi chú"],
-    "CONG": ["Ngày","Nhân viên","Ca","Công","Ghi chú"],
-    "LOOKUPS": ["Loại","Giá trị"],
-    "PAY_RULES": ["Tháng","Nhân viên","Luong_co_ban","Don_gia_cong","Phu_cap","Tam_ung","Khau_tru"],
-    "COMMISSION_RULES": ["Tháng","Loại sản phẩm","Ty_le_%","Hoa_hong_moi_donvi"],
-    "LUONG": ["Tháng","Nhân viên","Công","Lương cơ bản","Phụ cấp","Hoa hồng","Tạm ứng","Khấu trừ","Tổng lương"],
-    "INVENTORY": ["Loại sản phẩm","Tồn đầu","Nhập","Xuất","Tồn cuối","Ghi chú"],
-}
+from pandas.io.parsers import TextParser
+from gspread_dataframe import set_with_dataframe
+from .auth import get_spreadsheet, setting
+from .backend import Backend, SQLiteBackend, SheetSync, apply_filters, in_months, in_keys, MONTH_COL
+from .conflicts import WriteConflict, fingerprint
+from .cache import SheetCache
+from .lookups import LookupCatalog
+from .dateindex import ColumnIndex, DateIndex
+from .dates import parse_date, to_day, filter_dates, in_days, DATE_FMT_SAVE
+from .writequeue import WriteQueue, PartialSend
+from .metrics import timed, in_current_run
+from .dailyagg import ORDER_SHEETS, AGG_SHEET
+from .aggsheet import DailyAggSheet
+from .reconcile import reconcile
+from .ledger import customers, LEDGER_SHEET
+from .ledgersheet import LedgerSheet
+from .cube import RevenueCube, cube_facts
+from .schema import SCHEMAS, apply_schema, to_sheet, labels, concat, cell
+from .coldstore import ColdStore, COLD_SHEETS, PART_FMT, month_of
+from .payroll import norm_month
+from .partitions import base_of
+from .partsheet import PartitionedSheets
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import rowcol_to_a1
+
+# Cột của từng sheet theo thứ tự; kiểu cột & alias xem utils/schema.py
+REQUIRED_SHEETS = {ws: list(cols) for ws, cols in SCHEMAS.items()}
+
+# Cache đọc dùng chung giữa các session (xem utils/cache.py)
+CACHE_TTL_SECONDS = 120
+CACHE_MAX_SHEETS = 64
+
+# Cột ngày dùng để dựng chỉ mục & đọc theo khoảng ngày
+DATE_COL = "Ngày"
+# Quá số vùng dòng rời nhau này thì đọc cả sheet (rẻ hơn một batchGet quá dài)
+MAX_RANGE_RUNS = 40
+
+# Sheet đơn hàng & LOOKUPS: append đi qua hàng đợi ghi trễ, gom lô (xem utils/writequeue.py)
+WRITE_BEHIND_SHEETS = {"XE_MAY", "OTO", "LOOKUPS"}
+
+# Khoá cache của danh sách tên worksheet (để tìm các phân vùng theo tháng)
+_TITLES = "__worksheets__"
+
+@st.cache_resource(show_spinner=False)
+def get_cache() -> SheetCache:
+    return SheetCache(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_SHEETS)
+
+def clear_cache(ws_name: str = None):
+    """Bỏ cache (một sheet hoặc tất cả) để lần đọc sau lấy lại từ Google Sheets."""
+    get_cache().invalidate(ws_name)
+    handles = get_ws_handles()
+    if ws_name is None:
+        get_derived_cache().invalidate()
+        get_cube_blocks().invalidate()
+        handles.clear()
+        return
+    handles.pop(ws_name, None)
+    if ws_name in get_partitioned():
+        for title in get_partitions().part_titles(ws_name).values():
+            get_cache().invalidate(title)
+            handles.pop(title, None)
+
+@st.cache_resource(show_spinner=False)
+def get_derived_cache() -> SheetCache:
+    # kết quả tính từ nhiều sheet (đối chiếu tồn kho...); khoá chứa version các sheet nguồn
+    return SheetCache(ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_SHEETS)
+
+def data_version(ws_names) -> tuple:
+    """Version hiện tại của các sheet: đổi sau mỗi lần ghi (kể cả dòng còn trong hàng đợi ghi)."""
+    be = get_backend()
+    return tuple(be.version(n) for n in ws_names)
+
+def cached_by_version(name: str, ws_names, args: tuple, compute, cache: SheetCache = None):
+    """Kết quả `compute()` dùng chung giữa các session cho tới khi một sheet trong
+    `ws_names` được ghi (hoặc quá TTL như cache đọc). Kết quả KHÔNG được sửa trực tiếp.
+    `cache`: mặc định get_derived_cache()."""
+    cache = get_derived_cache() if cache is None else cache
+    ws_names = tuple(ws_names)
+    ver = data_version(ws_names)
+    key = (name, ws_names, ver) + tuple(args)
+    out = cache.get(key)
+    if out is None:
+        out = compute()
+        cache.put(key, out)
+        # kết quả tính từ version cũ không còn được đọc lại: bỏ ngay, không chờ LRU đẩy ra
+        cache.discard(lambda k: k[:2] == (name, ws_names) and k[2] != ver)
+    return out
+
+def _cols(name: str) -> list:
+    """Cột chuẩn của sheet; phân vùng theo tháng (XE_MAY_2025_08) dùng cột của sheet gốc."""
+    return REQUIRED_SHEETS.get(name) or REQUIRED_SHEETS.get(base_of(name), [])
 
 def _cannot_create_sheet_hint(name: str):
     st.error(
         f"Sheet **{name}** chưa tồn tại và tài khoản dịch vụ không có quyền tạo mới."
         "\n➡️ Vào Google Sheets, tạo sheet với **tên & cột** như sau, rồi bấm **Refresh**:"
     )
-    cols = REQUIRED_SHEETS.get(name, [])
+    cols = _cols(name)
     if cols:
         st.code(" | ".join(cols))
     st.stop()
 
+@st.cache_resource(show_spinner=False)
+def get_ws_handles() -> dict:
+    # {tên: worksheet} đã mở: mỗi lần ghi không phải lấy lại metadata (1 request) của worksheet
+    return {}
+
+def _forget_ws_on_error(fn):
+    """Lỗi API khi ghi qua handle đã lưu (sheet có thể đã bị xoá/tạo lại): bỏ handle, lần sau mở lại."""
+    @functools.wraps(fn)
+    def wrapper(ws_name, *args, **kwargs):
+        try:
+            return fn(ws_name, *args, **kwargs)
+        except APIError:
+            get_ws_handles().pop(ws_name, None)
+            raise
+    return wrapper
+
 def ensure_ws(name: str, rows: int = 1000, cols: int = 30, headers=None):
     """Tạo worksheet nếu có quyền. Nếu không, báo rõ & dừng an toàn."""
-    sh = get_spreadsheet()
-    try:
-        ws = sh.worksheet(name)
+    ws = open_ws(name)
+    if ws is not None:
         return ws
-    except Exception:
-        pass
     try:
-        ws = sh.add_worksheet(title=name, rows=rows, cols=cols)
+        ws = get_spreadsheet().add_worksheet(title=name, rows=rows, cols=cols)
+        get_cache().bump(_TITLES)
         if headers:
             ws.append_row(headers, value_input_option="USER_ENTERED")
+        get_ws_handles()[name] = ws
         return ws
     except APIError:
         _cannot_create_sheet_hint(name)
 
 def open_ws(name: str):
-    sh = get_spreadsheet()
+    handles = get_ws_handles()
+    ws = handles.get(name)
+    if ws is not None:
+        return ws
     try:
-        return sh.worksheet(name)
-    except Exception:
+        ws = handles[name] = get_spreadsheet().worksheet(name)
+        return ws
+    except WorksheetNotFound:
         # KHÔNG tự động tạo để tránh APIError; caller tự quyết
         return None
 
-def read_df(ws_name: str) -> pd.DataFrame:
-    ws = open_ws(ws_name)
-    if ws is None:
-        # thử tạo nếu có headers định nghĩa
-        headers = REQUIRED_SHEETS.get(ws_name)
-        if headers:
-            ws = ensure_ws(ws_name, headers=headers)
-        else:
-            _cannot_create_sheet_hint(ws_name)
-    df = get_as_dataframe(ws, evaluate_formulas=True, header=0)
-    if df is None:
-        return pd.DataFrame(columns=REQUIRED_SHEETS.get(ws_name, []))
+# Như get_as_dataframe(evaluate_formulas=True) ban đầu: giá trị đúng như ô hiển thị
+# ("1.000.000 đ", "10%", ngày theo định dạng của ô), luôn là chuỗi; đổi kiểu do apply_schema
+_VALUE_PARAMS = {"valueRenderOption": "FORMATTED_VALUE"}
+
+def _a1_sheet(name: str) -> str:
+    return "'" + name.replace("'", "''") + "'"
+
+def _values_to_df(ws_name: str, values: list) -> pd.DataFrame:
+    """Dựng DataFrame từ bảng giá trị thô (dòng đầu là header): bỏ dòng rỗng,
+    bỏ cột không tên rỗng, strip tên cột. Dùng chung cho read_df và snapshot.
+    Không đoán kiểu ("100.000" không được thành 100.0): mọi cột là chuỗi, ô trống = NaN."""
+    if not values or not any(values):
+        return pd.DataFrame(columns=_cols(ws_name))
+    width = max(len(r) for r in values)
+    rows = [list(r) + [""] * (width - len(r)) for r in values]
+    df = TextParser(rows, header=0, dtype=str).read()
     df = df.dropna(how="all")
+    empty_unnamed = [c for c in df.columns if str(c).startswith("Unnamed:") and df[c].isna().all()]
+    if empty_unnamed:
+        df = df.drop(columns=empty_unnamed)
     df.columns = [str(c).strip() for c in df.columns]
     return df
 
-def append_row(ws_name: str, row: list):
-    ws = ensure_ws(ws_name, headers=REQUIRED_SHEETS.get(ws_name))
-    ws.append_row(row, value_input_option="USER_ENTERED")
+def _col_letter(col: int) -> str:
+    return rowcol_to_a1(1, col)[:-1]
 
-def write_df(ws_name: str, df: pd.DataFrame):
-    ws = ensure_ws(ws_name, headers=REQUIRED_SHEETS.get(ws_name))
+def _header_and_column(ws_name: str, col_name: str):
+    """Lấy header và toàn bộ MỘT cột (theo tên) trong 1 request batchGet.
+    Trả về (header, values) với values[i] là ô ở dòng i+1; cột không có -> (header, None)."""
+    sh = get_spreadsheet()
+    cached = get_cache().get(ws_name)
+    cols = list(cached.columns) if cached is not None else _cols(ws_name)
+    guess = cols.index(col_name) + 1 if col_name in cols else 1
+    q = _a1_sheet(ws_name)
+    resp = sh.values_batch_get([f"{q}!1:1", f"{q}!{_col_letter(guess)}:{_col_letter(guess)}"],
+                                           params=_VALUE_PARAMS)
+    head_vr, col_vr = resp.get("valueRanges", [{}, {}])
+    header = [str(c).strip() for c in (head_vr.get("values") or [[]])[0]]
+    if col_name not in header:
+        return header, None
+    idx = header.index(col_name) + 1
+    if idx != guess:
+        col_vr = sh.values_get(f"{q}!{_col_letter(idx)}:{_col_letter(idx)}", params=_VALUE_PARAMS)
+    values = [(r[0] if r else "") for r in col_vr.get("values", [])]
+    return header, values
+
+def _runs(rows: list) -> list:
+    """[2,3,4,8,9] -> [(2,4),(8,9)] (dòng liên tiếp gom thành một khoảng)."""
+    out = []
+    for r in sorted(rows):
+        if out and r == out[-1][1] + 1:
+            out[-1][1] = r
+        else:
+            out.append([r, r])
+    return [tuple(x) for x in out]
+
+def _bad_range(e: APIError) -> bool:
+    """400 khi đọc theo tên sheet = sheet chưa tồn tại. Lỗi khác (429, 5xx...) phải báo lên."""
+    return e.code == 400
+
+def _fetch_df(ws_name: str) -> pd.DataFrame:
+    sh = get_spreadsheet()
+    try:
+        # đọc thẳng theo tên sheet: 1 request, không cần lấy metadata worksheet
+        values = sh.values_get(_a1_sheet(ws_name), params=_VALUE_PARAMS).get("values", [])
+    except APIError as e:
+        if not _bad_range(e):
+            raise
+        get_ws_handles().pop(ws_name, None)
+        ws = open_ws(ws_name)
+        if ws is None:
+            # thử tạo nếu có headers định nghĩa
+            headers = _cols(ws_name)
+            if headers:
+                ws = ensure_ws(ws_name, headers=headers)
+            else:
+                _cannot_create_sheet_hint(ws_name)
+        values = sh.values_get(_a1_sheet(ws.title), params=_VALUE_PARAMS).get("values", [])
+    return _values_to_df(ws_name, values)
+
+def _read_cached(ws_name: str) -> pd.DataFrame:
+    """Bản DataFrame dùng chung trong cache (KHÔNG được sửa trực tiếp)."""
+    cache = get_cache()
+    df = cache.get(ws_name)
+    if df is None:
+        ver = cache.version(ws_name)
+        df = _fetch_df(ws_name)
+        cache.put(ws_name, df, ver)
+    return df
+
+def _sheets_read_df(ws_name: str, date_from=None, date_to=None) -> pd.DataFrame:
+    """Đọc sheet qua cache dùng chung. Trả về bản sao nên caller được phép sửa.
+    Index giữ nguyên vị trí dòng: dòng trên sheet = index + 2 (dòng 1 là header).
+
+    Có `date_from`/`date_to` (gồm cả hai đầu) thì chỉ lấy các dòng có cột
+    "Ngày" trong khoảng đó, nhờ chỉ mục ngày: không tải cả sheet.
+    """
+    if ws_name not in WRITE_BEHIND_SHEETS or get_write_queue() is None:
+        return _read(ws_name, date_from, date_to).copy()
+    q = get_write_queue()
+    # giữ khoá của sheet: lô đang gửi hoặc đã nằm trong cache, hoặc còn trong pending
+    with q.sheet_lock(ws_name):
+        return _with_pending(ws_name, _read(ws_name, date_from, date_to), q.pending(ws_name),
+                             date_from, date_to)
+
+def _read(ws_name: str, date_from=None, date_to=None) -> pd.DataFrame:
+    if ws_name in get_partitioned():
+        return get_partitions().read(ws_name, date_from, date_to)
+    if date_from is None and date_to is None:
+        return _read_cached(ws_name)
+    return _read_date_range(ws_name, date_from, date_to)
+
+def _with_pending(ws_name: str, df: pd.DataFrame, rows: list, date_from=None, date_to=None) -> pd.DataFrame:
+    """Nối các dòng còn trong hàng đợi ghi vào sau `df` (bản sao) để người đọc thấy ngay.
+    Index tiếp nối index lớn nhất, đúng vị trí dòng sẽ có trên sheet."""
+    if not rows:
+        return df.copy()
+    cols = list(df.columns) if len(df.columns) else _cols(ws_name)
+    rows = [[None if isinstance(v, str) and not v.strip() else v for v in r[:len(cols)]] for r in rows]
+    start = (df.index.max() + 1) if len(df.index) else 0
+    add = pd.DataFrame([dict(zip(cols, r)) for r in rows], columns=cols,
+                       index=range(start, start + len(rows)))
+    add = filter_dates(add, date_from, date_to) if date_from is not None or date_to is not None else add
+    return pd.concat([df, add]) if not df.empty else add
+
+@st.cache_resource(show_spinner=False)
+def get_row_indexes() -> dict:
+    # {(tên sheet, cột): ColumnIndex}: vị trí dòng theo giá trị một cột (ngày, khách...)
+    return {}
+
+def _column_index(ws_name: str, col: str):
+    """Chỉ mục của một cột (dựng lại khi version cache đổi hoặc quá TTL).
+    Sheet không có cột đó -> None."""
+    cache = get_cache()
+    idxs = get_row_indexes()
+    ver = cache.version(ws_name)
+    idx = idxs.get((ws_name, col))
+    if idx is None or idx.version != ver or time.monotonic() - idx.built_at > cache.ttl:
+        header, column = _header_and_column(ws_name, col)
+        if column is None:
+            idxs.pop((ws_name, col), None)
+            return None
+        idx = (DateIndex if col == DATE_COL else ColumnIndex)(header, column, ver)
+        idxs[(ws_name, col)] = idx
+    return idx
+
+def _date_index(ws_name: str):
+    return _column_index(ws_name, DATE_COL)
+
+def _update_indexes(ws_name: str, ver: int, new_ver: int, apply):
+    """Sau một lần ghi của app (version `ver` -> `new_ver`): `apply(idx, vị trí cột)` cập nhật
+    tại chỗ từng chỉ mục của sheet. Chỉ mục đã cũ hơn lần ghi thì bỏ, lần sau dựng lại."""
+    idxs = get_row_indexes()
+    for key in [k for k in list(idxs) if k[0] == ws_name]:
+        idx = idxs.get(key)
+        if idx is None:
+            continue
+        if apply is None or idx.version != ver or key[1] not in idx.header:
+            idxs.pop(key, None)
+            continue
+        apply(idx, idx.header.index(key[1]))
+        idx.version = new_ver
+
+def _read_date_range(ws_name: str, date_from, date_to) -> pd.DataFrame:
+    cache = get_cache()
+    full = cache.get(ws_name)
+    if full is not None:
+        return filter_dates(full, date_from, date_to)
+    key = (ws_name,
+           None if date_from is None else str(to_day(date_from)),
+           None if date_to is None else str(to_day(date_to)))
+    df = cache.get(key)
+    if df is not None:
+        return df
+    ver = cache.version(ws_name)
+    try:
+        idx = _date_index(ws_name)
+    except APIError as e:
+        if not _bad_range(e):
+            raise
+        idx = None
+    runs = _runs(idx.rows_between(date_from, date_to)) if idx is not None else None
+    if runs is None or len(runs) > MAX_RANGE_RUNS:
+        return filter_dates(_read_cached(ws_name), date_from, date_to)
+    if not runs:
+        df = _values_to_df(ws_name, [idx.header])
+    else:
+        q = _a1_sheet(ws_name)
+        last = _col_letter(len(idx.header))
+        resp = get_spreadsheet().values_batch_get([f"{q}!A{r0}:{last}{r1}" for r0, r1 in runs], params=_VALUE_PARAMS)
+        rows, rownums = [], []
+        for (r0, r1), vr in zip(runs, resp.get("valueRanges", [])):
+            vals = vr.get("values", [])
+            vals = vals + [[]] * (r1 - r0 + 1 - len(vals))
+            rows += vals
+            rownums += range(r0, r1 + 1)
+        df = _values_to_df(ws_name, [idx.header] + rows)
+        df.index = np.asarray(rownums)[df.index] - 2
+        df = filter_dates(df, date_from, date_to)
+    cache.put(key, df, ver)
+    return df
+
+def load_sheets(names: list) -> dict:
+    """Nạp các sheet chưa có trong cache bằng MỘT request values.batchGet.
+    Trả về {tên sheet: bản trong cache} (KHÔNG được sửa trực tiếp). Nếu batchGet
+    lỗi (vd. có sheet chưa tồn tại) thì đọc lẻ từng sheet."""
+    cache = get_cache()
+    frames = {}
+    missing = []
+    for n in names:
+        df = cache.get(n)
+        if df is None:
+            missing.append(n)
+        else:
+            frames[n] = df
+    if missing:
+        versions = {n: cache.version(n) for n in missing}
+        try:
+            resp = get_spreadsheet().values_batch_get([_a1_sheet(n) for n in missing], params=_VALUE_PARAMS)
+            ranges = resp.get("valueRanges", [])
+        except APIError as e:
+            if not _bad_range(e):
+                raise
+            ranges = []
+        if len(ranges) == len(missing):
+            for n, vr in zip(missing, ranges):
+                df = _values_to_df(n, vr.get("values", []))
+                cache.put(n, df, versions[n])
+                frames[n] = df
+        else:
+            for n in missing:
+                frames[n] = _read_cached(n)
+    return frames
+
+@timed("snapshot")
+def snapshot(ws_names: list) -> dict:
+    """Đọc nhiều sheet bằng MỘT request values.batchGet và nạp vào cache.
+
+    Sheet đã có trong cache thì không đọc lại. Trả về {tên sheet: DataFrame}
+    (bản sao). Sheet chia theo tháng thì nạp luôn mọi phân vùng trong cùng request.
+    Backend cục bộ (SQLite) thì chỉ đọc lần lượt, không cần gộp request.
+    """
+    be = get_backend()
+    if not isinstance(be, SheetsBackend):
+        return {n: be.read_df(n) for n in dict.fromkeys(ws_names)}
+    names = list(dict.fromkeys(ws_names))
+    parted = get_partitioned()
+    load = []
+    for n in names:
+        load += [n] + (list(get_partitions().part_titles(n).values()) if n in parted else [])
+    frames = load_sheets(list(dict.fromkeys(load)))
+    q = get_write_queue()
+    return {n: _with_pending(n, get_partitions().read(n) if n in parted else frames[n],
+                             q.pending(n) if q is not None else []) for n in names}
+
+def _appended_row(resp) -> int:
+    """Số dòng đầu tiên vừa append, lấy từ updates.updatedRange ('XE_MAY'!A120:L120)."""
+    rng = ((resp or {}).get("updates") or {}).get("updatedRange", "")
+    m = re.search(r"![A-Z]+(\d+)", rng)
+    return int(m.group(1)) if m else None
+
+# Đọc/ghi MỘT worksheet theo đúng tên (không qua backend, hàng đợi hay phân vùng), kèm cập nhật
+# cache & chỉ mục: load_sheets, append_sheet_rows, write_sheet, replace_sheet_rows.
+# utils/partsheet.py chỉ gọi các hàm này (truyền vào PartitionedSheets).
+@_forget_ws_on_error
+def append_sheet_rows(ws_name: str, rows: list):
+    """Append `rows` (list theo thứ tự cột) vào cuối worksheet `ws_name` (tạo nếu chưa có)."""
+    ws = ensure_ws(ws_name, headers=_cols(ws_name))
+    cache = get_cache()
+    ver = cache.version(ws_name)
+    since = time.monotonic()
+    resp = ws.append_rows(rows, value_input_option="USER_ENTERED")
+    new_ver = cache.append_rows(ws_name, rows, since=since)
+    # chỉ mục các cột: thêm dòng mới thay vì dựng lại
+    at = _appended_row(resp)
+
+    def add(idx, pos):
+        for i, row in enumerate(rows):
+            idx.add(at + i, row[pos] if pos < len(row) else "")
+    _update_indexes(ws_name, ver, new_ver, add if at else None)
+
+@_forget_ws_on_error
+def write_sheet(ws_name: str, df: pd.DataFrame):
+    """Ghi đè cả worksheet `ws_name` bằng `df`."""
+    ws = ensure_ws(ws_name, headers=_cols(ws_name))
     ws.clear()
     set_with_dataframe(ws, df)
+    out = df.reset_index(drop=True).dropna(how="all")
+    out.columns = [str(c).strip() for c in out.columns]
+    get_cache().bump(ws_name, out)
+
+@st.cache_resource(show_spinner=False)
+def get_lookup_catalog() -> LookupCatalog:
+    return LookupCatalog()
+
+def lookup_catalog() -> LookupCatalog:
+    """Catalog LOOKUPS đã dựng chỉ mục; chỉ dựng lại khi bản cache của sheet đổi.
+    Giá trị còn trong hàng đợi ghi cũng có trong catalog."""
+    cat = get_lookup_catalog()
+    be = get_backend()
+    src = be.frame("LOOKUPS")
+    if src is not cat.source:
+        cat.load(src)
+        q = get_write_queue() if isinstance(be, SheetsBackend) else None
+        for row in (q.pending("LOOKUPS") if q is not None else []):
+            cat.add(*row[:2])
+    return cat
 
 def add_lookup(kind: str, value: str):
+    """Thêm (Loại, Giá trị) vào LOOKUPS nếu chưa có: kiểm tra trên chỉ mục trong bộ nhớ,
+    rồi append đúng một dòng (qua hàng đợi ghi trễ: nhiều giá trị thêm liền nhau
+    được gom thành một request). Không đọc hay ghi lại cả sheet."""
     if not value: return
-    df = read_df("LOOKUPS")
-    if df.empty:
-        df = pd.DataFrame(columns=["Loại","Giá trị"])
-    mask = (df["Loại"].astype(str)==kind) & (df["Giá trị"].astype(str)==value)
-    if not mask.any():
-        df = pd.concat([df, pd.DataFrame([{"Loại":kind, "Giá trị":value}])], ignore_index=True)
-        write_df("LOOKUPS", df)
+    cat = lookup_catalog()
+    kind, value = str(kind).strip(), str(value).strip()
+    # kiểm tra + thêm trong một bước: hai phiên cùng thêm một giá trị chỉ append một lần
+    if not cat.add(kind, value):
+        return
+    try:
+        get_backend().append_rows("LOOKUPS", [[kind, value]])
+    except Exception:
+        cat.source = None   # chưa lên sheet: lần sau dựng lại chỉ mục từ sheet
+        raise
 
 def options(kind: str):
-    df = read_df("LOOKUPS")
-    if df.empty: return []
-    vals = df.loc[df["Loại"].astype(str)==kind, "Giá trị"].dropna().astype(str)
-    vals = [v.strip() for v in vals if v.strip()]
-    return sorted(set(vals))
+    return lookup_catalog().values(kind)
 
 def items_from_inventory():
     inv = read_df("INVENTORY")
-    col = "Loại sản phẩm" if "Loại sản phẩm" in inv.columns else None
-    if col:
-        return sorted(inv[col].dropna().astype(str).str.strip().unique().tolist())
-    return []
+    return labels(inv["Loại sản phẩm"]) if "Loại sản phẩm" in inv.columns else []
 
-def replace_rows_by_date(ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame):
-    old = read_df(ws_name)
+def _rewrite_block(ws_name: str, col: str, match, new_rows: pd.DataFrame):
+    """Cách cũ: đọc cả sheet, bỏ các dòng của block, nối dòng mới rồi ghi đè toàn bộ.
+    Chỉ dùng khi header của sheet thiếu cột mà new_rows cần."""
+    old = _sheets_read_df(ws_name)
     if old.empty:
         base = new_rows.copy()
     else:
-        if date_col in old.columns:
-            base = old[old[date_col].astype(str) != str(date_str)].copy()
+        if col in old.columns:
+            base = old[~match(old[col])].copy()
         else:
             base = old.copy()
         base = pd.concat([base, new_rows], ignore_index=True)
     # reorder columns for stability
-    cols = REQUIRED_SHEETS.get(ws_name, list(new_rows.columns))
-    for c in new_rows.columns:
+    cols = list(_cols(ws_name) or new_rows.columns)
+    for c in old.columns.tolist() + new_rows.columns.tolist():
         if c not in cols:
             cols.append(c)
     base = base.reindex(columns=cols)
-    write_df(ws_name, base)
+    write_sheet(ws_name, base)
+
+def replace_sheet_rows(ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame, date_to=None):
+    """Ghi đè các dòng của một ngày (hoặc khoảng [date_str, date_to]) trong worksheet `ws_name`,
+    xem _replace_ws_block."""
+    # so theo ngày đã chuẩn hoá: "05-01-2026", "05/01/2026", "2026-01-05" là cùng một ngày
+    _replace_ws_block(ws_name, date_col, lambda values: in_days(values, date_str, date_to), new_rows)
+
+@_forget_ws_on_error
+def _replace_ws_block(ws_name: str, col: str, match, new_rows: pd.DataFrame):
+    """Ghi đè các dòng có `match(giá trị cột col)` (một ngày, một tháng...) bằng thao tác theo vùng dòng.
+
+    Vị trí các dòng lấy từ chỉ mục của cột đó (chỉ đọc header + cột khi chỉ mục
+    đã cũ), rồi: cập nhật tại chỗ các dòng cũ của block (1 batchUpdate), xoá các
+    dòng thừa (1 batchUpdate deleteDimension) hoặc append các dòng còn thiếu.
+    Chi phí tỉ lệ với số dòng của block, không phải kích thước sheet, và sheet
+    không bao giờ bị xoá trắng giữa chừng. Chỉ mục được cập nhật theo, nên các
+    lần ghi đè sau (vd. DAILY_AGG mỗi đơn) không phải đọc lại cột.
+    """
+    ws = ensure_ws(ws_name, headers=_cols(ws_name))
+    idx = _column_index(ws.title, col)
+    if idx is None or any(str(c).strip() not in idx.header for c in new_rows.columns):
+        return _rewrite_block(ws_name, col, match, new_rows)
+
+    ver, header = idx.version, idx.header
+    targets = idx.rows_where(match)
+    new = new_rows.copy()
+    new.columns = [str(c).strip() for c in new.columns]
+    new = new.reindex(columns=header)
+    values = [[cell(v) for v in row] for row in new.itertuples(index=False, name=None)]
+    keep = min(len(targets), len(values))
+    updates, deletes, appends = targets[:keep], targets[keep:], values[keep:]
+
+    if updates:
+        data = []
+        pos = 0
+        for r0, r1 in _runs(updates):
+            n = r1 - r0 + 1
+            data.append({"range": f"A{r0}:{_col_letter(len(header))}{r1}", "values": values[pos:pos + n]})
+            pos += n
+        ws.batch_update(data, value_input_option="USER_ENTERED")
+    if deletes:
+        # xoá từ dưới lên để chỉ số dòng phía trên không bị lệch
+        reqs = [{"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS",
+                                               "startIndex": r0 - 1, "endIndex": r1}}}
+                for r0, r1 in reversed(_runs(deletes))]
+        ws.spreadsheet.batch_update({"requests": reqs})
+    at = None
+    if appends:
+        at = _appended_row(ws.append_rows(appends, value_input_option="USER_ENTERED"))
+
+    new_ver = _cache_apply_block(ws_name, col, match, header, targets, len(updates), values)
+
+    def apply(index, pos):
+        index.apply_block(targets, len(updates), [row[pos] for row in values], at)
+    _update_indexes(ws_name, ver, new_ver, apply if at or not appends else None)
+
+def _cache_apply_block(ws_name, col, match, header, targets, n_updates, values):
+    """Áp cùng thao tác lên bản cache (index = dòng - 2) để khỏi đọc lại cả sheet.
+    Nếu bản cache không khớp vị trí các dòng của block trên sheet thì chỉ invalidate.
+    Trả về version mới của sheet."""
+    cache = get_cache()
+    df = cache.get(ws_name)
+    if df is None or list(df.columns) != header:
+        return cache.bump(ws_name)
+    cached_rows = df.index[match(df[col])] + 2
+    if sorted(cached_rows) != targets:
+        return cache.bump(ws_name)
+    pos = [r - 2 for r in targets]
+    new = pd.DataFrame([[None if v == "" else v for v in row] for row in values], columns=header)
+    upd = new.iloc[:n_updates].set_axis(pos[:n_updates])
+    df = df.drop(index=pos)
+    gone = pd.Index(pos[n_updates:])
+    if len(gone):
+        # các dòng dưới vùng bị xoá dồn lên
+        df.index = df.index - gone.searchsorted(df.index, side="left")
+    if len(upd):
+        df = pd.concat([df, upd]).sort_index() if not df.empty else upd
+    extra = new.iloc[n_updates:]
+    if len(extra):
+        start = (df.index.max() + 1) if len(df.index) else 0
+        extra = extra.set_axis(range(start, start + len(extra)))
+        df = pd.concat([df, extra]) if not df.empty else extra
+    return cache.bump(ws_name, df)
+
+def _sheets_replace_rows_by_month(ws_name: str, months: list, new_rows: pd.DataFrame):
+    _replace_ws_block(ws_name, MONTH_COL, lambda values: in_months(values, months), new_rows)
+
+def _sheets_replace_rows_by_key(ws_name: str, key_col: str, keys: list, new_rows: pd.DataFrame):
+    _replace_ws_block(ws_name, key_col, lambda values: in_keys(values, keys), new_rows)
+
+# ============ Sheet chia theo tháng (XE_MAY_2025_08...), xem utils/partsheet.py ============
+@st.cache_resource(show_spinner=False)
+def get_partitioned() -> frozenset:
+    """Sheet chia mỗi tháng một worksheet, cấu hình [sheets] PARTITION_SHEETS
+    (vd. ["XE_MAY", "OTO"] hoặc "XE_MAY,OTO"). Mặc định: không chia."""
+    val = setting("sheets", "PARTITION_SHEETS", [])
+    names = (str(n).strip() for n in (val.split(",") if isinstance(val, str) else val))
+    return frozenset(n for n in names if DATE_COL in REQUIRED_SHEETS.get(n, []))
+
+@st.cache_resource(show_spinner=False)
+def get_partitions() -> PartitionedSheets:
+    return PartitionedSheets(get_partitioned(), REQUIRED_SHEETS, worksheet_titles, load_sheets,
+                             append_sheet_rows, write_sheet, replace_sheet_rows)
+
+def worksheet_titles() -> list:
+    """Tên các worksheet (1 request metadata, cache như một sheet; tạo sheet mới thì bump)."""
+    cache = get_cache()
+    titles = cache.get(_TITLES)
+    if titles is None:
+        ver = cache.version(_TITLES)
+        titles = [ws.title for ws in get_spreadsheet().worksheets()]
+        cache.put(_TITLES, titles, ver)
+    return titles
+
+def _sheets_append_rows(ws_name: str, rows: list):
+    if ws_name not in get_partitioned():
+        return append_sheet_rows(ws_name, rows)
+    try:
+        get_partitions().append_rows(ws_name, rows)
+    finally:
+        get_cache().bump(ws_name)   # version sheet gốc = version chung của mọi phân vùng
+
+def _sheets_write_df(ws_name: str, df: pd.DataFrame):
+    if ws_name not in get_partitioned():
+        return write_sheet(ws_name, df)
+    get_partitions().write_df(ws_name, df)
+    get_cache().bump(ws_name)
+
+def _sheets_replace_rows_by_date(ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame,
+                                 date_to=None):
+    if ws_name not in get_partitioned() or date_col != DATE_COL:
+        return replace_sheet_rows(ws_name, date_col, date_str, new_rows, date_to)
+    get_partitions().replace_rows_by_date(ws_name, date_col, date_str, new_rows, date_to)
+    get_cache().bump(ws_name)
+
+@timed("migrate_partitions")
+def migrate_partitions(ws_name: str) -> dict:
+    """Chuyển các dòng còn trong sheet gốc sang phân vùng theo tháng (xem
+    PartitionedSheets.migrate). Trả về {tên phân vùng: số dòng đã chuyển}."""
+    if ws_name not in get_partitioned():
+        raise ValueError(f"{ws_name} chưa bật chia theo tháng ([sheets] PARTITION_SHEETS).")
+    flush_writes(ws_name)
+    sync_now()   # backend SQLite: đẩy hết thay đổi đang chờ trước khi dời dòng trên sheet
+    get_cache().invalidate(ws_name)
+    moved = get_partitions().migrate(ws_name)
+    get_cache().bump(ws_name)
+    return moved
+
+# ============ Backend ============
+class SheetsBackend(Backend):
+    """Đọc/ghi thẳng Google Sheets (mặc định), qua cache và chỉ mục ngày ở trên."""
+
+    def read_df(self, ws_name, date_from=None, date_to=None, filters=None):
+        return apply_filters(_sheets_read_df(ws_name, date_from, date_to), filters)
+
+    def frame(self, ws_name):
+        return _read(ws_name) if ws_name in get_partitioned() else _read_cached(ws_name)
+
+    def version(self, ws_name):
+        q = get_write_queue() if ws_name in WRITE_BEHIND_SHEETS else None
+        return (get_cache().version(ws_name), len(q.pending(ws_name)) if q is not None else 0)
+
+    def append_rows(self, ws_name, rows):
+        q = get_write_queue()
+        if q is not None and ws_name in WRITE_BEHIND_SHEETS:
+            q.put(ws_name, rows)
+        else:
+            _sheets_append_rows(ws_name, rows)
+
+    def write_df(self, ws_name, df):
+        flush_writes(ws_name)
+        _sheets_write_df(ws_name, df)
+
+    def replace_rows_by_date(self, ws_name, date_col, date_str, new_rows, date_to=None):
+        flush_writes(ws_name)
+        _sheets_replace_rows_by_date(ws_name, date_col, date_str, new_rows, date_to)
+
+    def replace_rows_by_month(self, ws_name, months, new_rows):
+        flush_writes(ws_name)
+        _sheets_replace_rows_by_month(ws_name, months, new_rows)
+
+    def replace_rows_by_key(self, ws_name, key_col, keys, new_rows):
+        flush_writes(ws_name)
+        _sheets_replace_rows_by_key(ws_name, key_col, keys, new_rows)
+
+@st.cache_resource(show_spinner=False)
+def get_write_queue():
+    """Hàng đợi ghi trễ dùng chung (sống qua các lần rerun), chỉ khi bật trong secrets:
+    [sheets] WRITE_BEHIND_SECONDS (mặc định 0 = tắt, ghi thẳng từng đơn), WRITE_BEHIND_ROWS (mặc định 20).
+    Dòng trong hàng đợi chỉ nằm trong bộ nhớ tiến trình: khởi động lại/crash là mất."""
+    delay = float(setting("sheets", "WRITE_BEHIND_SECONDS", 0))
+    if delay <= 0:
+        return None
+    return WriteQueue(_send_queued, max_rows=int(setting("sheets", "WRITE_BEHIND_ROWS", 20)),
+                      max_delay=delay).start()
+
+def _send_queued(ws_name: str, rows: list):
+    try:
+        _sheets_append_rows(ws_name, rows)
+    except PartialSend as e:
+        _orders_written(ws_name, e.sent)   # hàng đợi chỉ gửi lại e.unsent
+        raise
+    _orders_written(ws_name, rows)
+
+def _orders_written(ws_name: str, rows: list):
+    if ws_name in ORDER_SHEETS and rows:
+        get_daily_agg().add(ws_name, rows)
+        get_ledger().add(ws_name, rows)
+
+def _queued(be: Backend, ws_name: str) -> bool:
+    """append của sheet này có đi qua hàng đợi ghi trễ không (DAILY_AGG khi đó cập nhật lúc flush)."""
+    return isinstance(be, SheetsBackend) and ws_name in WRITE_BEHIND_SHEETS and get_write_queue() is not None
+
+@timed("flush_writes")
+def flush_writes(ws_name: str = None) -> int:
+    """Ghi ngay các dòng đang chờ trong hàng đợi (một sheet hoặc tất cả). Trả về số dòng đã ghi.
+    Không chỉ định sheet thì cộng luôn các đơn còn chờ vào DAILY_AGG & CONG_NO."""
+    q = get_write_queue()
+    n = q.flush(ws_name) if q is not None else 0
+    if ws_name is None:
+        get_daily_agg().flush_upkeep()
+        get_ledger().flush_upkeep()
+    return n
+
+def _flush_orders():
+    for s in ORDER_SHEETS:
+        flush_writes(s)
+
+def _pull_sheet(ws_name: str) -> pd.DataFrame:
+    """Nạp ban đầu cho SQLite: sheet chia theo tháng thì lấy cả các phân vùng."""
+    return get_partitions().read(ws_name) if ws_name in get_partitioned() else _fetch_df(ws_name)
+
+@st.cache_resource(show_spinner=False)
+def get_backend() -> Backend:
+    """Chọn backend theo secrets:
+    [storage] BACKEND = "sqlite" -> SQLite cục bộ (SQLITE_PATH), Google Sheets chỉ là đích đồng bộ.
+    Mặc định: Google Sheets."""
+    if str(setting("storage", "BACKEND", "sheets")).lower() != "sqlite":
+        return SheetsBackend()
+    be = SQLiteBackend(setting("storage", "SQLITE_PATH", "ngocvu.db"), REQUIRED_SHEETS, pull=_pull_sheet)
+    be.sync = SheetSync(be, _sheets_append_rows, _sheets_write_df, _sheets_replace_rows_by_date,
+                        interval=float(setting("storage", "SYNC_SECONDS", 5)),
+                        push_replace_month=_sheets_replace_rows_by_month,
+                        push_replace_key=_sheets_replace_rows_by_key).start()
+    return be
+
+def sync_now() -> int:
+    """Đẩy ngay mọi thay đổi đang chờ lên Google Sheets (chỉ có tác dụng với backend SQLite)."""
+    be = get_backend()
+    sync = getattr(be, "sync", None)
+    return sync.drain() if sync is not None else 0
+
+@timed("read_df")
+def read_df(ws_name: str, date_from=None, date_to=None, filters: dict = None) -> pd.DataFrame:
+    """Đọc một sheet thành DataFrame (caller được phép sửa).
+
+    `date_from`/`date_to`: chỉ lấy các dòng có "Ngày" trong khoảng (gồm hai đầu).
+    `filters`: {cột: giá trị | list giá trị}, vd. {"Loại sản phẩm": ["Aqua 500"]}.
+    Với backend SQLite cả hai được đẩy xuống câu SQL.
+
+    Cột đã đổi kiểu theo utils/schema.py (ngày -> datetime64, số/tiền -> số,
+    danh mục -> Categorical). Đọc cả sheet thì bản đã đổi kiểu được dùng chung
+    tới lần ghi sau, không phải đổi lại mỗi lần render.
+
+    Sheet có tháng đã chốt (kho lịch sử, xem close_month): các tháng đó đọc từ
+    file Parquet cục bộ, chỉ phần còn lại đọc từ Google Sheets.
+    """
+    closed = _cold_months(ws_name)
+    if closed:
+        stamp = get_cold_store().stamp(ws_name)
+        load = lambda f, t, flt: _read_hybrid(ws_name, closed, f, t, flt)
+    else:
+        stamp = None
+        load = lambda f, t, flt: apply_schema(ws_name, get_backend().read_df(ws_name, f, t, flt))
+    if date_from is None and date_to is None and not filters:
+        return cached_by_version("read_df", (ws_name,), (ws_name, stamp), lambda: load(None, None, None)).copy()
+    return load(date_from, date_to, filters)
+
+# ============ Đọc song song nhiều sheet ============
+_READ_THREAD = "sheet-read"
+
+@st.cache_resource(show_spinner=False)
+def get_read_pool() -> ThreadPoolExecutor:
+    """Thread pool đọc sheet dùng chung, [sheets] READ_WORKERS luồng (mặc định 4).
+    Hạn mức request/phút vẫn do QuotaHTTPClient giới hạn chung cho mọi luồng."""
+    return ThreadPoolExecutor(max_workers=max(int(setting("sheets", "READ_WORKERS", 4)), 1),
+                              thread_name_prefix=_READ_THREAD)
+
+@timed("read_many")
+def read_many(ws_names, date_from=None, date_to=None, ranges: dict = None, errors: dict = None) -> dict:
+    """Đọc nhiều sheet cùng lúc (mỗi sheet một luồng, dùng chung spreadsheet & cache).
+    Trả về {tên sheet: DataFrame} như `read_df`; thời gian chờ bằng sheet chậm nhất
+    thay vì tổng các sheet.
+
+    `ranges`: {tên sheet: (date_from, date_to)} cho sheet cần khoảng ngày riêng.
+    `errors`: truyền dict để nhận APIError của từng sheet (sheet lỗi không có trong
+    kết quả) thay vì raise lỗi đầu tiên.
+    """
+    ranges = ranges or {}
+    names = list(dict.fromkeys(list(ws_names) + list(ranges)))
+    spans = {n: ranges.get(n, (date_from, date_to)) for n in names}
+    # một sheet, hoặc đang ở trong chính pool đọc (chờ pool của mình có thể treo) -> đọc lần lượt
+    parallel = len(names) > 1 and not threading.current_thread().name.startswith(_READ_THREAD)
+    if parallel:
+        pool = get_read_pool()
+        futures = {n: pool.submit(in_current_run(read_df), n, *spans[n]) for n in names}
+    results, first = {}, None
+    for n in names:
+        try:
+            results[n] = futures[n].result() if parallel else read_df(n, *spans[n])
+        except APIError as e:
+            if errors is None:
+                first = first or e
+            else:
+                errors[n] = e
+    if first is not None:
+        raise first
+    return results
+
+@timed("append_row", payload=1)
+def append_row(ws_name: str, row: list):
+    be = get_backend()
+    if ws_name in ORDER_SHEETS:
+        get_ledger().ensure()
+    be.append_rows(ws_name, [row])
+    if not _queued(be, ws_name):
+        _orders_written(ws_name, [row])
+
+# ============ Ghi block có kiểm tra xung đột (optimistic concurrency) ============
+_LOCKS_LOCK = threading.Lock()
+
+@st.cache_resource(show_spinner=False)
+def get_write_locks() -> dict:
+    # {tên sheet: RLock}: chỉ tuần tự các lần "kiểm tra block + ghi" của cùng một sheet
+    return {}
+
+def _write_lock(ws_name: str) -> threading.RLock:
+    locks = get_write_locks()
+    with _LOCKS_LOCK:
+        return locks.setdefault(ws_name, threading.RLock())
+
+def _check_block(ws_name: str, expected: str, current, block: str):
+    """Đọc lại block từ nguồn (bỏ cache); khác dấu vân tay lúc đọc -> WriteConflict."""
+    if expected is None:
+        return
+    clear_cache(ws_name)
+    if fingerprint(current()) != expected:
+        raise WriteConflict(ws_name, block)
+
+@timed("write_df", payload=1)
+def write_df(ws_name: str, df: pd.DataFrame):
+    with _write_lock(ws_name):
+        get_backend().write_df(ws_name, to_sheet(ws_name, df))
+    if ws_name in ORDER_SHEETS:
+        get_daily_agg().rebuild()
+        get_ledger().rebuild()
+
+@timed("replace_rows_by_date", payload=3)
+def replace_rows_by_date(ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame, date_to=None,
+                         expected: str = None):
+    """Ghi đè các dòng của ngày `date_str` bằng `new_rows`. Có `date_to` thì ghi đè
+    cả khoảng [date_str, date_to] (vd. một tháng chấm công) trong một lần.
+
+    `expected`: fingerprint() của block lúc đọc; block trên sheet đã khác (có người
+    vừa lưu) thì raise WriteConflict và không ghi gì."""
+    old = []
+    with _write_lock(ws_name):
+        _check_block(ws_name, expected, lambda: read_df(ws_name, date_str, date_to if date_to is not None else date_str),
+                     f"{date_str}" if date_to is None else f"{date_str} - {date_to}")
+        if ws_name in ORDER_SHEETS:
+            old = customers([read_df(ws_name, date_str, date_to if date_to is not None else date_str)])
+        get_backend().replace_rows_by_date(ws_name, date_col, date_str, to_sheet(ws_name, new_rows), date_to)
+    if ws_name in ORDER_SHEETS:
+        for day in pd.date_range(parse_date(date_str), parse_date(date_to if date_to is not None else date_str)):
+            get_daily_agg().refresh_day(day.strftime(DATE_FMT_SAVE))
+        get_ledger().refresh(sorted(set(old) | set(customers([new_rows]))))
+
+def month_block(df: pd.DataFrame, months) -> pd.DataFrame:
+    """Các dòng của sheet theo tháng (PAY_RULES, LUONG...) thuộc `months`."""
+    if MONTH_COL not in df.columns:
+        return df.iloc[0:0]
+    return df[in_months(df[MONTH_COL], months)]
+
+@timed("replace_rows_by_month", payload=2)
+def replace_rows_by_month(ws_name: str, months, new_rows: pd.DataFrame, expected: str = None):
+    """Ghi đè các dòng có cột "Tháng" thuộc `months` bằng `new_rows` (sheet theo
+    tháng: PAY_RULES, COMMISSION_RULES, LUONG). Chỉ đụng tới các dòng của các
+    tháng đó, không ghi lại cả sheet. `expected`: như replace_rows_by_date."""
+    months = [m for m in map(norm_month, months) if m]
+    if not months:
+        raise ValueError("Tháng phải có dạng mm/YYYY.")
+    with _write_lock(ws_name):
+        _check_block(ws_name, expected, lambda: month_block(read_df(ws_name), months), ", ".join(months))
+        get_backend().replace_rows_by_month(ws_name, months, to_sheet(ws_name, new_rows))
+
+# ============ DAILY_AGG: cộng dồn mỗi lần ghi đơn (xem utils/aggsheet.py) ============
+def _upkeep() -> dict:
+    """[sheets] UPKEEP_SECONDS: DAILY_AGG & CONG_NO cộng các đơn mới theo lô, trễ tối đa chừng
+    này giây (mặc định 5; 0 = cộng ngay sau mỗi đơn); UPKEEP_ROWS: đủ chừng này đơn thì cộng
+    luôn (mặc định 100). Đơn chờ chỉ nằm trong bộ nhớ: tiến trình chết khi còn đơn chờ thì
+    dựng lại (rebuild_daily_agg, rebuild_ledger)."""
+    return {"delay": float(setting("sheets", "UPKEEP_SECONDS", 5)),
+            "max_rows": int(setting("sheets", "UPKEEP_ROWS", 100))}
+
+@contextmanager
+def _pending_orders():
+    """Giữ khoá các sheet đơn của hàng đợi ghi trong khối with: mỗi đơn hoặc đã lên sheet
+    (và đã giao cho DAILY_AGG/CONG_NO cộng), hoặc còn trong {sheet: dòng chờ} trả về."""
+    q = get_write_queue() if isinstance(get_backend(), SheetsBackend) else None
+    if q is None:
+        yield {}
+        return
+    with q.sheet_lock(ORDER_SHEETS[0]), q.sheet_lock(ORDER_SHEETS[1]):
+        yield {s: q.pending(s) for s in ORDER_SHEETS}
+
+def _read_orders(date_from=None, date_to=None, filters: dict = None) -> dict:
+    if filters:
+        return {s: read_df(s, date_from, date_to, filters) for s in ORDER_SHEETS}
+    return read_many(ORDER_SHEETS, date_from, date_to)
+
+@st.cache_resource(show_spinner=False)
+def get_daily_agg() -> DailyAggSheet:
+    return DailyAggSheet(get_backend(), _read_orders, _pending_orders, _flush_orders, **_upkeep())
+
+def rebuild_daily_agg() -> int:
+    """Dựng lại toàn bộ DAILY_AGG từ XE_MAY + OTO (gồm cả tháng đã chốt). Trả về số dòng tổng hợp."""
+    return get_daily_agg().rebuild()
+
+@timed("daily_agg", sheet=AGG_SHEET)
+def daily_agg(date_from=None, date_to=None) -> pd.DataFrame:
+    """Đọc DAILY_AGG trong khoảng ngày (gồm cả đơn còn trong hàng đợi ghi).
+    Lần đầu thấy DAILY_AGG trống thì tự dựng từ đơn gốc."""
+    return get_daily_agg().read(date_from, date_to)
+
+# ============ Cube doanh thu (xem utils/cube.py) ============
+# Số bảng cube_facts (mỗi tháng đã chốt / phân vùng của mỗi sheet đơn) nhớ lại
+CUBE_MAX_BLOCKS = 256
+
+@st.cache_resource(show_spinner=False)
+def get_cube_blocks() -> SheetCache:
+    return SheetCache(ttl=CACHE_TTL_SECONDS, max_entries=CUBE_MAX_BLOCKS)
+
+def _block_facts(source: str, ws_names: tuple, args: tuple, load, closed=()) -> pd.DataFrame:
+    """cube_facts của một phần dữ liệu đơn (`load()` -> DataFrame như read_df), nhớ theo version
+    của `ws_names`. Dòng thuộc tháng đã chốt (`closed`) bị bỏ như _read_hybrid."""
+    def compute():
+        df = load()
+        if closed and DATE_COL in df.columns:
+            df = df[~month_of(df[DATE_COL]).isin(closed)]
+        return cube_facts({source: df})
+    return cached_by_version("cube_facts", ws_names, (source,) + tuple(args), compute, get_cube_blocks())
+
+def _cube_blocks(source: str) -> list:
+    """cube_facts của một sheet đơn theo từng phần đọc riêng: mỗi tháng đã chốt (kho lịch sử),
+    mỗi phân vùng tháng và phần còn lại. Ghi một đơn chỉ làm tính lại phần chứa đơn đó."""
+    closed = _cold_months(source)
+    blocks = []
+    if closed:
+        store = get_cold_store()
+        stamp = store.stamp(source)
+        blocks += [_block_facts(source, (), (m, stamp), lambda m=m: store.partition(source, m)) for m in closed]
+    be = get_backend()
+    if not isinstance(be, SheetsBackend) or source not in get_partitioned():
+        hot = lambda: apply_schema(source, be.read_df(source))
+        return blocks + [_block_facts(source, (source,), (tuple(closed),), hot, closed)]
+    q = get_write_queue() if source in WRITE_BEHIND_SHEETS else None
+    # như _sheets_read_df: giữ khoá để mỗi đơn hoặc đã ở phân vùng, hoặc còn trong pending
+    with q.sheet_lock(source) if q is not None else nullcontext():
+        for m, title in get_partitions().part_titles(source).items():
+            if m not in closed:
+                part = lambda t=title: apply_schema(source, load_sheets([t])[t])
+                blocks.append(_block_facts(source, (title,), (), part, closed))
+        base = lambda: apply_schema(source, _with_pending(source, load_sheets([source])[source],
+                                                          q.pending(source) if q is not None else []))
+        blocks.append(_block_facts(source, (source,), (tuple(closed),), base, closed))
+    return blocks
+
+@timed("revenue_cube", sheet=ORDER_SHEETS)
+def revenue_cube() -> RevenueCube:
+    """Cube doanh thu trên toàn bộ XE_MAY + OTO (gồm tháng đã chốt và đơn còn trong
+    hàng đợi ghi). Dựng một lần cho mỗi version dữ liệu, dùng chung giữa các session;
+    tháng đã chốt và phân vùng không đổi không phải đọc & tính lại (xem _cube_blocks)."""
+    stamps = tuple(get_cold_store().stamp(s) if _cold_months(s) else None for s in ORDER_SHEETS)
+    return cached_by_version("revenue_cube", ORDER_SHEETS, stamps,
+                             lambda: RevenueCube(pd.concat([f for s in ORDER_SHEETS for f in _cube_blocks(s)],
+                                                           ignore_index=True)))
+
+# ============ CONG_NO: sổ công nợ vỏ & tiền theo khách (xem utils/ledgersheet.py) ============
+@st.cache_resource(show_spinner=False)
+def get_ledger() -> LedgerSheet:
+    return LedgerSheet(get_backend(), _read_orders, _pending_orders, _flush_orders, **_upkeep())
+
+def rebuild_ledger() -> int:
+    """Dựng lại toàn bộ CONG_NO từ XE_MAY + OTO (gồm cả tháng đã chốt). Trả về số khách."""
+    return get_ledger().rebuild()
+
+@timed("customer_ledger", sheet=LEDGER_SHEET)
+def customer_ledger(names=None) -> pd.DataFrame:
+    """Số dư vỏ & tiền của mọi khách (hoặc chỉ `names`), gồm cả đơn còn trong hàng
+    đợi ghi. Lần đầu thấy CONG_NO trống thì tự dựng từ đơn gốc."""
+    return get_ledger().read(names)
+
+def recent_balance(name: str):
+    """Số dư của `name` ngay sau khi lưu đơn mà không đọc CONG_NO (xem LedgerSheet.recent);
+    None thì dùng customer_ledger."""
+    return get_ledger().recent(name)
+
+# ============ Đối chiếu tồn kho theo khoảng ngày ============
+RECON_SHEETS = ("DAILY_CLOSE", "NHAP_HANG") + ORDER_SHEETS
+
+@timed("reconciliation", sheet=RECON_SHEETS)
+def reconciliation(date_from, date_to, products=()) -> pd.DataFrame:
+    """Đối chiếu X + K - Y với xuất thực tế cho mọi ngày trong khoảng (xem utils/reconcile.py).
+    Đọc mỗi sheet một lần cho cả khoảng (các sheet đọc song song); kết quả cache theo version dữ liệu."""
+    d0, d1 = sorted([to_day(date_from), to_day(date_to)])
+    products = tuple(sorted({str(p).strip() for p in products if str(p).strip()}))
+
+    def compute():
+        prev = d0 - np.timedelta64(1, "D")
+        frames = read_many(ORDER_SHEETS, d0, d1, ranges={"DAILY_CLOSE": (prev, d1), "NHAP_HANG": (d0, d1)})
+        return reconcile(d0, d1, frames["DAILY_CLOSE"], frames["NHAP_HANG"],
+                         {s: frames[s] for s in ORDER_SHEETS}, products)
+    return cached_by_version("reconciliation", RECON_SHEETS, (str(d0), str(d1), products), compute).copy()
+
+# ============ Kho lịch sử: tháng đã chốt lưu Parquet cục bộ ============
+@st.cache_resource(show_spinner=False)
+def get_cold_store():
+    """Kho lịch sử nếu có cấu hình [storage] COLD_DIR, không thì None.
+    Thư mục phải được giữ lại giữa các lần khởi động: dòng đã chốt bị xoá khỏi sheet."""
+    root = setting("storage", "COLD_DIR", "")
+    return ColdStore(str(root)) if root else None
+
+def _cold_months(ws_name: str) -> list:
+    store = get_cold_store()
+    return store.months(ws_name) if store is not None and ws_name in COLD_SHEETS else []
+
+def _hot_range(closed: list, date_from, date_to):
+    """Khoảng ngày còn phải đọc từ sheet sau khi bỏ các tháng đã chốt ở hai đầu
+    (None = không giới hạn); không còn ngày nào -> None."""
+    closed = set(closed)
+    lo = None if date_from is None else pd.Timestamp(to_day(date_from))
+    hi = None if date_to is None else pd.Timestamp(to_day(date_to))
+    while lo is not None and lo.strftime(PART_FMT) in closed:
+        lo = lo + pd.offsets.MonthBegin(1)
+    while hi is not None and hi.strftime(PART_FMT) in closed:
+        hi = hi.replace(day=1) - pd.Timedelta(days=1)
+    if lo is not None and hi is not None and lo > hi:
+        return None
+    return lo, hi
+
+def _read_hybrid(ws_name: str, closed: list, date_from=None, date_to=None, filters: dict = None) -> pd.DataFrame:
+    """Tháng đã chốt đọc từ kho lịch sử, phần còn lại (thường chỉ tháng này) từ backend.
+    Dòng trên sheet thuộc tháng đã chốt (ghi muộn) bị bỏ qua cho tới khi chốt lại tháng đó."""
+    frames = [get_cold_store().read(ws_name, date_from, date_to)]
+    hot = _hot_range(closed, date_from, date_to)
+    if hot is not None:
+        df = apply_schema(ws_name, get_backend().read_df(ws_name, hot[0], hot[1], filters))
+        if DATE_COL in df.columns:
+            df = df[~month_of(df[DATE_COL]).isin(closed)]
+        frames.append(df)
+    return apply_filters(concat(ws_name, frames), filters)
+
+@timed("close_month")
+def close_month(ws_name: str, month: str) -> int:
+    """Chuyển các dòng của tháng `month` ('mm/YYYY', tháng đã kết thúc) từ sheet sang
+    kho lịch sử: ghi file Parquet của tháng rồi xoá các dòng đó khỏi sheet (lỗi khi
+    xoá thì trả file về như cũ). Chốt lại tháng đã chốt thì gộp thêm các dòng ghi muộn.
+    DAILY_AGG không đổi. Trả về số dòng đã chuyển."""
+    store = get_cold_store()
+    if store is None:
+        raise RuntimeError("Chưa bật kho lịch sử: đặt [storage] COLD_DIR trong secrets.")
+    if ws_name not in COLD_SHEETS:
+        raise ValueError(f"{ws_name} không chuyển sang kho lịch sử được.")
+    m = norm_month(month)
+    if m is None:
+        raise ValueError(f"Tháng không hợp lệ: {month}")
+    start = pd.to_datetime("01/" + m, format="%d/%m/%Y")
+    end = start + pd.offsets.MonthEnd(1)
+    if end >= pd.Timestamp.today().normalize():
+        raise ValueError(f"Tháng {m} chưa kết thúc.")
+    key = start.strftime(PART_FMT)
+    be = get_backend()
+    rows = apply_schema(ws_name, be.read_df(ws_name, start, end))
+    old = store.partition(ws_name, key)
+    if rows.empty and old is not None:
+        return 0
+    undo = store.put(ws_name, key, concat(ws_name, [old, rows]))
+    try:
+        if not rows.empty:
+            # khung rỗng: chỉ xoá các dòng của tháng, không ghi dòng nào
+            be.replace_rows_by_date(ws_name, DATE_COL, start.strftime(DATE_FMT_SAVE), pd.DataFrame(),
+                                    end.strftime(DATE_FMT_SAVE))
+    except Exception:
+        undo()
+        raise
+    store.commit(ws_name, key)
+    return len(rows)
@@ -0,0 +1,78 @@
+# utils/ledger.py
+import pandas as pd
+
+from .dates import parse_dates, DATE_FMT_SAVE
+from .schema import num_col, text_col
+
+LEDGER_SHEET = "CONG_NO"
+CUSTOMER_COL = "Khách hàng"
+MEASURES = ["Số đơn", "Vỏ đi", "Vỏ về", "Tiền hàng", "Đã trả"]
+BALANCES = ["Vỏ còn nợ", "Còn nợ"]
+LEDGER_COLS = [CUSTOMER_COL] + MEASURES + BALANCES + ["Đơn cuối"]
+
+# PP thanh toán ghi nợ: tiền hàng tính vào công nợ, chưa thu
+CREDIT_METHODS = {"kí giấy", "ký giấy"}
+
+# cột số lượng của từng sheet đơn
+_QTY = {"XE_MAY": "Số lượng giao", "OTO": "Số lượng"}
+
+def order_entries(source: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Mỗi đơn (dòng của XE_MAY/OTO) -> phát sinh trong sổ công nợ của khách.
+
+    Vỏ như DAILY_AGG: XE_MAY vỏ đi = số lượng giao, vỏ về lấy số ('x' -> 0);
+    OTO không tính vỏ. "Thanh Toán" của đơn có hàng là tiền hàng; đơn trả bằng
+    PP ghi nợ (Kí Giấy) chưa thu, PP khác coi như đã trả. Dòng số lượng 0 có
+    tiền là khách trả nợ (chỉ cộng "Đã trả"); dòng số lượng 0 có vỏ về là trả
+    vỏ. Dòng không có tên khách bị bỏ.
+    """
+    if df is None or df.empty or CUSTOMER_COL not in df.columns:
+        return pd.DataFrame(columns=LEDGER_COLS)
+    kh = text_col(df, CUSTOMER_COL)
+    df, kh = df[kh != ""], kh[kh != ""]
+    qty = num_col(df, _QTY[source])
+    money = num_col(df, "Thanh Toán")
+    credit = text_col(df, "PP Thanh toán").str.casefold().isin(CREDIT_METHODS)
+    days = parse_dates(df["Ngày"]) if "Ngày" in df.columns else pd.Series(pd.NaT, index=df.index)
+    return pd.DataFrame({
+        CUSTOMER_COL: kh,
+        "Số đơn": (qty > 0).astype(int),
+        "Vỏ đi": qty if source == "XE_MAY" else 0.0,
+        "Vỏ về": num_col(df, "Vỏ về") if source == "XE_MAY" else 0.0,
+        "Tiền hàng": money.where(qty > 0, 0.0),
+        "Đã trả": money.where(~credit, 0.0),
+        "Đơn cuối": days.dt.strftime(DATE_FMT_SAVE).where(days.notna(), None),
+    }, index=df.index)
+
+def ledger(frames) -> pd.DataFrame:
+    """Cộng các phát sinh (order_entries hoặc các dòng CONG_NO) theo khách, tính lại số dư.
+
+    Sổ + phát sinh mới = sổ mới, nên cập nhật từng đơn và dựng lại từ đầu cho
+    cùng kết quả.
+    """
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=LEDGER_COLS)
+    df = pd.concat([f.reindex(columns=[CUSTOMER_COL] + MEASURES + ["Đơn cuối"]) for f in frames], ignore_index=True)
+    df[CUSTOMER_COL] = text_col(df, CUSTOMER_COL)
+    df = df[df[CUSTOMER_COL] != ""]
+    for c in MEASURES:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
+    df["_d"] = parse_dates(df["Đơn cuối"])
+    out = df.groupby(CUSTOMER_COL, as_index=False, sort=True).agg(
+        **{c: (c, "sum") for c in MEASURES}, _d=("_d", "max"))
+    out["Vỏ còn nợ"] = out["Vỏ đi"] - out["Vỏ về"]
+    out["Còn nợ"] = out["Tiền hàng"] - out["Đã trả"]
+    out["Đơn cuối"] = out["_d"].dt.strftime(DATE_FMT_SAVE).where(out["_d"].notna(), None)
+    for c in MEASURES + BALANCES:
+        if (out[c] % 1 == 0).all():
+            out[c] = out[c].astype("int64")
+    return out[LEDGER_COLS].reset_index(drop=True)
+
+def customers(frames) -> list:
+    """Tên khách (đã strip, bỏ trống) xuất hiện trong các bảng đơn."""
+    names = set()
+    for f in frames:
+        if f is not None and not f.empty and CUSTOMER_COL in f.columns:
+            names |= set(text_col(f, CUSTOMER_COL)) - {""}
+    return sorted(names)
+
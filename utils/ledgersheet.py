@@ -0,0 +1,97 @@
+# utils/ledgersheet.py
+import pandas as pd
+
+from .aggsheet import DerivedSheet, typed_rows
+from .dailyagg import ORDER_SHEETS
+from .ledger import LEDGER_SHEET, CUSTOMER_COL, order_entries, ledger
+from .schema import apply_schema
+
+class LedgerSheet(DerivedSheet):
+    """CONG_NO: sổ công nợ vỏ & tiền theo khách (cách tính xem utils/ledger.py), cộng dồn
+    mỗi lần ghi đơn.
+
+    Tham số như DerivedSheet; `read_orders` nhận thêm `filters`
+    (vd. {"Khách hàng": [...]}) để chỉ đọc đơn của vài khách.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {khách: dòng CONG_NO app vừa ghi} để báo số dư sau khi lưu đơn mà không đọc lại sheet
+        self.balances = {}
+
+    def ensure(self):
+        """Lần đầu (mỗi tiến trình) thấy CONG_NO trống thì dựng từ đơn gốc, để số dư
+        cộng dồn sau đó có đủ lịch sử."""
+        if self.checked:
+            return
+        self.checked = True
+        try:
+            if self.backend.read_df(LEDGER_SHEET).empty:
+                self.rebuild()
+        except Exception as e:   # không chặn việc ghi đơn; lần sau thử lại
+            self.checked, self.error = False, e
+
+    def _write(self, names: list, rows: pd.DataFrame):
+        self.backend.replace_rows_by_key(LEDGER_SHEET, CUSTOMER_COL, names, rows)
+        for n in names:
+            self.balances.pop(n, None)
+        self.balances.update({r[CUSTOMER_COL]: rows.iloc[[i]] for i, r in enumerate(rows.to_dict("records"))})
+
+    def _apply(self, ws_name: str, rows: list):
+        # chỉ ghi lại số dư của những khách có trong các đơn
+        delta = ledger([order_entries(ws_name, typed_rows(ws_name, rows))])
+        if delta.empty:
+            return
+        names = delta[CUSTOMER_COL].tolist()
+        with self._lock:
+            cur = apply_schema(LEDGER_SHEET, self.backend.read_df(LEDGER_SHEET, filters={CUSTOMER_COL: names}))
+            self._write(names, ledger([cur, delta]))
+
+    def refresh(self, names: list):
+        """Tính lại số dư của các khách `names` từ toàn bộ đơn của họ (sau khi sửa/ghi đè đơn)."""
+        if not names:
+            return
+        try:
+            with self._held():
+                self.flush_upkeep()
+                frames = [order_entries(s, d) for s, d in
+                          self.read_orders(None, None, {CUSTOMER_COL: names}).items()]
+                with self._lock:
+                    self._write(names, ledger(frames))
+        except Exception as e:
+            self.error = e
+
+    def rebuild(self) -> int:
+        """Dựng lại toàn bộ CONG_NO từ XE_MAY + OTO. Trả về số khách."""
+        with self._rebuilding():
+            out = ledger([order_entries(s, d) for s, d in self.read_orders(None, None).items()])
+            with self._lock:
+                self.backend.write_df(LEDGER_SHEET, out)
+                self.balances.clear()
+        return len(out)
+
+    def read(self, names=None) -> pd.DataFrame:
+        """Số dư của mọi khách (hoặc chỉ `names`), gồm cả đơn chưa cộng vào (còn trong các hàng đợi)."""
+        self.ensure()
+        names = [str(n).strip() for n in names or () if str(n).strip()] or None
+        flt = {CUSTOMER_COL: names} if names else None
+        with self.unapplied() as queued:
+            cur = apply_schema(LEDGER_SHEET, self.backend.read_df(LEDGER_SHEET, filters=flt))
+            pend = [order_entries(s, typed_rows(s, queued[s])) for s in ORDER_SHEETS if queued.get(s)]
+        if names:
+            pend = [p[p[CUSTOMER_COL].isin(names)] for p in pend]
+        return ledger([cur] + pend)
+
+    def recent(self, name: str):
+        """Số dư của `name` ngay sau khi lưu đơn, không đọc CONG_NO: dòng app vừa ghi cho khách
+        cộng các đơn chưa cộng vào. None nếu tiến trình chưa ghi số dư của khách này
+        hoặc lần cập nhật gần nhất lỗi (khi đó dùng `read`)."""
+        name = str(name).strip()
+        if self.error is not None:
+            return None
+        with self.unapplied() as queued:
+            base = self.balances.get(name)
+            pend = [order_entries(s, typed_rows(s, queued[s])) for s in ORDER_SHEETS if queued.get(s)]
+        if base is None or not pend:
+            return base
+        return ledger([base] + [p[p[CUSTOMER_COL] == name] for p in pend])
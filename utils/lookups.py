@@ -0,0 +1,51 @@
+# utils/lookups.py
+import bisect
+import threading
+
+import pandas as pd
+
+class LookupCatalog:
+    """Chỉ mục LOOKUPS: Loại -> danh sách Giá trị đã sắp xếp.
+
+    Dựng một lần từ DataFrame của sheet LOOKUPS (`source`), sau đó `add` cập
+    nhật tăng dần, không cần quét lại cả sheet.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._index = {}
+        self.source = None   # DataFrame đã dùng để dựng chỉ mục
+
+    def load(self, df: pd.DataFrame):
+        index = {}
+        if df is not None and not df.empty and {"Loại", "Giá trị"} <= set(df.columns):
+            sub = df[["Loại", "Giá trị"]].dropna().astype(str)
+            sub = sub.apply(lambda s: s.str.strip())
+            sub = sub[(sub["Loại"] != "") & (sub["Giá trị"] != "")].drop_duplicates()
+            for kind, vals in sub.groupby("Loại")["Giá trị"]:
+                index[kind] = sorted(vals)
+        with self._lock:
+            self._index = index
+            self.source = df
+
+    def values(self, kind: str) -> list:
+        with self._lock:
+            return list(self._index.get(str(kind).strip(), []))
+
+    def has(self, kind: str, value: str) -> bool:
+        with self._lock:
+            vals = self._index.get(str(kind).strip(), [])
+            value = str(value).strip()
+            i = bisect.bisect_left(vals, value)
+            return i < len(vals) and vals[i] == value
+
+    def add(self, kind: str, value: str) -> bool:
+        """Thêm giá trị vào chỉ mục; trả về False nếu đã có."""
+        kind, value = str(kind).strip(), str(value).strip()
+        if not kind or not value:
+            return False
+        with self._lock:
+            if self.has(kind, value):
+                return False
+            bisect.insort(self._index.setdefault(kind, []), value)
+            return True
@@ -0,0 +1,182 @@
+# utils/metrics.py
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx, add_script_run_ctx
+
+# Mỗi lệnh gọi một dòng JSON; bật bằng cấu hình logging hoặc [diagnostics] JSON_LOG
+log = logging.getLogger("ngocvu.sheets")
+
+_run = threading.local()
+_run_ids = itertools.count(1)
+
+def begin_run(page: str):
+    """Đánh dấu đầu một lần chạy trang (gọi ở đầu mỗi trang). Các lệnh gọi
+    sau đó trên cùng thread được gắn session + lần chạy này."""
+    ctx = get_script_run_ctx()
+    _run.session = ctx.session_id if ctx is not None else "local"
+    _run.run = next(_run_ids)
+    _run.page = page
+
+def current_run():
+    """(session, run, page) của thread hiện tại; thread nền -> ("nền", 0, "")."""
+    return (getattr(_run, "session", "nền"), getattr(_run, "run", 0), getattr(_run, "page", ""))
+
+def in_current_run(fn):
+    """Bọc `fn` để chạy trên thread khác (vd. thread pool đọc sheet) mà vẫn gắn với
+    session + lần chạy trang hiện tại, kể cả ngữ cảnh Streamlit của lần chạy."""
+    ctx = get_script_run_ctx()
+    session, run, page = current_run()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, ctx)
+        _run.session, _run.run, _run.page = session, run, page
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # thread của pool được dùng lại cho lần chạy khác
+            add_script_run_ctx(thread, None)
+            del _run.session, _run.run, _run.page
+    return wrapper
+
+class Metrics:
+    """Đếm & đo thời gian các lệnh gọi Sheets.
+
+    `layer`: "gs" = hàm public của utils.gs (read_df, append_row...),
+    "api" = request HTTP thật tới Google (mỗi request tốn 1 đơn vị hạn mức),
+    "ui" = một đoạn của trang (vd. một tab), xem `span`.
+    Giữ `max_records` bản ghi gần nhất (để gộp theo lần chạy) và cộng dồn
+    theo session.
+    """
+
+    FIELDS = ["calls", "seconds", "rows", "cells", "bytes", "errors"]
+
+    def __init__(self, max_records: int = 20000):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_records)
+        self._sessions = {}   # session -> {(layer, sheet): [calls, seconds, rows, cells, bytes, errors]}
+
+    def record(self, op: str, sheet: str = None, rows: int = 0, cells: int = 0, nbytes: int = 0,
+               seconds: float = 0.0, layer: str = "gs", ok: bool = True, **extra):
+        session, run, page = current_run()
+        rec = {"ts": round(time.time(), 3), "layer": layer, "op": op, "sheet": sheet or "",
+               "rows": int(rows), "cells": int(cells), "bytes": int(nbytes),
+               "ms": round(seconds * 1000, 1), "ok": ok,
+               "session": session, "run": run, "page": page, **extra}
+        with self._lock:
+            self._records.append(rec)
+            acc = self._sessions.setdefault(session, {}).setdefault((layer, rec["sheet"]), [0, 0.0, 0, 0, 0, 0])
+            for i, v in enumerate((1, seconds, rec["rows"], rec["cells"], rec["bytes"], 0 if ok else 1)):
+                acc[i] += v
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps(rec, ensure_ascii=False, default=str))
+
+    def records(self, session: str = None, run: int = None) -> pd.DataFrame:
+        with self._lock:
+            recs = [r for r in self._records
+                    if (session is None or r["session"] == session) and (run is None or r["run"] == run)]
+        return pd.DataFrame(recs)
+
+    def session_summary(self, session: str = None) -> pd.DataFrame:
+        """Tổng theo (layer, sheet) của một session (None = mọi session)."""
+        with self._lock:
+            sessions = [self._sessions.get(session, {})] if session is not None else list(self._sessions.values())
+            rows = [(layer, sheet, *acc) for s in sessions for (layer, sheet), acc in s.items()]
+        df = pd.DataFrame(rows, columns=["layer", "sheet"] + self.FIELDS)
+        if df.empty:
+            return df
+        return (df.groupby(["layer", "sheet"], as_index=False)[self.FIELDS].sum()
+                  .sort_values("seconds", ascending=False, ignore_index=True))
+
+    def run_summary(self, session: str) -> pd.DataFrame:
+        """Mỗi lần chạy trang của session: số lệnh gọi, số request API, tổng thời gian."""
+        df = self.records(session=session)
+        if df.empty:
+            return df
+        df["api"] = df["layer"] == "api"
+        df["gs"] = df["layer"] == "gs"
+        df["gs_ms"] = df["ms"].where(df["gs"], 0)
+        out = df.groupby(["run", "page"], as_index=False).agg(
+            calls=("gs", "sum"), api_calls=("api", "sum"),
+            ms=("gs_ms", "sum"), bytes=("bytes", "sum"))
+        return out.sort_values("run", ascending=False, ignore_index=True)
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self._sessions.clear()
+
+@st.cache_resource(show_spinner=False)
+def get_metrics() -> Metrics:
+    # [diagnostics] JSON_LOG = "sheets_calls.jsonl": ghi log JSON ra file
+    from .auth import setting
+    path = setting("diagnostics", "JSON_LOG")
+    if path:
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+    return Metrics()
+
+@contextmanager
+def span(name: str):
+    """Đo thời gian một đoạn của trang, vd. `with tab1, span("Thống kê"):`."""
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        get_metrics().record("span", name, seconds=time.perf_counter() - t0, layer="ui", ok=ok)
+
+def _size(obj):
+    """(rows, cells) của kết quả/đầu vào: DataFrame, dict các DataFrame hoặc một dòng (list)."""
+    if isinstance(obj, pd.DataFrame):
+        return len(obj), obj.size
+    if isinstance(obj, dict):
+        sizes = [_size(v) for v in obj.values()]
+        return sum(r for r, _ in sizes), sum(c for _, c in sizes)
+    if isinstance(obj, (list, tuple)) and obj and not isinstance(obj[0], (list, tuple)):
+        return 1, len(obj)
+    return 0, 0
+
+def _sheet_of(sheet, args, kwargs) -> str:
+    if callable(sheet):
+        sheet = sheet(*args, **kwargs)
+    elif sheet is None:
+        sheet = args[0] if args else next(iter(kwargs.values()), "")
+    if isinstance(sheet, (list, tuple)):
+        sheet = ",".join(sheet)
+    return sheet or ""
+
+def timed(op: str, payload: int = None, sheet=None):
+    """Đo một hàm của utils.gs. `sheet`: tên sheet cố định (str hoặc tuple tên) hoặc hàm nhận
+    cùng tham số trả về tên; bỏ trống thì lấy tham số đầu (tên sheet hoặc list tên sheet).
+    Số dòng/ô lấy từ kết quả, hoặc từ tham số thứ `payload` với hàm ghi."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            ok, out = False, None
+            try:
+                out = fn(*args, **kwargs)
+                ok = True
+                return out
+            finally:
+                name = _sheet_of(sheet, args, kwargs)
+                data = args[payload] if payload is not None and len(args) > payload else out
+                rows, cells = _size(data)
+                get_metrics().record(op, name, rows=rows, cells=cells,
+                                     seconds=time.perf_counter() - t0, ok=ok)
+        return wrapper
+    return deco
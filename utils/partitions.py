@@ -0,0 +1,43 @@
+# utils/partitions.py
+import re
+
+import pandas as pd
+
+from .coldstore import PART_FMT, month_of
+from .dates import to_day
+
+# Sheet chia theo tháng: XE_MAY -> XE_MAY_2025_08, XE_MAY_2025_09...
+# Sheet gốc (XE_MAY) vẫn giữ lại: dòng chưa chuyển và dòng không đọc được ngày.
+
+def partition_name(base: str, month: str) -> str:
+    """'XE_MAY', '2025-08' -> 'XE_MAY_2025_08'."""
+    return f"{base}_{month[:4]}_{month[5:7]}"
+
+def partition_month(base: str, title: str):
+    """'XE_MAY_2025_08' -> '2025-08'; không phải phân vùng của `base` -> None."""
+    m = re.fullmatch(re.escape(base) + r"_(\d{4})_(\d{2})", title)
+    return f"{m.group(1)}-{m.group(2)}" if m else None
+
+def base_of(title: str) -> str:
+    """Tên sheet gốc của một phân vùng (tên khác giữ nguyên)."""
+    return re.sub(r"_\d{4}_\d{2}$", "", title)
+
+def partitions_of(base: str, titles) -> dict:
+    """{tháng: tên sheet} các phân vùng của `base` trong danh sách tên sheet, theo tháng."""
+    found = ((partition_month(base, t), t) for t in titles)
+    return dict(sorted((m, t) for m, t in found if m is not None))
+
+def months_between(months, date_from=None, date_to=None) -> list:
+    """Các tháng (khoá 'YYYY-mm') giao với khoảng ngày (None = không giới hạn)."""
+    lo = None if date_from is None else pd.Timestamp(to_day(date_from)).strftime(PART_FMT)
+    hi = None if date_to is None else pd.Timestamp(to_day(date_to)).strftime(PART_FMT)
+    return [m for m in months if (lo is None or m >= lo) and (hi is None or m <= hi)]
+
+def route_rows(base: str, rows: list, date_pos: int) -> dict:
+    """Chia các dòng (list giá trị) theo tháng của ô ngày ở vị trí `date_pos`:
+    {tên sheet: [dòng]}; dòng không đọc được ngày ở lại sheet gốc."""
+    keys = month_of([r[date_pos] if date_pos < len(r) else "" for r in rows])
+    out = {}
+    for key, row in zip(keys, rows):
+        out.setdefault(base if pd.isna(key) else partition_name(base, key), []).append(row)
+    return out
@@ -0,0 +1,110 @@
+# utils/partsheet.py
+import numpy as np
+import pandas as pd
+
+from .backend import DATE_COL
+from .coldstore import PART_FMT, month_of
+from .dates import parse_date, filter_dates, in_days, DATE_FMT_SAVE
+from .partitions import partition_name, partitions_of, months_between, route_rows
+from .schema import cell
+from .writequeue import PartialSend
+
+class PartitionedSheets:
+    """Đọc/ghi các sheet chia theo tháng (XE_MAY -> XE_MAY_2025_08...) qua các phân vùng
+    (tên phân vùng & chia dòng theo tháng xem utils/partitions.py).
+
+    Không tự gọi Google Sheets: các hàm đọc/ghi MỘT worksheet được truyền vào lúc tạo
+    (utils.gs: worksheet_titles, load_sheets, append_sheet_rows, write_sheet, replace_sheet_rows).
+    `names`: các sheet đang chia; `columns`: {sheet: cột chuẩn} để biết vị trí cột "Ngày".
+    Version cache của sheet gốc do nơi gọi tăng sau mỗi lần ghi.
+    """
+
+    def __init__(self, names, columns: dict, titles, load, append, write, replace):
+        self.names = frozenset(names)
+        self.columns = columns
+        self.titles = titles
+        self.load = load
+        self.append = append
+        self.write = write
+        self.replace = replace
+
+    def __contains__(self, ws_name: str) -> bool:
+        return ws_name in self.names
+
+    def part_titles(self, ws_name: str) -> dict:
+        """{tháng 'YYYY-mm': tên worksheet} các phân vùng hiện có của sheet."""
+        return partitions_of(ws_name, self.titles())
+
+    def read(self, ws_name: str, date_from=None, date_to=None) -> pd.DataFrame:
+        """Sheet gốc + các phân vùng giao với khoảng ngày, nạp trong một batchGet.
+        Index đánh lại từ 0 (không còn là vị trí dòng trên sheet)."""
+        have = self.part_titles(ws_name)
+        titles = [have[m] for m in months_between(have, date_from, date_to)]
+        frames = self.load([ws_name] + titles)
+        parts = [frames[n] for n in [ws_name] + titles if not frames[n].empty]
+        df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else (parts[0] if parts else frames[ws_name])
+        if date_from is None and date_to is None:
+            return df
+        return filter_dates(df, date_from, date_to).reset_index(drop=True)
+
+    def append_rows(self, ws_name: str, rows: list):
+        """Append theo phân vùng, mỗi phân vùng một request. Phân vùng sau lỗi khi các phân vùng
+        trước đã ghi xong -> PartialSend với đúng các dòng chưa ghi (gửi lại không bị trùng)."""
+        routed = list(route_rows(ws_name, rows, self.columns[ws_name].index(DATE_COL)).items())
+        sent = []
+        for i, (title, part) in enumerate(routed):
+            try:
+                self.append(title, part)
+            except Exception as e:
+                if not sent:
+                    raise
+                raise PartialSend(sent, [r for _, p in routed[i:] for r in p]) from e
+            sent += part
+
+    def write_df(self, ws_name: str, df: pd.DataFrame):
+        out = df.reset_index(drop=True)
+        keys = month_of(out[DATE_COL]) if DATE_COL in out.columns else pd.Series(np.nan, index=out.index)
+        # tháng không còn dòng nào thì phân vùng đó cũng phải trống
+        for m in sorted(set(self.part_titles(ws_name)) | set(keys.dropna())):
+            self.write(partition_name(ws_name, m), out[keys == m])
+        self.write(ws_name, out[keys.isna()])
+
+    def replace_rows_by_date(self, ws_name: str, date_col: str, date_str: str, new_rows: pd.DataFrame,
+                             date_to=None):
+        lo = parse_date(date_str)
+        hi = parse_date(date_to) if date_to is not None else lo
+        new = new_rows.copy()
+        new.columns = [str(c).strip() for c in new.columns]
+        keys = month_of(new[date_col]) if date_col in new.columns else pd.Series(np.nan, index=new.index)
+        have = self.part_titles(ws_name)
+        # khoảng ngày cắt theo từng tháng, mỗi tháng ghi đè trong phân vùng của nó
+        for p in pd.period_range(lo, hi, freq="M"):
+            m = p.strftime(PART_FMT)
+            part = new[keys == m]
+            if m not in have and part.empty:
+                continue
+            a, b = max(lo, p.start_time), min(hi, p.end_time.normalize())
+            self.replace(partition_name(ws_name, m), date_col, a.strftime(DATE_FMT_SAVE), part,
+                         b.strftime(DATE_FMT_SAVE))
+        # dòng cũ của khoảng ngày còn nằm trong sheet gốc (chưa chuyển sang phân vùng)
+        base = self.load([ws_name])[ws_name]
+        if date_col in base.columns and in_days(base[date_col], date_str, date_to).any():
+            self.replace(ws_name, date_col, date_str, pd.DataFrame(), date_to)
+
+    def migrate(self, ws_name: str) -> dict:
+        """Chuyển các dòng còn trong sheet gốc sang phân vùng theo tháng, từng tháng một:
+        append vào XE_MAY_YYYY_MM (tạo nếu chưa có) rồi xoá các dòng đó khỏi sheet gốc.
+        Chạy lại chỉ chuyển phần còn lại; dòng không đọc được ngày ở lại sheet gốc.
+        Trả về {tên phân vùng: số dòng đã chuyển}."""
+        base = self.load([ws_name])[ws_name]
+        keys = month_of(base[DATE_COL]) if DATE_COL in base.columns else pd.Series(dtype=object)
+        moved = {}
+        for m in sorted(keys.dropna().unique()):
+            title = partition_name(ws_name, m)
+            block = base[keys == m]
+            self.append(title, [[cell(v) for v in row] for row in block.itertuples(index=False, name=None)])
+            start = pd.Timestamp(m + "-01")
+            self.replace(ws_name, DATE_COL, start.strftime(DATE_FMT_SAVE), pd.DataFrame(),
+                         (start + pd.offsets.MonthEnd(1)).strftime(DATE_FMT_SAVE))
+            moved[title] = len(block)
+        return moved
@@ -0,0 +1,129 @@
+# utils/payroll.py
+import re
+
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates
+from .schema import num_col, text_col
+
+MONTH_FMT = "%m/%Y"
+DEFAULT_DON_GIA_CONG = 250000
+FALLBACK_RATE = 0.02  # hoa hồng 2% doanh thu khi không có quy tắc nào áp dụng
+
+PAY_COLS = ["Luong_co_ban", "Don_gia_cong", "Phu_cap", "Tam_ung", "Khau_tru"]
+PAY_DEFAULTS = {"Luong_co_ban": 0, "Don_gia_cong": DEFAULT_DON_GIA_CONG, "Phu_cap": 0, "Tam_ung": 0, "Khau_tru": 0}
+PAYROLL_COLS = ["Tháng", "Nhân viên", "Công", "Luong_co_ban_tinh", "Phu_cap", "Hoa_hồng", "Tam_ung", "Khau_tru", "Tổng lương"]
+# cột bảng lương -> cột sheet LUONG
+LUONG_NAMES = {"Luong_co_ban_tinh": "Lương cơ bản", "Phu_cap": "Phụ cấp", "Hoa_hồng": "Hoa hồng",
+               "Tam_ung": "Tạm ứng", "Khau_tru": "Khấu trừ"}
+LUONG_COLS = ["Tháng", "Nhân viên", "Công", "Lương cơ bản", "Phụ cấp", "Hoa hồng", "Tạm ứng", "Khấu trừ", "Tổng lương"]
+
+def _month_of(values) -> pd.Series:
+    """Cột ngày -> 'mm/YYYY' (NaN nếu không đọc được ngày)."""
+    return parse_dates(values).dt.strftime(MONTH_FMT)
+
+def norm_month(value):
+    """'8/2025', '08/2025', '08-2025' -> '08/2025'; sai định dạng -> None."""
+    m = re.fullmatch(r"\s*(\d{1,2})\s*[/-]\s*(\d{4})\s*", str(value))
+    if not m or not 1 <= int(m.group(1)) <= 12:
+        return None
+    return f"{int(m.group(1)):02d}/{m.group(2)}"
+
+def parse_months(text: str) -> list:
+    """Chuỗi người dùng nhập -> list tháng 'mm/YYYY' theo thứ tự thời gian.
+
+    Nhận nhiều mục cách nhau bởi dấu phẩy/chấm phẩy: '08/2025', cả năm '2025',
+    hoặc khoảng '01/2025-06/2025'. Mục sai định dạng bị bỏ qua.
+    """
+    out = []
+    for part in re.split(r"[,;]", text or ""):
+        part = part.strip()
+        if re.fullmatch(r"\d{4}", part):
+            out += [f"{m:02d}/{part}" for m in range(1, 13)]
+            continue
+        rng = re.fullmatch(r"(\d{1,2}\s*[/-]\s*\d{4})\s*-\s*(\d{1,2}\s*[/-]\s*\d{4})", part)
+        ends = [norm_month(e) for e in rng.groups()] if rng else [norm_month(part)]
+        if len(ends) == 1 and ends[0]:
+            out.append(ends[0])
+        elif len(ends) == 2 and all(ends):
+            a, b = (pd.Period(pd.to_datetime("01/" + e, format="%d/" + MONTH_FMT), "M") for e in ends)
+            out += [p.strftime(MONTH_FMT) for p in pd.period_range(min(a, b), max(a, b), freq="M")]
+    return sorted(set(out), key=lambda m: (m[3:], m[:2]))
+
+def months_range(months: list):
+    """(ngày đầu tháng sớm nhất, ngày cuối tháng muộn nhất) để đọc theo khoảng ngày."""
+    if not months:
+        return None, None
+    starts = pd.to_datetime(["01/" + m for m in months], format="%d/" + MONTH_FMT)
+    return starts.min(), starts.max() + pd.offsets.MonthEnd(1)
+
+def _rules(df: pd.DataFrame, months: list, key: str) -> pd.DataFrame:
+    """Các dòng PAY_RULES/COMMISSION_RULES của `months`; trùng (Tháng, key) lấy dòng cuối."""
+    if df is None or df.empty or "Tháng" not in df.columns or key not in df.columns:
+        return pd.DataFrame(columns=["Tháng", key])
+    df = df.assign(**{"Tháng": df["Tháng"].map(norm_month), key: df[key].astype(str).str.strip()})
+    df = df[df["Tháng"].isin(months)]
+    return df.drop_duplicates(["Tháng", key], keep="last")
+
+def payroll(months: list, cong: pd.DataFrame, orders: pd.DataFrame,
+            pay_rules: pd.DataFrame, com_rules: pd.DataFrame) -> pd.DataFrame:
+    """Bảng lương cho mọi tháng trong `months` trong một lượt (cột PAYROLL_COLS).
+
+    - Công: tổng "Công" của CONG theo (tháng, nhân viên).
+    - Lương cơ bản: Luong_co_ban của PAY_RULES nếu > 0, không thì Công × Don_gia_cong.
+    - Hoa hồng theo từng (người chở, sản phẩm) của XE_MAY: ưu tiên hoa hồng mỗi
+      đơn vị, rồi tới tỉ lệ %; nếu tổng bằng 0 thì lấy 2% doanh thu.
+    """
+    months = [m for m in dict.fromkeys(norm_month(m) for m in months) if m]
+
+    if cong is not None and not cong.empty:
+        c = pd.DataFrame({"Tháng": _month_of(cong["Ngày"]),
+                          "Nhân viên": text_col(cong, "Nhân viên"),
+                          "Công": num_col(cong, "Công", 0.0)})
+        cong_sum = c[c["Tháng"].isin(months) & c["Nhân viên"].ne("")].groupby(["Tháng", "Nhân viên"], as_index=False)["Công"].sum()
+    else:
+        cong_sum = pd.DataFrame(columns=["Tháng", "Nhân viên", "Công"])
+
+    if orders is not None and not orders.empty:
+        o = pd.DataFrame({"Tháng": _month_of(orders["Ngày"]),
+                          "Nhân viên": text_col(orders, "Người chở"),
+                          "Loại sản phẩm": text_col(orders, "Loại sản phẩm"),
+                          "SL": num_col(orders, "Số lượng giao"), "DT": num_col(orders, "Thanh Toán")})
+        # đơn thiếu người chở không tính hoa hồng cho ai (như vòng lặp cũ: groupby bỏ NaN)
+        by_sp = o[o["Tháng"].isin(months) & o["Nhân viên"].ne("")].groupby(["Tháng", "Nhân viên", "Loại sản phẩm"], as_index=False)[["SL", "DT"]].sum()
+    else:
+        by_sp = pd.DataFrame(columns=["Tháng", "Nhân viên", "Loại sản phẩm", "SL", "DT"])
+
+    # hoa hồng: mỗi (tháng, NV, sản phẩm) một dòng, áp quy tắc của tháng đó
+    com = _rules(com_rules, months, "Loại sản phẩm")
+    j = by_sp.merge(com.reindex(columns=["Tháng", "Loại sản phẩm", "Ty_le_%", "Hoa_hong_moi_donvi"]),
+                    on=["Tháng", "Loại sản phẩm"], how="left")
+    rate = num_col(j, "Ty_le_%", 0.0)
+    per_unit = np.trunc(num_col(j, "Hoa_hong_moi_donvi"))
+    j["HH"] = np.where(per_unit > 0, j["SL"].astype(float) * per_unit,
+                       np.where(rate > 0, j["DT"].astype(float) * rate / 100.0, 0.0))
+    by_nv = j.groupby(["Tháng", "Nhân viên"], as_index=False).agg(DoanhThu=("DT", "sum"), HH=("HH", "sum"))
+    by_nv["Hoa_hồng"] = by_nv["HH"].where(by_nv["HH"] != 0, by_nv["DoanhThu"] * FALLBACK_RATE).round(0)
+
+    df = cong_sum.merge(by_nv[["Tháng", "Nhân viên", "Hoa_hồng"]], on=["Tháng", "Nhân viên"], how="outer")
+    pay = _rules(pay_rules, months, "Nhân viên")
+    df = df.merge(pay.reindex(columns=["Tháng", "Nhân viên"] + PAY_COLS), on=["Tháng", "Nhân viên"], how="left")
+    df["Công"] = num_col(df, "Công", 0.0)
+    df["Hoa_hồng"] = num_col(df, "Hoa_hồng")
+    for c, default in PAY_DEFAULTS.items():
+        df[c] = num_col(df, c, default)
+
+    base_from_day = (df["Công"] * df["Don_gia_cong"]).round(0)
+    df["Luong_co_ban_tinh"] = df["Luong_co_ban"].where(df["Luong_co_ban"] > 0, base_from_day)
+    df["Tổng lương"] = (df["Luong_co_ban_tinh"] + df["Phu_cap"] + df["Hoa_hồng"] - df["Tam_ung"] - df["Khau_tru"]).round(0)
+    for col in ["Luong_co_ban_tinh", "Phu_cap", "Hoa_hồng", "Tam_ung", "Khau_tru", "Tổng lương"]:
+        df[col] = df[col].astype("int64")
+
+    order = pd.to_datetime("01/" + df["Tháng"], format="%d/" + MONTH_FMT)
+    df = df.assign(_m=order).sort_values(["_m", "Nhân viên"], kind="stable")
+    return df[PAYROLL_COLS].reset_index(drop=True)
+
+def to_luong(df: pd.DataFrame) -> pd.DataFrame:
+    """Bảng lương -> các dòng sheet LUONG (tên cột theo sheet)."""
+    return df.rename(columns=LUONG_NAMES)[LUONG_COLS].reset_index(drop=True)
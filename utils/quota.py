@@ -0,0 +1,195 @@
+# utils/quota.py
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import unquote
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+from .metrics import get_metrics
+
+# Mã lỗi nên thử lại: quá hạn mức, hết thời gian chờ, lỗi phía Google
+RETRY_CODES = {408, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Giới hạn `per_minute` request/phút, cho phép dồn tối đa `burst` request."""
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(per_minute / 6.0, 1.0)
+        self._tokens = self.capacity
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._at) * self.rate)
+        self._at = now
+
+    def acquire(self) -> float:
+        """Lấy 1 token, chờ nếu hết. Trả về số giây đã chờ."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                need = (1 - self._tokens) / self.rate
+            time.sleep(need)
+            waited += need
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class QuotaHTTPClient(HTTPClient):
+    """HTTPClient của gspread có giới hạn hạn mức và thử lại.
+
+    - Đọc (GET) và ghi (còn lại) đi qua hai token bucket riêng theo hạn mức
+      mỗi phút của Sheets API (`read_per_minute`, `write_per_minute`).
+    - 408/429/5xx được thử lại tối đa `max_retries` lần, chờ kiểu exponential
+      backoff có jitter (full jitter, trần `max_backoff` giây).
+    - Các GET giống hệt nhau (cùng URL + params) chạy đồng thời chỉ gửi một
+      request; các luồng còn lại dùng chung kết quả. Một lần ghi bắt đầu thì
+      các GET sau đó không ghép vào request đọc cũ nữa.
+
+    Hạn mức đặt qua thuộc tính lớp (gspread tự khởi tạo client), xem `configure`.
+    """
+
+    read_per_minute = 60
+    write_per_minute = 60
+    max_retries = 5
+    base_backoff = 1.0
+    max_backoff = 32.0
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        self.reads = TokenBucket(self.read_per_minute)
+        self.writes = TokenBucket(self.write_per_minute)
+        self._inflight = {}
+        self._mu = threading.Lock()
+        self._write_gen = 0
+        self.retries = 0
+
+    @classmethod
+    def configure(cls, read_per_minute=None, write_per_minute=None, max_retries=None):
+        """Trả về lớp con với hạn mức riêng (để truyền vào gspread.authorize)."""
+        attrs = {k: v for k, v in dict(read_per_minute=read_per_minute, write_per_minute=write_per_minute,
+                                       max_retries=max_retries).items() if v is not None}
+        return type(cls.__name__, (cls,), attrs)
+
+    def _send(self, method, endpoint, **kwargs):
+        bucket = self.reads if method.upper() == "GET" else self.writes
+        op, sheet = describe_request(method, endpoint, kwargs.get("params"))
+        rows, cells = _body_size(kwargs.get("json"))
+        if not sheet and isinstance(kwargs.get("json"), dict):
+            ranges = [d.get("range", "") for d in kwargs["json"].get("data", []) if isinstance(d, dict)]
+            sheet = ",".join(dict.fromkeys(_range_sheet(r) for r in ranges if r))
+        attempt = 0
+        while True:
+            waited = bucket.acquire()
+            t0 = time.perf_counter()
+            resp, code = None, 200
+            try:
+                resp = super().request(method, endpoint, **kwargs)
+                return resp
+            except APIError as e:
+                code = e.code
+                if e.code not in RETRY_CODES or attempt >= self.max_retries:
+                    raise
+            finally:
+                get_metrics().record(op, sheet, rows=rows, cells=cells,
+                                     nbytes=len(resp.content or b"") if resp is not None else 0,
+                                     seconds=time.perf_counter() - t0, layer="api", ok=resp is not None,
+                                     status=code, attempt=attempt, throttled_ms=round(waited * 1000, 1))
+            attempt += 1
+            self.retries += 1
+            time.sleep(random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt)))
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        if method.upper() != "GET" or data is not None or json is not None or files is not None:
+            with self._mu:
+                self._write_gen += 1
+            return self._send(method, endpoint, params=params, data=data, json=json,
+                              files=files, headers=headers)
+        key = (endpoint, _freeze(params), _freeze(headers))
+        with self._mu:
+            key += (self._write_gen,)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+        if not leader:
+            t0 = time.perf_counter()
+            flight.done.wait()
+            op, sheet = describe_request(method, endpoint, params)
+            # ghép vào request đang chạy: không tốn hạn mức
+            get_metrics().record(op, sheet, seconds=time.perf_counter() - t0, layer="api",
+                                 ok=flight.error is None, coalesced=True)
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+        try:
+            flight.response = self._send(method, endpoint, params=params, headers=headers)
+            return flight.response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._mu:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+def _freeze(value):
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return json.dumps(value, sort_keys=True, default=str)
+    if isinstance(value, (list, tuple)):
+        return json.dumps(list(value), default=str)
+    return str(value)
+
+_VALUES = re.compile(r"/values(?:/([^:?]+))?(?::(\w+))?$")
+
+def _range_sheet(rng: str) -> str:
+    rng = unquote(rng).split("!", 1)[0]
+    return rng[1:-1].replace("''", "'") if rng.startswith("'") and rng.endswith("'") else rng
+
+def describe_request(method: str, endpoint: str, params=None):
+    """(thao tác, sheet) của một request Sheets API, vd. ("values.append", "XE_MAY")."""
+    path = endpoint.split("?", 1)[0]
+    m = _VALUES.search(path)
+    if m:
+        rng, verb = m.group(1), m.group(2)
+        op = "values." + (verb or "get")
+        if rng:
+            return op, _range_sheet(rng)
+        ranges = (params or {}).get("ranges") or []
+        ranges = [ranges] if isinstance(ranges, str) else ranges
+        return op, ",".join(dict.fromkeys(_range_sheet(r) for r in ranges))
+    if path.endswith(":batchUpdate"):
+        return "batchUpdate", ""
+    return ("get" if method.upper() == "GET" else method.lower()), ""
+
+def _body_size(body):
+    """(rows, cells) ghi đi trong body JSON của request ghi giá trị."""
+    if not isinstance(body, dict):
+        return 0, 0
+    blocks = [body] if "values" in body else [d for d in body.get("data", []) if isinstance(d, dict)]
+    vals = [d.get("values") or [] for d in blocks]
+    return sum(len(v) for v in vals), sum(len(r) for v in vals for r in v)
+
+def describe_api_error(e: APIError) -> str:
+    """Thông báo ngắn cho người dùng từ một APIError."""
+    code = getattr(e, "code", None)
+    if code == 429:
+        return "Google Sheets đang quá hạn mức truy cập, vui lòng thử lại sau ít phút."
+    if code is not None and code >= 500:
+        return f"Google Sheets đang lỗi ({code}), vui lòng thử lại sau."
+    return f"Lỗi Google Sheets ({code}): {e}"
@@ -0,0 +1,76 @@
+# utils/reconcile.py
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates, DATE_FMT_SAVE
+from .schema import text_col
+
+# Xuất thực tế = XE_MAY "Số lượng giao" + OTO "Số lượng"
+QTY_COLS = {"XE_MAY": "Số lượng giao", "OTO": "Số lượng"}
+RECON_COLS = ["Ngày", "Loại sản phẩm", "Tồn hôm qua (X)", "Nhập hôm nay (K)", "Tồn hôm nay (Y)",
+              "Xuất kỳ vọng (X+K-Y)", "Xuất thực tế", "Chênh lệch", "Thiếu chốt"]
+
+def _grid(df: pd.DataFrame, qty_col: str, days: pd.DatetimeIndex) -> pd.DataFrame:
+    """Tổng `qty_col` theo (ngày × Loại sản phẩm); chỉ giữ các ngày trong `days`."""
+    if df is None or df.empty or "Ngày" not in df.columns or "Loại sản phẩm" not in df.columns:
+        return pd.DataFrame(index=days, dtype=float)
+    d = parse_dates(df["Ngày"]).dt.normalize()
+    q = pd.to_numeric(df[qty_col], errors="coerce") if qty_col in df.columns else pd.Series(np.nan, index=df.index)
+    ok = d.isin(days)
+    s = pd.Series(q[ok].to_numpy(), index=[d[ok].to_numpy(), text_col(df, "Loại sản phẩm")[ok].to_numpy()])
+    return s.groupby(level=[0, 1]).sum().unstack(fill_value=0).reindex(days)
+
+def reconcile(date_from, date_to, close: pd.DataFrame, receipts: pd.DataFrame,
+              orders: dict, products=()) -> pd.DataFrame:
+    """Đối chiếu tồn kho cho mọi ngày trong [date_from, date_to] (cột RECON_COLS).
+
+    Với mỗi (ngày d, sản phẩm): X = tồn chốt ngày d-1, K = nhập ngày d,
+    Y = tồn chốt ngày d, xuất kỳ vọng = X + K - Y, so với xuất thực tế của
+    `orders` ({"XE_MAY": df, "OTO": df}). `close` cần có cả ngày date_from - 1.
+    "Thiếu chốt": ngày d-1 hoặc d không có dòng DAILY_CLOSE nào (tồn coi như 0).
+    """
+    start, end = pd.Timestamp(date_from).normalize(), pd.Timestamp(date_to).normalize()
+    if end < start:
+        start, end = end, start
+    days = pd.date_range(start - pd.Timedelta(days=1), end, freq="D")
+
+    closes = _grid(close, "Tồn cuối", days)
+    grids = [closes, _grid(receipts, "Số lượng nhập", days)] + \
+            [_grid(orders.get(ws), col, days) for ws, col in QTY_COLS.items()]
+    items = sorted(set(products) | {c for g in grids for c in g.columns} - {""})
+    closes, k, *z = [g.reindex(columns=items).fillna(0) for g in grids]
+    has_close = closes.index.isin(parse_dates(close["Ngày"]).dt.normalize().dropna().unique()) \
+        if close is not None and not close.empty and "Ngày" in close.columns else np.zeros(len(days), bool)
+    has_close = pd.Series(has_close, index=days)
+
+    # dịch một ngày: tồn hôm qua của ngày d là tồn chốt của d-1
+    x, y = closes.shift(1).iloc[1:], closes.iloc[1:]
+    k, zact = k.iloc[1:], sum(z).iloc[1:]
+    zexp = x + k - y
+
+    n_items = len(items)
+    out = pd.DataFrame({
+        "Ngày": np.repeat(y.index.strftime(DATE_FMT_SAVE).to_numpy(), n_items),
+        "Loại sản phẩm": np.tile(np.asarray(items, dtype=object), len(y.index)),
+    })
+    for name, grid in [("Tồn hôm qua (X)", x), ("Nhập hôm nay (K)", k), ("Tồn hôm nay (Y)", y),
+                       ("Xuất kỳ vọng (X+K-Y)", zexp), ("Xuất thực tế", zact), ("Chênh lệch", zexp - zact)]:
+        out[name] = grid.to_numpy().ravel().astype("int64") if n_items else np.zeros(0, "int64")
+    prev_ok = np.repeat(has_close.shift(1, fill_value=False).iloc[1:].to_numpy(), n_items)
+    cur_ok = np.repeat(has_close.iloc[1:].to_numpy(), n_items)
+    out["Thiếu chốt"] = np.select([~prev_ok & ~cur_ok, ~prev_ok, ~cur_ok], ["hôm qua + hôm nay", "hôm qua", "hôm nay"], "")
+    return out[RECON_COLS]
+
+def day_summary(recon: pd.DataFrame) -> pd.DataFrame:
+    """Mỗi ngày một dòng: tổng xuất kỳ vọng/thực tế, tổng |chênh lệch|, số sản phẩm lệch, thiếu chốt."""
+    if recon.empty:
+        return pd.DataFrame(columns=["Ngày", "Xuất kỳ vọng", "Xuất thực tế", "Tổng |chênh lệch|", "Số SP lệch", "Thiếu chốt"])
+    g = recon.assign(_abs=recon["Chênh lệch"].abs(), _lech=recon["Chênh lệch"].ne(0)) \
+             .groupby("Ngày", sort=False)
+    return pd.DataFrame({
+        "Xuất kỳ vọng": g["Xuất kỳ vọng (X+K-Y)"].sum(),
+        "Xuất thực tế": g["Xuất thực tế"].sum(),
+        "Tổng |chênh lệch|": g["_abs"].sum(),
+        "Số SP lệch": g["_lech"].sum(),
+        "Thiếu chốt": g["Thiếu chốt"].first(),
+    }).reset_index()
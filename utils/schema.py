@@ -0,0 +1,173 @@
+# utils/schema.py
+import numpy as np
+import pandas as pd
+
+from .dates import parse_dates, DATE_FMT_SAVE
+
+# Kiểu cột:
+#   date     -> datetime64 (NaT nếu không đọc được)
+#   int      -> int64 (float64 nếu có ô trống/không phải số, vd. vỏ về 'x')
+#   money    -> như int; chuỗi "1,000", "1.000.000 đ" đọc thành 1000, 1000000
+#   float    -> float64, nhận dấu phẩy thập phân ("0,5") và ô định dạng phần trăm ("10%" -> 10)
+#   category -> Categorical, giá trị đã strip, ô trống = NaN
+#   text     -> object (chuỗi đã strip, ô trống = NaN)
+DATE, INT, MONEY, FLOAT, CATEGORY, TEXT = "date", "int", "money", "float", "category", "text"
+
+# Mỗi sheet: {cột: kiểu}, theo đúng thứ tự cột trên sheet
+SCHEMAS = {
+    "XE_MAY": {"Ngày": DATE, "Khách hàng": CATEGORY, "Code": TEXT, "Đường": CATEGORY,
+               "Loại sản phẩm": CATEGORY, "Loại bình": CATEGORY, "Số lượng giao": INT, "Vỏ về": INT,
+               "Thanh Toán": MONEY, "PP Thanh toán": CATEGORY, "Chú thích": TEXT, "Người chở": CATEGORY},
+    "OTO": {"Ngày": DATE, "Khách hàng": CATEGORY, "Loại sản phẩm": CATEGORY, "Loại bình": CATEGORY,
+            "Số lượng": INT, "Đơn giá": MONEY, "Thanh Toán": MONEY, "PP Thanh toán": CATEGORY,
+            "Chú thích": TEXT, "Người chở 1": CATEGORY, "Người chở 2": CATEGORY},
+    "DAILY_CLOSE": {"Ngày": DATE, "Loại sản phẩm": CATEGORY, "Tồn cuối": INT, "Ghi chú": TEXT,
+                    "Người nhập": CATEGORY},
+    "NHAP_HANG": {"Ngày": DATE, "Loại sản phẩm": CATEGORY, "Số lượng nhập": INT, "Đơn giá": MONEY,
+                  "Thành tiền": MONEY, "Nhà cung cấp": CATEGORY, "Ghi chú": TEXT},
+    "CONG": {"Ngày": DATE, "Nhân viên": CATEGORY, "Ca": CATEGORY, "Công": FLOAT, "Ghi chú": TEXT},
+    "LOOKUPS": {"Loại": CATEGORY, "Giá trị": TEXT},
+    "PAY_RULES": {"Tháng": TEXT, "Nhân viên": CATEGORY, "Luong_co_ban": MONEY, "Don_gia_cong": MONEY,
+                  "Phu_cap": MONEY, "Tam_ung": MONEY, "Khau_tru": MONEY},
+    "COMMISSION_RULES": {"Tháng": TEXT, "Loại sản phẩm": CATEGORY, "Ty_le_%": FLOAT,
+                         "Hoa_hong_moi_donvi": MONEY},
+    "LUONG": {"Tháng": TEXT, "Nhân viên": CATEGORY, "Công": FLOAT, "Lương cơ bản": MONEY, "Phụ cấp": MONEY,
+              "Hoa hồng": MONEY, "Tạm ứng": MONEY, "Khấu trừ": MONEY, "Tổng lương": MONEY},
+    "INVENTORY": {"Loại sản phẩm": CATEGORY, "Tồn đầu": INT, "Nhập": INT, "Xuất": INT, "Tồn cuối": INT,
+                  "Ghi chú": TEXT},
+    "DAILY_AGG": {"Ngày": DATE, "Nguồn": CATEGORY, "Loại sản phẩm": CATEGORY, "PP Thanh toán": CATEGORY,
+                  "Người chở": CATEGORY, "Số đơn": INT, "SL_Giao": INT, "Vo_di": INT, "Vo_ve": INT,
+                  "Thanh Toán": MONEY},
+    "CONG_NO": {"Khách hàng": CATEGORY, "Số đơn": INT, "Vỏ đi": INT, "Vỏ về": INT, "Tiền hàng": MONEY,
+                "Đã trả": MONEY, "Vỏ còn nợ": INT, "Còn nợ": MONEY, "Đơn cuối": DATE},
+}
+
+# Tên cột cũ/khác trên sheet hoặc trong trang -> tên chuẩn
+ALIASES = {"Mặt hàng": "Loại sản phẩm", "Khách hàng/Địa chỉ": "Khách hàng"}
+
+def canonical(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip tên cột và đổi tên cột alias sang tên chuẩn (nếu chưa có cột chuẩn)."""
+    names = [str(c).strip() for c in df.columns]
+    have = set(names)
+    out = [ALIASES[c] if c in ALIASES and ALIASES[c] not in have else c for c in names]
+    return df.set_axis(out, axis=1) if out != list(df.columns) else df
+
+def _label(v) -> str:
+    if isinstance(v, (float, np.floating)) and float(v).is_integer():
+        return str(int(v))
+    return str(v).strip()
+
+def _labels(s: pd.Series):
+    """Mã hoá cột theo giá trị khác nhau: (codes, nhãn đã strip); chỉ strip mỗi giá trị một lần."""
+    codes, uniq = pd.factorize(s)
+    return codes, np.asarray([_label(u) for u in uniq], dtype=object)
+
+def _category(s: pd.Series) -> pd.Series:
+    codes, labels = _labels(s)
+    cats = pd.Index(sorted(set(labels) - {""}), dtype=object)
+    new = cats.get_indexer(labels)[codes] if len(labels) else codes
+    new[codes < 0] = -1
+    return pd.Series(pd.Categorical.from_codes(new, categories=cats), index=s.index, name=s.name)
+
+def _text(s: pd.Series) -> pd.Series:
+    codes, labels = _labels(s)
+    vals = np.append(labels, np.nan).astype(object)   # code -1 (ô trống) -> NaN
+    vals[:-1][labels == ""] = np.nan
+    return pd.Series(vals[codes], index=s.index, name=s.name)
+
+def _number(s: pd.Series, kind: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        out = s.astype(float)
+    else:
+        # đổi từng giá trị khác nhau một lần rồi trải lại theo codes
+        codes, uniq = pd.factorize(s)
+        uniq = pd.Series(uniq, dtype=object)
+        nums = pd.to_numeric(uniq, errors="coerce").astype(float)
+        is_str = uniq.map(lambda v: isinstance(v, str)).astype(bool)
+        if is_str.any():
+            txt = uniq[is_str].astype(str).str.strip()
+            if kind == MONEY:
+                # tiền đồng không có phần lẻ: "1,000", "1.000.000 đ" -> bỏ mọi dấu phân cách, ký hiệu
+                txt = txt.str.replace(r"(?!^-)[^\d]", "", regex=True)
+            else:
+                txt = txt.str.replace(r"[\s%]", "", regex=True).str.replace(",", ".", regex=False)
+            nums[is_str] = pd.to_numeric(txt, errors="coerce").astype(float)
+        vals = np.append(nums.to_numpy(), np.nan)
+        out = pd.Series(vals[codes], index=s.index, name=s.name)
+    if kind != FLOAT and out.notna().all() and (out % 1 == 0).all():
+        return out.astype("int64")
+    return out
+
+def _coerce(s: pd.Series, kind: str) -> pd.Series:
+    if kind == DATE:
+        return parse_dates(s)
+    if kind == CATEGORY:
+        return s if isinstance(s.dtype, pd.CategoricalDtype) else _category(s)
+    if kind == TEXT:
+        return _text(s)
+    return _number(s, kind)
+
+def apply_schema(ws_name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame thô của sheet -> bản đã đổi kiểu theo SCHEMAS (một lượt, vector hoá).
+    Giữ nguyên index và các cột không có trong schema; không sửa `df`."""
+    df = canonical(df)
+    types = SCHEMAS.get(ws_name, {})
+    dup = set(df.columns[df.columns.duplicated()])
+    cols = {c: _coerce(df[c], t) for c, t in types.items() if c in df.columns and c not in dup}
+    return df.assign(**cols) if cols else df.copy()
+
+def to_sheet(ws_name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Ngược lại apply_schema trước khi ghi: tên cột chuẩn, cột ngày -> dd-mm-yyyy,
+    Categorical -> giá trị thường."""
+    df = canonical(df)
+    types = SCHEMAS.get(ws_name, {})
+    cols = {}
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_datetime64_any_dtype(s) and types.get(c, DATE) == DATE:
+            cols[c] = s.dt.strftime(DATE_FMT_SAVE).astype(object)
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            cols[c] = s.astype(object)
+    return df.assign(**cols) if cols else df
+
+def cell(v):
+    """Giá trị ô để gửi lên Sheets (NaN -> rỗng, numpy -> kiểu Python)."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return ""
+    return v.item() if hasattr(v, "item") else v
+
+def num_col(df: pd.DataFrame, col: str, default=0.0) -> pd.Series:
+    """Cột `col` dạng số (ô trống/không phải số -> `default`); thiếu cột thì cả cột là `default`."""
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=float)
+    return pd.to_numeric(df[col], errors="coerce").fillna(default)
+
+def text_col(df: pd.DataFrame, col: str) -> pd.Series:
+    """Cột `col` dạng chuỗi đã strip (ô trống -> ""); thiếu cột thì cả cột là ""."""
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    s = df[col]
+    if isinstance(s.dtype, pd.CategoricalDtype):   # read_df trả Categorical: fillna("") cần cột thường
+        s = s.astype(object)
+    return s.fillna("").astype(str).str.strip()
+
+def plain(df: pd.DataFrame) -> pd.DataFrame:
+    """Bỏ Categorical (vd. trước khi fillna("") hoặc đưa vào data_editor để sửa tự do)."""
+    cats = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: object for c in cats}) if cats else df
+
+def labels(s: pd.Series) -> list:
+    """Các giá trị khác nhau (đã strip, bỏ trống) của một cột, đã sắp xếp.
+    Cột Categorical chỉ cần đọc danh sách categories đang dùng."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return sorted(s.cat.remove_unused_categories().cat.categories.astype(str))
+    return sorted({v for v in s.dropna().astype(str).str.strip().unique() if v})
+
+def concat(ws_name: str, frames) -> pd.DataFrame:
+    """Nối các bảng đã áp schema của cùng một sheet (index mới). Categorical khác
+    categories bị pandas đổi về object khi nối -> đổi lại theo schema."""
+    frames = [f for f in frames if f is not None and len(f.columns)]
+    if not frames:
+        return apply_schema(ws_name, pd.DataFrame(columns=list(SCHEMAS.get(ws_name, {}))))
+    out = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0].reset_index(drop=True)
+    return apply_schema(ws_name, out)
@@ -0,0 +1,38 @@
+# utils/views.py
+from typing import Callable, NamedTuple
+
+import streamlit as st
+
+from .gs import snapshot
+from .metrics import span
+
+class View(NamedTuple):
+    """Một màn hình của trang.
+
+    `sheets`: đọc trước trong một request khi mở view (snapshot).
+    `keep`: key các widget đơn giản (ngày, tháng, bộ lọc...) cần giữ giá trị
+    khi chuyển sang view khác rồi quay lại. Không dùng cho nút bấm, form và
+    data_editor (Streamlit không cho đặt giá trị các widget đó).
+    """
+    run: Callable
+    sheets: tuple = ()
+    keep: tuple = ()
+
+def route(views: dict, key: str, label: str = "Chức năng") -> str:
+    """Thanh chọn view thay cho st.tabs: chỉ view đang mở được chạy (đọc dữ liệu,
+    tính toán); các view khác không tốn request nào. View đang mở lưu ở
+    `st.session_state[key]`. Trả về tên view đã chạy."""
+    name = st.radio(label, list(views), horizontal=True, key=key, label_visibility="collapsed")
+    # widget không hiện trong lần chạy này sẽ bị Streamlit xoá khỏi session_state;
+    # gán lại để giữ giá trị cho các view đang ẩn
+    for other, view in views.items():
+        if other != name:
+            for k in view.keep:
+                if k in st.session_state:
+                    st.session_state[k] = st.session_state[k]
+    view = views[name]
+    with span(name):
+        if view.sheets:
+            snapshot(list(view.sheets))
+        view.run()
+    return name
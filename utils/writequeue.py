@@ -0,0 +1,141 @@
+# utils/writequeue.py
+import threading
+import time
+from contextlib import contextmanager
+
+class PartialSend(Exception):
+    """`send` chỉ ghi được một phần lô (vd. lô đơn chia vào nhiều phân vùng tháng, phân
+    vùng sau lỗi): `sent` đã lên sheet, chỉ `unsent` phải gửi lại. Lỗi gốc ở __cause__."""
+
+    def __init__(self, sent: list, unsent: list):
+        super().__init__(f"đã ghi {len(sent)} dòng, còn {len(unsent)} dòng chưa ghi")
+        self.sent = sent
+        self.unsent = unsent
+
+class WriteQueue:
+    """Hàng đợi ghi trễ (write-behind) cho append.
+
+    `put` chỉ xếp dòng vào bộ đệm theo sheet rồi trả về ngay; một thread nền
+    gọi `send(ws_name, rows)` theo lô khi sheet đủ `max_rows` dòng hoặc dòng cũ
+    nhất đã chờ quá `max_delay` giây. Lỗi khi gửi thì giữ nguyên các dòng (PartialSend:
+    chỉ các dòng chưa ghi), thử lại sau (chờ tăng dần tới `max_backoff`).
+
+    `sheet_lock(ws_name)` được giữ suốt lúc gửi một lô: người đọc giữ cùng
+    khoá khi lấy bản cache + `pending` sẽ thấy mỗi dòng đúng một lần.
+    """
+
+    def __init__(self, send, max_rows: int = 20, max_delay: float = 2.0, max_backoff: float = 60.0):
+        self._send = send
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_backoff = max_backoff
+        self._mu = threading.Lock()
+        self._wake = threading.Condition(self._mu)
+        self._sheet_locks = {}
+        self._queued = {}     # ws -> [dòng chưa gửi]
+        self._oldest = {}     # ws -> thời điểm dòng chờ lâu nhất
+        self._inflight = {}   # ws -> [dòng đang gửi]
+        self._retry_at = 0.0
+        self._fails = 0
+        self._thread = None
+        self.last_error = None
+
+    @contextmanager
+    def sheet_lock(self, ws_name: str):
+        with self._mu:
+            lock = self._sheet_locks.setdefault(ws_name, threading.RLock())
+        with lock:
+            yield
+
+    def put(self, ws_name: str, rows: list):
+        rows = [list(r) for r in rows]
+        if not rows:
+            return
+        with self._wake:
+            q = self._queued.setdefault(ws_name, [])
+            if not q:
+                self._oldest[ws_name] = time.monotonic()
+            q.extend(rows)
+            self._wake.notify()
+
+    def pending(self, ws_name: str) -> list:
+        """Các dòng chưa lên sheet (đang gửi + đang chờ), theo thứ tự append."""
+        with self._mu:
+            return [list(r) for r in self._inflight.get(ws_name, []) + self._queued.get(ws_name, [])]
+
+    def discard(self, ws_name: str = None) -> int:
+        """Bỏ các dòng đang chờ (không gửi) của một sheet hoặc tất cả. Trả về số dòng đã bỏ.
+        Lô đang gửi không bị bỏ: giữ sheet_lock trước khi gọi nếu cần chắc chắn."""
+        with self._mu:
+            names = [ws_name] if ws_name is not None else list(self._queued)
+            dropped = [self._queued.pop(n, []) for n in names]
+            for n in names:
+                self._oldest.pop(n, None)
+        return sum(len(rows) for rows in dropped)
+
+    def size(self) -> int:
+        with self._mu:
+            return sum(len(q) for q in self._queued.values()) + sum(len(q) for q in self._inflight.values())
+
+    def _due(self, now: float) -> list:
+        if now < self._retry_at:
+            return []
+        return [n for n, q in self._queued.items()
+                if q and (len(q) >= self.max_rows or now - self._oldest[n] >= self.max_delay)]
+
+    def _flush_sheet(self, ws_name: str) -> int:
+        with self.sheet_lock(ws_name):
+            with self._mu:
+                rows = self._queued.pop(ws_name, [])
+                self._oldest.pop(ws_name, None)
+                if not rows:
+                    return 0
+                self._inflight[ws_name] = rows
+            try:
+                self._send(ws_name, rows)
+            except Exception as e:
+                # trả lại đầu hàng đợi, giữ thứ tự; dòng đã lên sheet thì không gửi lại
+                left = [list(r) for r in e.unsent] if isinstance(e, PartialSend) else rows
+                with self._mu:
+                    self._queued[ws_name] = left + self._queued.get(ws_name, [])
+                    self._oldest[ws_name] = time.monotonic()
+                raise
+            finally:
+                with self._mu:
+                    self._inflight.pop(ws_name, None)
+        return len(rows)
+
+    def flush(self, ws_name: str = None) -> int:
+        """Gửi ngay (đồng bộ) mọi dòng đang chờ của một sheet hoặc tất cả. Trả về số dòng đã gửi."""
+        with self._mu:
+            names = [ws_name] if ws_name is not None else list(self._queued)
+        return sum(self._flush_sheet(n) for n in names)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            with self._wake:
+                now = time.monotonic()
+                due = self._due(now)
+                while not due:
+                    waits = [self.max_delay - (now - t) for n, t in self._oldest.items() if self._queued.get(n)]
+                    if now < self._retry_at:
+                        waits = [self._retry_at - now]
+                    self._wake.wait(max(min(waits), 0.05) if waits else None)
+                    now = time.monotonic()
+                    due = self._due(now)
+            for n in due:
+                try:
+                    self._flush_sheet(n)
+                    self._fails = 0
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = e
+                    self._fails += 1
+                    self._retry_at = time.monotonic() + min(self.max_delay * 2 ** self._fails, self.max_backoff)
+                    break